@@ -30,6 +30,35 @@ def test_example_NaCl():
     print('*********************\n   TEST:  passed.\n*********************\n')
 
 
+def test_example_NaCl_float32():
+    import numpy as np
+    import thermocepstrum as tc
+
+    jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+    jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['Temp', 'flux', 'vcm[1]'], dtype=np.float32)
+    assert jfile.data['flux'].dtype == np.float32
+    DT_FS = 5.0   # time step [fs]
+    TEMPERATURE = np.mean(jfile.data['Temp'], dtype=float)   # temperature [K]
+    VOLUME = 40.21**3   # volume [A^3]
+
+    j = tc.HeatCurrent([jfile.data['flux'], jfile.data['vcm[1]']], 'metal', DT_FS, TEMPERATURE, VOLUME,
+                       dtype=np.float32)
+    assert j.traj.dtype == np.float32
+    assert j.spectrALL.dtype == np.complex64
+
+    FSTAR_THZ = 14.0
+    jf = tc.heatcurrent.resample_current(j, fstar_THz=FSTAR_THZ, plot=False, freq_units='thz')
+    jf.cepstral_analysis()
+    print(jf.cepstral_log)
+
+    # same results of test_example_NaCl, within the single-precision rounding
+    assert abs(jf.dct.aic_min - 1410.555757) < 1.0e-3
+    assert jf.dct.aic_Kmin == 3
+    assert abs(jf.kappa_Kmin - 0.498310) < 1.0e-5
+    assert abs(jf.kappa_Kmin_std - 0.028018) < 1.0e-5
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
 def test_example_SiO2():
 
     import os
@@ -60,6 +89,45 @@ def test_example_SiO2():
     print('*********************\n   TEST:  passed.\n*********************\n')
 
 
+def test_lazy_heatcurrent():
+    import numpy as np
+    import thermocepstrum as tc
+
+    jfile = tc.i_o.TableFile('./data/Silica.dat', group_vectors=True)
+    jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['flux1'])
+    j = tc.HeatCurrent(jfile.data['flux1'], 'metal', 1.0, 1065.705630, 3130.431110818)
+    assert not any(j.is_computed(stage) for stage in tc.heatcurrent.LAZY_STAGES)
+
+    # resampling does not compute the periodogram of the full-resolution current
+    jf = tc.heatcurrent.resample_current(j, fstar_THz=28.0, plot=False, freq_units='thz')
+    assert not j.is_computed('psd') and not jf.is_computed('psd')
+    jf.cepstral_analysis()
+    assert jf.is_computed('cepstral')
+    assert abs(jf.kappa_Kmin - 2.484534) < 1.0e-6
+    assert abs(jf.kappa_Kmin_std - 0.256596) < 1.0e-6
+
+    # computed on first access, with the same frequencies
+    freqs = j.freqs
+    assert j.ck_THEORY_var.size == j.Nfreqs
+    assert j.is_computed('psd') and np.array_equal(j.freqs, freqs)
+
+    # the filter window is defined before the psd is computed
+    j = tc.HeatCurrent(jfile.data['flux1'], 'metal', 1.0, 1065.705630, 3130.431110818, PSD_FILTER_W=0.5)
+    assert (j.FILTER_WINDOW_WIDTH == 0.0005) and (j.FILTER_WF == int(round(0.0005 * j.Nfreqs * 2.)))
+    jf = tc.heatcurrent.resample_current(j, fstar_THz=28.0, plot=False, PSD_FILTER_W=0.5)
+    assert np.isclose(jf.FILTER_WINDOW_WIDTH, 0.5 * jf.DT_FS / 1000.) and (jf.FILTER_WF is not None)
+    assert not j.is_computed('psd') and not jf.is_computed('psd')
+    FILTER_WF = jf.FILTER_WF
+    assert (jf.fpsd is not None) and (jf.FILTER_WF == FILTER_WF)
+
+    # a periodogram computed explicitly is not replaced
+    j.compute_psd(0.001)
+    assert j.fpsd is not None and (j.FILTER_WINDOW_WIDTH == 0.001)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
 if __name__ == '__main__':
     test_example_NaCl()
+    test_example_NaCl_float32()
     test_example_SiO2()
+    test_lazy_heatcurrent()
@@ -0,0 +1,105 @@
+def test_cospectrum():
+    import numpy as np
+    from thermocepstrum.md.cospectrum import compute_packed_cospectrum, unpack_cospectrum, reduced_psd, reduced_psds
+
+    np.random.seed(7)
+    M, Nfreqs, L = 4, 1001, 5
+    spectra = [np.random.normal(size=(Nfreqs, L)) + 1j * np.random.normal(size=(Nfreqs, L)) for _ in range(M)]
+    spectra[1] = spectra[1].astype(np.complex64)
+    spectrALL = np.array(spectra, dtype=complex)
+    cospectrum = 0.5 * np.einsum('a...,b...->ab...', spectrALL, spectrALL.conj()).sum(axis=3)
+    psd = (np.linalg.inv(cospectrum.transpose((2, 0, 1)))[:, 0, 0]**-1).real
+
+    packed = compute_packed_cospectrum(spectra, 0.5, chunk_freqs=100)
+    assert packed.shape == (M * (M + 1) // 2, Nfreqs)
+    assert np.allclose(unpack_cospectrum(packed), cospectrum, rtol=1e-12)
+    assert np.allclose(unpack_cospectrum(packed, 10, 20), cospectrum[:, :, 10:20], rtol=1e-12)
+    assert np.allclose(reduced_psd(packed, chunk_freqs=77), psd, rtol=1e-10)
+    psds = (1. / np.diagonal(np.linalg.inv(cospectrum.transpose((2, 0, 1))), axis1=1, axis2=2)).real.T
+    assert np.allclose(reduced_psds(packed, chunk_freqs=77), psds, rtol=1e-10)
+    assert np.allclose(reduced_psds(packed, [2, 0]), psds[[2, 0]], rtol=1e-10)
+
+    # matrices not positive definite: the inverse is used
+    packed = np.array([[2., 2.], [0., 1.], [-1., 1.]], dtype=complex)   # S = [[2, 0], [0, -1]] and [[2, 1], [1, 1]]
+    assert np.allclose(reduced_psd(packed), [2., 1.])
+    assert np.allclose(reduced_psds(packed), [[2., 1.], [-1., 0.5]])
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_spectral_store():
+    import numpy as np
+    import thermocepstrum as tc
+
+    jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+    jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['flux', 'vcm[1]'])
+    j = tc.HeatCurrent([jfile.data['flux'], jfile.data['vcm[1]']], 'metal', 5.0, 1400., 65013.301261, PSD_FILTER_W=0.1)
+    store = j.spectral_store
+    assert not store.computed   # the periodogram is computed on first access
+    assert j.psd is not None
+    assert store.computed and (len(store) == 2) and (store.spectra.shape == (2, j.Nfreqs, 3))
+    assert np.shares_memory(j.spectrALL, store.spectra)
+    assert np.shares_memory(j.otherMD[0].spectrALL, store.spectra)
+    assert np.array_equal(store[1], tc.md.tools.rfft(jfile.data['vcm[1]'], axis=0))
+
+    # the same results computing the spectra of each current
+    psd, fcospectrum = j.psd, j.fcospectrum
+    j.spectral_store = None
+    j.compute_kappa_multi(j.otherMD, 0.1 * 5.0 / 1000.)
+    assert np.array_equal(j.psd, psd)
+    assert np.array_equal(j.fcospectrum, fcospectrum)
+
+    store.clear()
+    assert not store.computed
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_packed_memory():
+    import numpy as np
+    import thermocepstrum as tc
+    from thermocepstrum.md.cospectrum import packed_element
+
+    jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+    jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['flux', 'vcm[1]'])
+    j = tc.HeatCurrent([jfile.data['flux'], jfile.data['vcm[1]']], 'metal', 5.0, 1400., 65013.301261, PSD_FILTER_W=0.1)
+
+    def full_matrices():
+        return [name for obj in [j] + j.otherMD for name, value in vars(obj).items()
+                if isinstance(value, np.ndarray) and (value.shape == (2, 2, j.Nfreqs))]
+
+    # only the upper triangles of the (filtered) cospectrum are stored
+    assert (j.fpsd is not None) and (j.fcospectrum_packed.shape == (3, j.Nfreqs))
+    assert full_matrices() == []
+    fcospectrum = j.fcospectrum
+    assert fcospectrum.shape == (2, 2, j.Nfreqs)
+    assert np.array_equal(packed_element(j.fcospectrum_packed, 1, 0), fcospectrum[1, 0])
+    assert np.array_equal(j.cospectrum[0, 1], packed_element(j.cospectrum_packed, 0, 1))
+    assert full_matrices() == []   # the full matrices are not kept
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_onsager():
+    import numpy as np
+    import thermocepstrum as tc
+
+    jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+    jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['flux', 'vcm[1]'])
+    currents = [jfile.data['flux'], jfile.data['vcm[1]']]
+    j = tc.HeatCurrent(currents, 'metal', 5.0, 1400., 65013.301261, PSD_FILTER_W=0.1, onsager_currents=[0, 1])
+    assert j.onsager_psd.shape == (2, j.Nfreqs)
+    assert np.allclose(j.onsager_psd[0], j.psd, rtol=1e-10)
+    jr = tc.HeatCurrent(currents[::-1], 'metal', 5.0, 1400., 65013.301261, PSD_FILTER_W=0.1)
+    assert np.allclose(j.onsager_psd[1], jr.psd, rtol=1e-10)
+
+    # batched cepstral analysis of all the currents
+    j.cepstral_analysis()
+    jr.cepstral_analysis()
+    j.onsager_cepstral_analysis()
+    assert np.allclose(j.onsager_kappa_Kmin, [j.kappa_Kmin, jr.kappa_Kmin], rtol=1e-8)
+    assert np.allclose(j.onsager_kappa_Kmin_std, [j.kappa_Kmin_std, jr.kappa_Kmin_std], rtol=1e-8)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    test_cospectrum()
+    test_spectral_store()
+    test_onsager()
@@ -0,0 +1,35 @@
+def test_dictfile(tmpdir):
+    import os
+    import numpy as np
+    import thermocepstrum as tc
+
+    jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+    data = jfile.read_datalines(start_step=0, NSTEPS=1000, select_ckeys=['Temp', 'flux', 'vcm[1]'])
+    dic = {'flux': data['flux'], 'vcm[1]': np.asfortranarray(data['vcm[1]']), 'Temp_ave': np.mean(data['Temp']),
+           'box': np.eye(3), 'empty': np.zeros((0, 3))}
+    filename = os.path.join(str(tmpdir), 'NaCl.npz')
+    tc.i_o.save_dict(filename, dic)
+
+    loaded = tc.i_o.load_dict(filename)
+    assert isinstance(loaded, tc.i_o.DictFile)
+    assert sorted(loaded.keys()) == sorted(dic.keys())
+    assert loaded._values == {}   # nothing read yet
+    assert isinstance(loaded['flux'], np.memmap)
+    assert list(loaded._values) == ['flux']
+    for key, value in dic.items():
+        assert np.array_equal(loaded[key], value)
+    assert isinstance(loaded['Temp_ave'], float)
+    with np.load(filename) as npz:   # readable without pickle
+        assert np.array_equal(npz['flux'], dic['flux'])
+
+    # old pickled dictionaries
+    filename = os.path.join(str(tmpdir), 'NaCl.npy')
+    np.save(filename, dic)
+    loaded = tc.i_o.load_dict(filename)
+    assert np.array_equal(loaded['flux'], dic['flux'])
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    import tempfile
+    test_dictfile(tempfile.mkdtemp())
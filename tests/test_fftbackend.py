@@ -0,0 +1,45 @@
+def test_fftbackend():
+    import numpy as np
+    import thermocepstrum as tc
+    from thermocepstrum.md import fftbackend
+
+    backends = ['scipy', 'numpy']
+    try:
+        import pyfftw
+        backends.append('pyfftw')
+    except ImportError:
+        pass
+
+    jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+    jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['flux', 'vcm[1]'])
+    x = jfile.data['flux']
+    for backend in backends:
+        for workers in [1, 3]:
+            assert np.allclose(fftbackend.rfft(x, axis=0, backend=backend, workers=workers), np.fft.rfft(x, axis=0))
+            assert np.allclose(fftbackend.ifft(fftbackend.fft(x[:, 0], backend=backend), backend=backend), x[:, 0])
+            assert np.allclose(fftbackend.dct(x, type=1, axis=0, backend=backend, workers=workers),
+                               np.fft.rfft(np.concatenate((x, x[-2:0:-1])), axis=0).real)
+
+    j_ref = tc.HeatCurrent([jfile.data['flux'], jfile.data['vcm[1]']], 'metal', 5.0, 1399.3477811999999, 65013.301261)
+    jf_ref = tc.heatcurrent.resample_current(j_ref, fstar_THz=14.0, plot=False)
+    jf_ref.cepstral_analysis()
+    for backend in backends:
+        previous = fftbackend.set_backend(backend, workers=2)
+        try:
+            assert fftbackend.get_backend() == (backend, 2)
+            j = tc.HeatCurrent([jfile.data['flux'], jfile.data['vcm[1]']], 'metal', 5.0, 1399.3477811999999,
+                               65013.301261)
+            jf = tc.heatcurrent.resample_current(j, fstar_THz=14.0, plot=False)
+            jf.cepstral_analysis()
+        finally:
+            fftbackend.set_backend(*previous)
+        assert np.allclose(j.psd, j_ref.psd, rtol=1e-10)
+        assert np.allclose(j.cospectrum, j_ref.cospectrum, rtol=1e-10, atol=1e-12 * np.abs(j_ref.cospectrum).max())
+        assert (jf.dct.aic_Kmin == jf_ref.dct.aic_Kmin)
+        assert np.isclose(jf.kappa_Kmin, jf_ref.kappa_Kmin, rtol=1e-10)
+    assert fftbackend.get_backend() == ('scipy', 1)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    test_fftbackend()
@@ -0,0 +1,39 @@
+def test_hdf5file(tmpdir):
+    import os
+    import pytest
+    import numpy as np
+    import thermocepstrum as tc
+    pytest.importorskip('h5py')
+
+    jfile = tc.i_o.TableFile('./data/Silica.dat', group_vectors=True)
+    jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['flux1'])
+    filename = os.path.join(str(tmpdir), 'Silica.h5')
+    tc.i_o.write_currents(filename, {'flux1': jfile.data['flux1']}, DT_FS=1.0, TEMPERATURE=1065.705630,
+                          VOLUME=3130.431110818, units='metal', chunk_steps=4096)
+
+    with tc.i_o.HDF5File(filename) as hfile:
+        assert hfile.all_ckeys == ['flux1']
+        assert hfile.attrs['units'] == 'metal'
+        data = hfile.read_datalines(NSTEPS=1000, start_step=500, select_ckeys=['flux1'], dtype=np.float32)
+        assert data['flux1'].dtype == np.float32
+        assert np.array_equal(data['flux1'], jfile.data['flux1'][500:1500].astype(np.float32))
+        j = hfile.heatcurrent(['flux1'])
+    j_ref = tc.HeatCurrent(jfile.data['flux1'], 'metal', 1.0, 1065.705630, 3130.431110818)
+    assert np.array_equal(j.psd, j_ref.psd)
+
+    jf, ax = tc.heatcurrent.resample_current(j, fstar_THz=28.0, plot=True)
+    jf.cepstral_analysis()
+    tc.i_o.write_results(filename, jf, 'results')
+    import h5py
+    with h5py.File(filename, 'r') as f:
+        assert 'flux1' in f   # the currents are kept
+        assert np.array_equal(f['results/periodogram/psd'][()], jf.psd)
+        assert np.array_equal(f['results/cepstral/kappa'][()], jf.dct.tau * jf.kappa_scale * 0.5)
+        assert f['results'].attrs['kappa_Kmin'] == jf.kappa_Kmin
+        assert f['results'].attrs['aic_Kmin'] == jf.dct.aic_Kmin
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    import tempfile
+    test_hdf5file(tempfile.mkdtemp())
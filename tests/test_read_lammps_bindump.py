@@ -0,0 +1,71 @@
+def write_bindump(filename, frames, natoms, box, columns, new_format=True, nchunk=2):
+    """Write a LAMMPS binary dump file (new format with revision 2, or old format), splitting the atoms in chunks."""
+    import struct
+    import numpy as np
+
+    with open(filename, 'wb') as f:
+        for timestep, values in frames:
+            if new_format:
+                magic = b'DUMPCUSTOM'
+                f.write(struct.pack('<q', -len(magic)) + magic + struct.pack('<ii', 1, 2))
+            f.write(struct.pack('<qqi', timestep, natoms, 0))
+            f.write(struct.pack('<6i', *([1] * 6)))   # periodic boundaries
+            f.write(struct.pack('<6d', *np.ravel(box)))
+            f.write(struct.pack('<i', len(columns)))
+            if new_format:
+                f.write(struct.pack('<i', 5) + b'metal' + struct.pack('<b', 0))
+                f.write(struct.pack('<i', len(' '.join(columns))) + ' '.join(columns).encode())
+            f.write(struct.pack('<i', nchunk))
+            for chunk in np.array_split(values, nchunk):
+                f.write(struct.pack('<i', chunk.size))
+                f.write(chunk.astype('<f8').tobytes())
+
+
+def test_lammps_bindump(tmpdir):
+    import os
+    import numpy as np
+    import thermocepstrum as tc
+
+    columns = ['id', 'type', 'xu', 'yu', 'zu', 'vx', 'vy', 'vz', 'c_energy']
+    text = tc.i_o.LAMMPS_Dump('./data/NaCl.lammpstrj', quiet=True, index=False)
+    data_ref = text.read_timesteps((0, 1001), select_ckeys=['id', 'type', 'xu', 'vx', 'vz', 'energy'])
+    with open('./data/NaCl.lammpstrj', 'r') as f:   # atom lines in the file order (not sorted by id)
+        lines = f.read().splitlines()
+    frames = []
+    for i, frame in zip(range(0, len(lines), 9 + text.NATOMS), data_ref):
+        values = [line.split() for line in lines[i + 9:i + 9 + text.NATOMS]]
+        frames.append((frame['TIMESTEP'], np.array([[v[j] for j in [0, 1] + list(range(3, 10))] for v in values],
+                                                   dtype=float)))
+
+    for new_format in [True, False]:
+        filename = os.path.join(str(tmpdir), 'NaCl{}.bin'.format(int(new_format)))
+        write_bindump(filename, frames, text.NATOMS, text.BOX_BOUNDS, columns, new_format)
+        kwargs = {} if new_format else {'columns': columns}
+        for index in [False, True, True]:   # build and then load the index
+            traj = tc.i_o.LAMMPS_BinaryDump(filename, quiet=True, index=index, **kwargs)
+            assert sorted(traj.all_ckeys) == sorted(key for key in text.all_ckeys if key != 'element')
+            assert np.array_equal(traj.all_timesteps, text.all_timesteps)
+            assert np.array_equal(traj.BOX_BOUNDS, text.BOX_BOUNDS)
+            data = traj.read_timesteps((0, 1001), select_ckeys=['id', 'type', 'xu', 'vx', 'vz', 'energy'])
+            assert len(data) == len(data_ref)
+            for frame, frame_ref in zip(data, data_ref):
+                for key in frame_ref:
+                    assert np.array_equal(frame[key], frame_ref[key])
+            data = traj.read_timesteps(3, start_step=300)   # go back
+            assert [frame['TIMESTEP'] for frame in data] == [300, 400, 500]
+            assert np.array_equal(data[0]['vx'], data_ref[3]['vx'])
+        assert os.path.exists(filename + '.tcindex')
+
+    # old-format files without column names
+    try:
+        tc.i_o.LAMMPS_BinaryDump(filename, quiet=True, index=False)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('missing column names not detected')
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    import tempfile
+    test_lammps_bindump(tempfile.mkdtemp())
@@ -0,0 +1,84 @@
+def test_lammpsdump_index(tmpdir):
+    import os
+    import shutil
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['id', 'element', 'xu', 'energy']
+    filename = os.path.join(str(tmpdir), 'NaCl.lammpstrj')   # the index is written next to the file
+    shutil.copy('./data/NaCl.lammpstrj', filename)
+    index = tc.i_o.read_lammps_dump.build_dump_index(filename)
+    data = []
+    for kwargs in [{'index': False}, {'preload': False, 'index': False}, {}, {'preload': False}]:
+        traj = tc.i_o.LAMMPS_Dump(filename, quiet=True, **kwargs)
+        if kwargs == {'index': False}:   # the offsets are recorded while preloading the timesteps
+            assert traj._timestep_offsets == dict(zip(index['timesteps'], index['offsets']))
+        blocks = [traj.read_timesteps((500, 900), select_ckeys=keys)]
+        blocks.append(traj.read_timesteps(3, start_step=100))   # go back
+        blocks.append(traj.read_timesteps(2))
+        data.append(blocks)
+    assert os.path.exists(filename + '.tcindex')
+    assert np.array_equal(traj.all_timesteps, np.arange(0, 1001, 100))
+
+    for blocks in data[1:]:
+        for block, block_ref in zip(blocks, data[0]):
+            assert len(block) == len(block_ref)
+            for frame, frame_ref in zip(block, block_ref):
+                for key in frame_ref:
+                    assert np.array_equal(frame[key], frame_ref[key])
+    assert [frame['TIMESTEP'] for frame in data[0][1]] == [100, 200, 300]
+    assert [frame['TIMESTEP'] for frame in data[0][2]] == [400, 500]
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_lammpsdump_frames():
+    import numpy as np
+    import thermocepstrum as tc
+
+    # reference: parse the atom lines of each timestep one by one
+    with open('./data/NaCl.lammpstrj', 'r') as f:
+        lines = f.read().splitlines()
+    natoms = int(lines[3])
+    frames = [lines[i + 9:i + 9 + natoms] for i in range(0, len(lines), 9 + natoms)]
+
+    traj = tc.i_o.LAMMPS_Dump('./data/NaCl.lammpstrj', quiet=True, index=False)
+    data = traj.read_timesteps((0, 1001), select_ckeys=['element', 'xu', 'energy'])
+    assert len(data) == len(frames)
+    assert sorted(traj.categories['element']) == ['Cl', 'Na']
+    for frame, frame_lines in zip(data, frames):
+        values = sorted([line.split() for line in frame_lines], key=lambda v: int(v[0]))
+        assert frame['element'].dtype == tc.i_o.read_lammps_dump.CATEGORY_DTYPE
+        assert list(traj.decode('element', frame['element'][:, 0])) == [v[2] for v in values]
+        assert np.array_equal(frame['xu'][:, 0], [float(v[3]) for v in values])
+        assert np.array_equal(frame['energy'][:, 0], [float(v[9]) for v in values])
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_dump_currents():
+    import numpy as np
+    import thermocepstrum as tc
+
+    traj = tc.i_o.LAMMPS_Dump('./data/NaCl.lammpstrj', quiet=True, index=False)
+    data = traj.read_timesteps((0, 1001), select_ckeys=['type', 'vx', 'vy', 'vz', 'energy'])
+    for species_key, species in [('type', [1, 2]), ('element', ['Cl', 'Na'])]:
+        J = tc.i_o.compute_dump_currents(traj, (0, 1001), start_step=0, species_key=species_key, energy_key='energy',
+                                         masses=dict(zip(species, [1., 2.])), charges=dict(zip(species, [1., -1.])))
+        assert J['species'] == species
+        assert np.array_equal(J['TIMESTEP'], [frame['TIMESTEP'] for frame in data])
+        for istep, frame in enumerate(data):
+            velocity = np.hstack([frame['vx'], frame['vy'], frame['vz']])
+            vsum = [velocity[frame['type'][:, 0] == t].sum(axis=0) for t in [1, 2]]
+            if species_key == 'element':   # Cl is type 2
+                vsum = vsum[::-1]
+            assert np.allclose(J['vsum_{}'.format(species[0])][istep], vsum[0], rtol=1e-12, atol=1e-15)
+            assert np.allclose(J['mass_{}'.format(species[1])][istep], 2. * vsum[1], rtol=1e-12, atol=1e-15)
+            assert np.allclose(J['charge'][istep], vsum[0] - vsum[1], rtol=1e-12, atol=1e-15)
+            assert np.allclose(J['energy'][istep], np.dot(frame['energy'][:, 0], velocity), rtol=1e-12)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    import tempfile
+    test_lammpsdump_index(tempfile.mkdtemp())
+    test_lammpsdump_frames()
+    test_dump_currents()
@@ -0,0 +1,102 @@
+def test_lammpslog_engines():
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['Step', 'Temp', 'flux', 'vcm[1]']
+    data = {}
+    for engine in ['python', 'numpy']:
+        jfile = tc.i_o.LAMMPSLogFile('./data/NaCl.log', run_keyword='PRODUCTION RUN', index=False)
+        data[engine] = [jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys, engine=engine)]
+        data[engine].append(jfile.read_datalines(start_step=15, NSTEPS=101, select_ckeys=keys, engine=engine))
+        data[engine].append(jfile.read_datalines(NSTEPS=10, select_ckeys=keys, engine=engine))
+
+    for block_python, block_numpy in zip(data['python'], data['numpy']):
+        for key in keys:
+            assert block_numpy[key].shape == block_python[key].shape
+            assert np.array_equal(block_numpy[key], block_python[key])
+    # the run ends with the 'Loop time' line
+    assert data['numpy'][0]['Step'].shape == (3000, 1)
+    assert data['numpy'][0]['Step'][-1, 0] == 2999
+    assert data['numpy'][1]['Step'][0, 0] == 15
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_lammpslog_index(tmpdir):
+    import os
+    import shutil
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['Step', 'flux']
+    filename = os.path.join(str(tmpdir), 'NaCl.log')   # the index is written next to the file
+    shutil.copy('./data/NaCl.log', filename)
+    data = []
+    for use_index in [False, True, True]:   # no index, build index, load index
+        jfile = tc.i_o.LAMMPSLogFile(filename, run_keyword='PRODUCTION RUN', index=use_index)
+        data.append(jfile.read_datalines(start_step=1234, NSTEPS=100, select_ckeys=keys))
+        assert jfile.MAX_NSTEPS == 3004
+    assert os.path.exists(filename + '.tcindex')
+    for key in keys:
+        assert np.array_equal(data[0][key], data[1][key])
+        assert np.array_equal(data[0][key], data[2][key])
+    assert data[2]['Step'][0, 0] == 1234
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_lammpslog_iter_blocks():
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['Step', 'flux']
+    jfile = tc.i_o.LAMMPSLogFile('./data/NaCl.log', run_keyword='PRODUCTION RUN', index=False)
+    data = jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys, even_NSTEPS=False)
+    blocks = list(jfile.iter_blocks(700, start_step=0, select_ckeys=keys))   # stops at the endrun_keyword
+    assert [block['Step'].shape[0] for block in blocks] == [700, 700, 700, 700, 201]
+    for key in keys:
+        assert np.array_equal(np.concatenate([block[key] for block in blocks]), data[key])
+    blocks = list(jfile.iter_blocks(100, start_step=15, NSTEPS=250, select_ckeys=keys))
+    assert [block['Step'].shape[0] for block in blocks] == [100, 100, 50]
+    assert np.array_equal(np.concatenate([block['flux'] for block in blocks]), data['flux'][15:265])
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_lammpslog_follow(tmpdir):
+    import os
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['Step', 'flux']
+    jfile = tc.i_o.LAMMPSLogFile('./data/NaCl.log', run_keyword='PRODUCTION RUN', index=False)
+    data = jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys, even_NSTEPS=False)
+    with open('./data/NaCl.log', 'rb') as f:
+        content = f.read()
+    header_end = content.find(b'\n', content.find(b'Step Temp c_flux')) + 1
+
+    # write the log in pieces, cutting lines in the middle, as a running simulation would do
+    filename = os.path.join(str(tmpdir), 'running.log')
+    cuts = [header_end + 10, header_end + 5000, header_end + 5001, header_end + 123456, len(content)]
+    with open(filename, 'wb') as f:
+        f.write(content[:cuts[0]])
+    jfile = tc.i_o.LAMMPSLogFile(filename, run_keyword='PRODUCTION RUN', index=False)
+    jfile.follow(select_ckeys=keys)
+    assert jfile.NSTEPS == 0
+    for begin, end in zip(cuts[:-1], cuts[1:]):
+        with open(filename, 'ab') as f:
+            f.write(content[begin:end])
+        nsteps = jfile.NSTEPS
+        nnew = jfile.poll()
+        assert jfile.NSTEPS == nsteps + nnew
+        assert jfile.NSTEPS == content[header_end:end].count(b'\n') or (end == len(content))
+        for key in keys:
+            assert np.array_equal(jfile.data[key], data[key][:jfile.NSTEPS])
+    assert jfile.NSTEPS == 3001   # stopped at the endrun_keyword
+    assert list(jfile.iter_poll(interval=0.01)) == []
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    import tempfile
+    test_lammpslog_engines()
+    test_lammpslog_index(tempfile.mkdtemp())
+    test_lammpslog_iter_blocks()
+    test_lammpslog_follow(tempfile.mkdtemp())
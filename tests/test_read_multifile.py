@@ -0,0 +1,63 @@
+def test_multifile(tmpdir):
+    import os
+    import numpy as np
+    import thermocepstrum as tc
+
+    table = np.loadtxt('./data/NaCl.dat', skiprows=1, max_rows=3000)[:, :4]
+    steps = np.arange(table.shape[0])
+    # three restart segments: the second one restarts from step 900, before the end of the first one
+    filenames = []
+    for i, (begin, end) in enumerate([(0, 1000), (900, 2000), (2000, 3000)]):
+        filenames.append(os.path.join(str(tmpdir), 'segment{:d}.dat'.format(i)))
+        np.savetxt(filenames[-1], np.column_stack((steps[begin:end], table[begin:end])), fmt='%.10g',
+                   header='Step Temp c_flux[1] c_flux[2] c_flux[3]', comments='')
+
+    keys = ['Step', 'Temp', 'flux']
+    jfile = tc.i_o.MultiFile(filenames, 'table')
+    assert jfile.segment_nsteps == [900, 1100, 1000]
+    assert jfile.MAX_NSTEPS == 3000
+    data = jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys)
+    assert np.array_equal(data['Step'][:, 0], steps)
+    assert np.allclose(data['flux'], table[:, 1:])
+    data = jfile.read_datalines(start_step=850, NSTEPS=1500, select_ckeys=keys)   # across the three segments
+    assert np.array_equal(data['Step'][:, 0], steps[850:2350])
+    data = jfile.read_datalines(NSTEPS=100, select_ckeys=keys)   # continue
+    assert np.array_equal(data['Step'][:, 0], steps[2350:2450])
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_multifile_malformed(tmpdir, capsys):
+    import os
+    import numpy as np
+    import thermocepstrum as tc
+
+    table = np.loadtxt('./data/NaCl.dat', skiprows=1, max_rows=30)[:, :4]
+    steps = np.arange(table.shape[0])
+    header = 'Step Temp c_flux[1] c_flux[2] c_flux[3]\n'
+    # a segment whose data lines are all malformed, followed by a valid one
+    filenames = [os.path.join(str(tmpdir), 'segment{:d}.dat'.format(i)) for i in range(3)]
+    with open(filenames[0], 'w') as f:
+        f.write(header + 'a b c d e\n' * 3)
+    # a segment with a malformed tail, overlapping the following one by 5 steps
+    with open(filenames[1], 'w') as f:
+        f.write(header)
+        np.savetxt(f, np.column_stack((steps[:15], table[:15])), fmt='%.10g')
+        f.write('x y z w v\n' * 2)
+    np.savetxt(filenames[2], np.column_stack((steps[10:], table[10:])), fmt='%.10g', header=header.strip(),
+               comments='')
+
+    jfile = tc.i_o.MultiFile(filenames, 'table')
+    out = capsys.readouterr().out
+    assert jfile.segment_nsteps == [0, 10, 20]
+    assert 'less steps read in {}: 0 instead of 3'.format(filenames[0]) in out
+    assert 'less steps read in {}: 15 instead of 17'.format(filenames[1]) in out
+    assert '{}: 5 overlapping steps dropped'.format(filenames[1]) in out
+    assert '{}: 3 overlapping'.format(filenames[0]) not in out
+    data = jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['Step', 'flux'])
+    assert np.array_equal(data['Step'][:, 0], steps)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    import tempfile
+    test_multifile(tempfile.mkdtemp())
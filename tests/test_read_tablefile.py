@@ -0,0 +1,171 @@
+def test_tablefile_engines():
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['Temp', 'flux', 'vcm[1]']
+    data = {}
+    for engine in ['python', 'numpy']:
+        jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+        data[engine] = [jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys, engine=engine)]
+        data[engine].append(jfile.read_datalines(start_step=15, NSTEPS=101, select_ckeys=keys, engine=engine))
+        data[engine].append(jfile.read_datalines(NSTEPS=10, select_ckeys=keys, engine=engine))
+
+    for block_python, block_numpy in zip(data['python'], data['numpy']):
+        for key in keys:
+            assert block_numpy[key].shape == block_python[key].shape
+            assert np.array_equal(block_numpy[key], block_python[key])
+    assert data['numpy'][0]['flux'].shape == (20000, 3)
+    assert data['numpy'][1]['flux'].shape == (100, 3)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_tablefile_parallel():
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['Temp', 'flux']
+    data = {}
+    for workers in [1, 3]:
+        jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+        data[workers] = [jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys, workers=workers)]
+        data[workers].append(jfile.read_datalines(start_step=15, NSTEPS=1001, select_ckeys=keys, workers=workers))
+        data[workers].append(jfile.read_datalines(NSTEPS=10, select_ckeys=keys, workers=workers))
+
+    for block_serial, block_parallel in zip(data[1], data[3]):
+        for key in keys:
+            assert np.array_equal(block_parallel[key], block_serial[key])
+    assert data[3][1]['flux'].shape == (1000, 3)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_tablefile_cache(tmpdir):
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['Temp', 'flux']
+    data = []
+    for i in range(2):   # parse and save into cache, then load from cache
+        jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True, cache=str(tmpdir))
+        data.append([jfile.read_datalines(start_step=15, NSTEPS=101, select_ckeys=keys)])
+        data[-1].append(jfile.read_datalines(NSTEPS=10, select_ckeys=keys))   # continue from the cached position
+        assert jfile.MAX_NSTEPS == 20000
+    assert isinstance(data[1][0]['flux'], np.memmap)
+    for block, block_cached in zip(data[0], data[1]):
+        for key in keys:
+            assert np.array_equal(block[key], block_cached[key])
+
+    # the state of the accumulators is cached with the data
+    stats = []
+    for i in range(2):
+        jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True, cache=str(tmpdir))
+        stats.append(tc.md.tools.BlockingAccumulator())
+        flux = jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['flux'], accumulators={'Temp': stats[-1]})
+    assert isinstance(flux['flux'], np.memmap)
+    assert stats[0].n == stats[1].n == 20000
+    assert np.array_equal(stats[0].mean, stats[1].mean) and np.array_equal(stats[0].mean_error, stats[1].mean_error)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_tablefile_compressed(tmpdir):
+    import os
+    import bz2
+    import gzip
+    import lzma
+    import numpy as np
+    import thermocepstrum as tc
+
+    keys = ['Temp', 'flux']
+    with open('./data/NaCl.dat', 'rb') as f:
+        content = f.read()
+    jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+    data = [jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys)]
+    data.append(jfile.read_datalines(start_step=15, NSTEPS=101, select_ckeys=keys))
+    for ext, module in [('gz', gzip), ('bz2', bz2), ('xz', lzma)]:
+        filename = os.path.join(str(tmpdir), 'NaCl.dat.' + ext)
+        with module.open(filename, 'wb') as f:
+            f.write(content)
+        jfile = tc.i_o.TableFile(filename, group_vectors=True)
+        assert jfile.MAX_NSTEPS == 20000
+        blocks = [jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys)]
+        blocks.append(jfile.read_datalines(start_step=15, NSTEPS=101, select_ckeys=keys))   # go back
+        for block, block_ref in zip(blocks, data):
+            for key in keys:
+                assert np.array_equal(block[key], block_ref[key])
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_tablefile_projected():
+    import numpy as np
+    import thermocepstrum as tc
+    from thermocepstrum.i_o import chunkparse
+
+    default_fraction = chunkparse.PROJECT_FRACTION
+    data = {}
+    try:
+        for fraction in [0., 1.]:   # never / always convert only the selected columns
+            chunkparse.PROJECT_FRACTION = fraction
+            data[fraction] = []
+            for keys in [['Temp'], ['vcm[1]', 'Temp']]:
+                jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+                data[fraction].append(jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=keys))
+                data[fraction].append(jfile.read_datalines(start_step=15, NSTEPS=101, select_ckeys=keys))
+    finally:
+        chunkparse.PROJECT_FRACTION = default_fraction
+
+    for block_full, block_projected in zip(data[0.], data[1.]):
+        for key in block_full:
+            assert np.array_equal(block_projected[key], block_full[key])
+    assert data[1.][2]['vcm[1]'].shape == (20000, 3)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_tablefile_resampled():
+    import numpy as np
+    import thermocepstrum as tc
+
+    for NSTEPS, TSKIP in [(0, 18), (99999, 18), (99981, 7), (50001, 1)]:
+        jfile = tc.i_o.TableFile('./data/Silica.dat', group_vectors=True)
+        jfile.read_datalines(start_step=0, NSTEPS=NSTEPS, select_ckeys=['flux1'])
+        j = tc.HeatCurrent(jfile.data['flux1'], 'metal', 1.0, 1065.705630, 3130.431110818)
+        jf = tc.heatcurrent.resample_current(j, TSKIP=TSKIP, plot=False)
+        data = tc.i_o.read_resampled(jfile, TSKIP, select_ckeys=['flux1'], NSTEPS=NSTEPS, block_steps=1000)
+        assert np.array_equal(data['flux1'], jf.traj)
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+def test_tablefile_accumulators():
+    import numpy as np
+    import thermocepstrum as tc
+
+    jfile = tc.i_o.TableFile('./data/NaCl.dat', group_vectors=True)
+    temp = jfile.read_datalines(start_step=0, NSTEPS=0, select_ckeys=['Temp'], even_NSTEPS=False)['Temp']
+    for engine, workers, NSTEPS in [('numpy', 1, 0), ('numpy', 1, 15001), ('numpy', 3, 15001), ('python', 1, 1001)]:
+        accumulator = tc.md.tools.BlockingAccumulator()
+        data = jfile.read_datalines(start_step=0, NSTEPS=NSTEPS, select_ckeys=['flux'], engine=engine,
+                                    workers=workers, accumulators={'Temp': accumulator})
+        assert 'Temp' not in data
+        nsteps = NSTEPS if NSTEPS else temp.shape[0]
+        assert accumulator.n == nsteps
+        assert np.allclose(accumulator.mean, np.mean(temp[:nsteps], axis=0), rtol=1e-13)
+        assert np.allclose(accumulator.std, np.std(temp[:nsteps], axis=0), rtol=1e-10)
+        # blocking analysis: variance of the averages of blocks of 2**k steps
+        block_size, nblocks, error, error_std = accumulator.blocking()
+        for k in range(len(block_size)):
+            blocks = temp[:nblocks[k] * 2**k].reshape((nblocks[k], 2**k)).mean(axis=1)
+            assert np.allclose(error[k], np.std(blocks) / np.sqrt(nblocks[k] - 1), rtol=1e-8)
+        assert accumulator.mean_error[0] > error[0, 0]   # correlated series
+    accumulator = tc.md.tools.BlockingAccumulator()
+    accumulator.add(temp[:1])
+    assert np.all(np.isnan(accumulator.mean_error))   # less than 2 steps
+    print('*********************\n   TEST:  passed.\n*********************\n')
+
+
+if __name__ == '__main__':
+    import tempfile
+    test_tablefile_engines()
+    test_tablefile_parallel()
+    test_tablefile_cache(tempfile.mkdtemp())
+    test_tablefile_compressed(tempfile.mkdtemp())
+    test_tablefile_projected()
+    test_tablefile_resampled()
+    test_tablefile_accumulators()
@@ -57,9 +57,11 @@ This script performs the cepstral analysis. It outputs some results in the stdou
 
 INPUT FORMAT:
  - table  : a column-formatted text file, with a header in the same format of LAMMPS. The name of the LAMMPS compute can start with c_ and end with [#some_number], the code will recognize vectors, and will read automatically all the components.
- - dict   : a Numpy binary file containing a dictionary (e.g. obtained from the script i_o/read_lammps_log.py)
+ - dict   : a Numpy .npz file containing a dictionary of arrays (e.g. obtained from the script i_o/read_lammps_log.py, see i_o/dictfile.py)
  - LAMMPS : a LAMMPS log file. In this case a --run-keyword  must be provided, that identifies the run to be read (see documentation of i_o/read_lammps_log.py)
+ - hdf5   : an HDF5 file containing one dataset for each current, and optionally the TEMPERATURE and VOLUME attributes (see i_o/hdf5file.py, requires h5py)
 The average temperature is computed if a column with the header 'Temp' is found; otherwise you have to specify it.
+The mean and the block-averaged error of the 'Temp' and 'Press' columns are accumulated while the file is read.
 You must provide the name of the heat flux compute. You can also provide additional currents if your system is a multi-component fluid.
 (Notice that the output is the same with any number of components. If you have a lots of components, note that you may want to use more than 3 independent processes -- see theory.)
 Units can be metal or real (see LAMMPS documentation at http://lammps.sandia.gov/doc/units.html )
@@ -81,6 +83,8 @@ OUTPUT DATA files (can be text ".dat" or binary ".npy"):
       the line number minus one is the number of cepstral coefficients used (P*).
   [output].cepstrumfiltered_psd
       freqs [THz], cepstrum-filtered periodogram, cepstrum-filtered log(periodogram)
+  [output].h5 (with --hdf5-output)
+      all the above in the groups "results" (analysis of the resampled current) and "original" (if resampled)
 
 -------------------------
 Example:
@@ -106,21 +110,27 @@ Contact: lercole@sissa.it
 
     # yapf: disable
     parser = argparse.ArgumentParser(description=main.__doc__, epilog=_epilog, formatter_class=argparse.RawTextHelpFormatter)
-    parser.add_argument( 'inputfile', type=str, help='input file to read (default format: Table)' )
+    parser.add_argument( 'inputfile', type=str, nargs='+', help='input file to read (default format: Table). If several files are given (e.g. one for each restart), they are joined in a single time series, dropping the overlapping steps (a Step column is needed)' )
     parser.add_argument( '-t', '--timestep', type=float, required=True, help='Time step of the log.write_loged data (fs)' )
     parser.add_argument( '-k', '--heatfluxkey', type=str, required=True, help='Name of the column keyword that identifies the heat flux' )
     parser.add_argument( '-N', '--nsteps', type=int, default=0, help='Number of steps to read (default: 0=all)' )
     parser.add_argument( '-S', '--start-step', type=int, default=0, help='The first step to read (default: 0=first)' )
-    parser.add_argument( '--input-format', default='table', type=str, choices=['table','dict','lammps'], help='Format of the input file' )
+    parser.add_argument( '--input-format', default='table', type=str, choices=['table','dict','lammps','hdf5'], help='Format of the input file' )
     parser.add_argument( '--cindex', nargs='*', type=int, help='Column indexes of the heatflux to read (0,1,2,...)' )
     parser.add_argument( '--sindex', nargs='*', type=int, help='Column indexes of the heatflux to substract from the flux read with --cindex (3,4,5,...)' )
     parser.add_argument( '--run-keyword', type=str, help='Keyword that identifies the run to be read (only for "lammps" format)' )
+    parser.add_argument( '--cache', nargs='?', const=True, default=None, metavar='CACHE_DIR', help='cache the data read from the input file in binary files, to load them instantly the next time (single input file only, default CACHE_DIR: $THERMOCEPSTRUM_CACHE or ~/.cache/thermocepstrum)' )
+    parser.add_argument( '--read-workers', type=int, default=1, help='Number of processes used to parse the input file (only for "table" and "lammps" formats and a single input file, default: 1)' )
+    parser.add_argument( '--fft-backend', type=str, default='scipy', choices=['scipy','pyfftw','numpy'], help='Library used to compute the FFTs (pyfftw requires the pyFFTW package, default: scipy)' )
+    parser.add_argument( '--fft-workers', type=int, default=1, help='Number of threads used to compute the FFTs (-1 = all the CPUs, default: 1)' )
+    parser.add_argument( '--single-precision', action='store_true', help='store the currents in single precision (float32) and compute their FFT in single precision, to halve the memory used. The periodogram is still accumulated in double precision, but the values read are rounded to ~7 significant digits' )
     parser.add_argument( '--split', type=int, default=1, help='Build a time series with n*m independent processes (n is the number of processes of the original timeseries, m is the number provided with --split). The length of the new time series will be [original length]/m.')
 
     parser.add_argument( '-o', '--output', type=str, default='output', help='prefix of the output files' )
     parser.add_argument( '-O', '--bin-output', action='store_true', help='save also binary files' )
     parser.add_argument( '--no-text-output', action='store_true', help='do not save text files' )
     parser.add_argument( '--bin-output-old', action='store_true', help='use old format for binary files (compatibility)' )
+    parser.add_argument( '--hdf5-output', action='store_true', help='save also the results in an HDF5 file (requires h5py)' )
 
     parser.add_argument( '-V', '--volume', type=float, help='Volume of the cell (Angstrom). If not set it will be read from structure file or inputfile.' )
     parser.add_argument( '--structure', type=str, help='LAMMPS data file containing the structure. Read to get Volume.' )
@@ -146,7 +156,8 @@ Contact: lercole@sissa.it
     args = parser.parse_args()
 
     # yapf: enable
-    inputfile = args.inputfile
+    inputfiles = args.inputfile
+    inputfile = ' '.join(inputfiles)
     DT_FS = args.timestep
     j1_key = args.heatfluxkey
     NSTEPS = args.nsteps
@@ -155,12 +166,18 @@ Contact: lercole@sissa.it
     jindex = args.cindex
     sindex = args.sindex
     run_keyword = args.run_keyword
+    cache = args.cache
+    read_workers = args.read_workers
+    fft_backend = args.fft_backend
+    fft_workers = args.fft_workers
+    dtype = np.float32 if args.single_precision else float
     NSPLIT = args.split
 
     output = args.output
     binout = args.bin_output
     binout_old = args.bin_output_old
     no_text_out = args.no_text_output
+    hdf5_out = args.hdf5_output
 
     units = args.units
     temperature = args.temperature
@@ -200,6 +217,11 @@ Contact: lercole@sissa.it
         raise ValueError('the correction factor must be positive')
     if (NSPLIT < 1):
         raise ValueError('The number of splits must be a positive number')
+    if (read_workers < 1):
+        raise ValueError('The number of read workers must be a positive number')
+    if (len(inputfiles) > 1) and (cache or (read_workers > 1)):
+        raise ValueError('--cache and --read-workers cannot be used with more than one input file')
+    tc.md.fftbackend.set_backend(fft_backend, fft_workers)
 
     ncurrents = len(j2_keys) + 1
 
@@ -219,24 +241,53 @@ Contact: lercole@sissa.it
 
     ## Read data
     jdata = None
+    stats = {}   # statistics of the scalar columns (Temp, Press), accumulated while reading
     if (input_format == 'table'):
-        if temperature is None:
-            selected_keys.append('Temp')
-#      if 'Press' in jfile.ckey:
-#         selected_keys.append('Press')
-        jfile = tc.i_o.TableFile(inputfile, group_vectors=True)
-        jfile.read_datalines(start_step=START_STEP, NSTEPS=NSTEPS, select_ckeys=selected_keys)
+        if (len(inputfiles) > 1):
+            jfile = tc.i_o.MultiFile(inputfiles, 'table', group_vectors=True)
+        else:
+            jfile = tc.i_o.TableFile(inputfile, group_vectors=True, cache=cache)
+        stats = {key: tc.md.tools.BlockingAccumulator() for key in ['Temp', 'Press'] if key in jfile.all_ckeys}
+        if temperature is not None:
+            stats.pop('Temp', None)
+        if (len(inputfiles) > 1):
+            jfile.read_datalines(start_step=START_STEP, NSTEPS=NSTEPS, select_ckeys=selected_keys, dtype=dtype,
+                                 accumulators=stats)
+        else:
+            jfile.read_datalines(start_step=START_STEP, NSTEPS=NSTEPS, select_ckeys=selected_keys, workers=read_workers,
+                                 dtype=dtype, accumulators=stats)
         jdata = jfile.data
         START_STEP = 0   # reset to zero, as later we will need to read all of jdata
     elif (input_format == 'dict'):
-        jdata = np.load(inputfile, allow_pickle=True).tolist()
-    elif (input_format == 'lammps'):
-        jfile = tc.i_o.LAMMPSLogFile(inputfile, run_keyword=run_keyword)
-        if temperature is None:
+        if (len(inputfiles) > 1):
+            raise ValueError('Only one input file can be read with the dict format.')
+        jdata = tc.i_o.load_dict(inputfile)   # arrays are memory-mapped when accessed
+    elif (input_format == 'hdf5'):
+        if (len(inputfiles) > 1):
+            raise ValueError('Only one input file can be read with the hdf5 format.')
+        jfile = tc.i_o.HDF5File(inputfile)
+        if (temperature is None) and ('Temp' in jfile.all_ckeys):
             selected_keys.append('Temp')
-#      if 'Press' in jfile.ckey:
-#         selected_keys.append('Press')
-        jfile.read_datalines(NSTEPS, select_ckeys=selected_keys)
+        jdata = jfile.read_datalines(NSTEPS, START_STEP, selected_keys, dtype=dtype)   # only the steps selected
+        if 'TEMPERATURE' in jfile.attrs:
+            jdata['Temp_ave'] = jfile.attrs['TEMPERATURE']
+        if 'VOLUME' in jfile.attrs:
+            jdata['Volume'] = jfile.attrs['VOLUME']
+        jfile.close()
+        START_STEP = 0   # reset to zero, as later we will need to read all of jdata
+    elif (input_format == 'lammps'):
+        if (len(inputfiles) > 1):
+            jfile = tc.i_o.MultiFile(inputfiles, 'lammps', run_keyword=run_keyword)
+        else:
+            jfile = tc.i_o.LAMMPSLogFile(inputfile, run_keyword=run_keyword, cache=cache)
+        stats = {key: tc.md.tools.BlockingAccumulator() for key in ['Temp', 'Press'] if key in jfile.all_ckeys}
+        if temperature is not None:
+            stats.pop('Temp', None)
+        if (len(inputfiles) > 1):
+            jfile.read_datalines(NSTEPS, start_step=0, select_ckeys=selected_keys, dtype=dtype, accumulators=stats)
+        else:
+            jfile.read_datalines(NSTEPS, start_step=0, select_ckeys=selected_keys, workers=read_workers, dtype=dtype,
+                                 accumulators=stats)
         jdata = jfile.data
     else:
         raise NotImplemented('input format not implemented.')
@@ -267,12 +318,15 @@ Contact: lercole@sissa.it
         NSTEPS = jdata[list(jdata.keys())[0]].shape[0]
 
     ## Define Temperature
+    if (temperature is None) and ('Temp' not in stats) and ('Temp' in jdata):   # (dict and hdf5 formats)
+        stats['Temp'] = tc.md.tools.BlockingAccumulator()
+        stats['Temp'].add(jdata['Temp'])
+        if 'Temp' in selected_keys:
+            selected_keys.remove('Temp')
     if temperature is None:
-        if 'Temp' in jdata:
-            temperature = np.mean(jdata['Temp'])
-            temperature_std = np.std(jdata['Temp'])   # this is wrong (needs block average)
-            if 'Temp' in selected_keys:
-                selected_keys.remove('Temp')
+        if 'Temp' in stats:
+            temperature = stats['Temp'].mean[0]
+            temperature_std = stats['Temp'].mean_error[0]   # error of the mean (block average)
             log.write_log(' Mean Temperature (computed):  {} K  +/-  {}'.format(temperature, temperature_std))
             logfile.write(' Mean Temperature (computed):  {} K  +/-  {}\n'.format(temperature, temperature_std))
         elif 'Temp_ave' in jdata:
@@ -289,6 +343,10 @@ Contact: lercole@sissa.it
     else:
         log.write_log(' Mean Temperature (input):  {} K'.format(temperature))
         logfile.write(' Mean Temperature (input):  {} K\n'.format(temperature))
+    if 'Press' in stats:
+        pressure, pressure_std = stats['Press'].mean[0], stats['Press'].mean_error[0]
+        log.write_log(' Mean Pressure (computed):  {}  +/-  {}'.format(pressure, pressure_std))
+        logfile.write(' Mean Pressure (computed):  {}  +/-  {}\n'.format(pressure, pressure_std))
 
     ## Define Volume
     if volume is None:
@@ -333,7 +391,7 @@ Contact: lercole@sissa.it
     log.write_log(currents)
 
     # create HeatCurrent object
-    j = tc.heatcurrent.HeatCurrent(currents, units, DT_FS, temperature, volume, psd_filter_w)
+    j = tc.heatcurrent.HeatCurrent(currents, units, DT_FS, temperature, volume, psd_filter_w, dtype=dtype)
 
     log.write_log(' Number of currents = {}'.format(ncurrents))
     logfile.write(' Number of currrents = {}\n'.format(ncurrents))
@@ -376,17 +434,9 @@ Contact: lercole@sissa.it
             outfile_header = 'freqs_THz  psd  fpsd  logpsd  flogpsd\n'
             np.savetxt(outfile_name, outarray, header=outfile_header)
             if j.many_currents:
-                outfile_name = output + '.cospectrum.dat'
-                outarray = np.c_[j.freqs_THz,
-                                 j.cospectrum.reshape((j.cospectrum.shape[0] * j.cospectrum.shape[1],
-                                                       j.cospectrum.shape[2])).transpose()]
-                np.savetxt(outfile_name, outarray)
-
-                outfile_name = output + '.cospectrum.filt.dat'
-                outarray = np.c_[j.freqs_THz,
-                                 j.fcospectrum.reshape((j.fcospectrum.shape[0] * j.fcospectrum.shape[1],
-                                                        j.fcospectrum.shape[2])).transpose()]
-                np.savetxt(outfile_name, outarray)
+                # the full matrices are built from their packed upper triangle, a chunk of frequencies at a time
+                savetxt_cospectrum(output + '.cospectrum.dat', j.freqs_THz, j.cospectrum_packed)
+                savetxt_cospectrum(output + '.cospectrum.filt.dat', j.freqs_THz, j.fcospectrum_packed)
 
         # resample and plot
         if resample:
@@ -547,6 +597,10 @@ Contact: lercole@sissa.it
             binoutobj.write_old_binary(output)
         else:
             np.save(output, binoutobj)
+    if hdf5_out:
+        tc.i_o.write_results(output + '.h5', jf, 'results', mode='w')
+        if resample:
+            tc.i_o.write_results(output + '.h5', j, 'original')
 
     return 0
 
@@ -592,8 +646,9 @@ def plt_cepstral_conv(jf, pstar_max=None, k_SI_max=None, pstar_tick=None, kappa_
 
 
 def plt_other(jf, idx1, idx2, f_THz_max=None, k_SI_max=None, k_SI_min=None, k_tick=None, f_tick=None):
+    fcospectrum = tc.md.cospectrum.packed_element(jf.fcospectrum_packed, idx1, idx2)
     if f_THz_max is None:
-        idx_max = index_cumsum(np.abs(jf.fcospectrum[idx1][idx2]), 0.95)
+        idx_max = index_cumsum(np.abs(fcospectrum), 0.95)
         f_THz_max = jf.freqs_THz[idx_max]
     else:
         maxT = jf.freqs_THz[-1]
@@ -602,14 +657,14 @@ def plt_other(jf, idx1, idx2, f_THz_max=None, k_SI_max=None, k_SI_min=None, k_ti
 
     if k_SI_max is None:
         k_SI_max = np.max(
-            np.abs(jf.fcospectrum[idx1][idx2])[:int(jf.freqs_THz.shape[0] * f_THz_max / jf.freqs_THz[-1])] *
+            np.abs(fcospectrum)[:int(jf.freqs_THz.shape[0] * f_THz_max / jf.freqs_THz[-1])] *
             jf.kappa_scale * 0.5) * 1.3
     if k_SI_min is None:
         k_SI_min = -k_SI_max
 
     figure, ax = plt.subplots(1, 1, figsize=(3.8, 2.3))
-    ax.plot(jf.freqs_THz, np.real(jf.fcospectrum[idx1][idx2]) * jf.kappa_scale * 0.5, c=c[3], lw=1.0, zorder=1)
-    ax.plot(jf.freqs_THz, np.imag(jf.fcospectrum[idx1][idx2]) * jf.kappa_scale * 0.5, c=c[2], lw=1.0, zorder=1)
+    ax.plot(jf.freqs_THz, np.real(fcospectrum) * jf.kappa_scale * 0.5, c=c[3], lw=1.0, zorder=1)
+    ax.plot(jf.freqs_THz, np.imag(fcospectrum) * jf.kappa_scale * 0.5, c=c[2], lw=1.0, zorder=1)
 
     ax.set_ylim([k_SI_min, k_SI_max])
     ax.set_xlim([0, f_THz_max])
@@ -660,7 +715,8 @@ def plt_psd(jf, j2=None, j2pl=None, f_THz_max=None, k_SI_max=None, k_tick=None,
     if j2pl is not None:
         plt.plot(j2pl.freqs_THz, j2pl.dct.psd * j2pl.kappa_scale * 0.5, c=c[1], zorder=1)
     try:
-        plt.plot(jf.freqs_THz, np.real(jf.fcospectrum[0][0]) * jf.kappa_scale * 0.5, c=c[3], lw=1.0, zorder=1)
+        plt.plot(jf.freqs_THz, np.real(tc.md.cospectrum.packed_element(jf.fcospectrum_packed, 0, 0)) * jf.kappa_scale *
+                 0.5, c=c[3], lw=1.0, zorder=1)
     except:
         pass
 
@@ -694,6 +750,16 @@ def n_tick_in_range(beg, end, n):
     return delta, delta / 2
 
 
+def savetxt_cospectrum(outfile_name, freqs, packed):
+    """Write the freqs and the full matrix (flattened) of a packed cospectrum, a chunk of frequencies at a time."""
+    M = tc.md.cospectrum.packed_order(packed)
+    with open(outfile_name, 'w') as outfile:
+        for begin in range(0, packed.shape[1], tc.md.cospectrum.CHUNK_FREQS):
+            end = begin + tc.md.cospectrum.CHUNK_FREQS
+            cospectrum = tc.md.cospectrum.unpack_cospectrum(packed, begin, end)
+            np.savetxt(outfile, np.c_[freqs[begin:end], cospectrum.reshape((M * M, cospectrum.shape[2])).transpose()])
+
+
 def index_cumsum(arr, p):
     if (p > 1 or p < 0):
         raise ValueError('p must be between 0 and 1')
@@ -21,6 +21,33 @@ def freq_THz_to_red(f, DT_FS):
     return f / 1000. * DT_FS
 
 
+# quantities computed on first access, in stages (each stage depends on the previous ones)
+LAZY_STAGES = ['psd', 'mel', 'cepstral']
+LAZY_ATTRIBUTES = {
+    'psd': ['psd', 'logpsd', 'psd_min', 'psd_power', 'psdALL', 'spectrALL', 'fpsd', 'flogpsd', 'cospectrum_packed',
+            'fcospectrum_packed', 'onsager_psd'],
+    'mel': ['mel_filtered', 'mel_points', 'mel_bins', 'mel_filtered_freqs', 'mel_filtered_psd',
+            'mel_filtered_freqs_THz', 'mel_logpsd', 'mel_psd_min', 'mel_psd_power'],
+    'cepstral': ['ndf_chi', 'ck_THEORY_var', 'psd_THEORY_mean', 'mel_ck_THEORY_var', 'mel_psd_THEORY_mean',
+                 'mel_var_list'],
+}
+
+
+def _lazy_property(name, stage):
+    """A property of HeatCurrent that evaluates its stage (if still pending) on first access."""
+    private = '_' + name
+
+    def getter(self):
+        if stage in self._pending:
+            self._evaluate(stage)
+        return getattr(self, private, None)
+
+    def setter(self, value):
+        setattr(self, private, value)
+
+    return property(getter, setter, doc='{} (computed on first access)'.format(name))
+
+
 class HeatCurrent(MDSample):
     """
     HeatCurrent API for thermo-cepstral analysis.
@@ -35,12 +62,26 @@ class HeatCurrent(MDSample):
      - VOLUME        simulation cell volume [A^3]
      - PSD_FILTER_W  PSD filter window [freq_units] (optional)
      - freq_units    frequency units   [THz or red] (optional)
+     - dtype         type used to store the currents (float or np.float32, optional).
+                     np.float32 halves the memory and computes the FFTs in single precision, while the periodogram
+                     and the cospectrum are still accumulated in double precision (see MDSample).
+     - onsager_currents  indexes of the currents of interest of a multi-component fluid (optional). The reduced PSDs
+                     of all of them are computed from the same factorization of the cospectrum (see
+                     MDSample.compute_kappa_multi and onsager_cepstral_analysis).
+
+    Nothing is computed when the object is built, apart from the frequency grid: the periodogram (psd, logpsd, fpsd,
+    cospectrum, ...), the mel-filtered quantities and the cepstral parameters (ck_THEORY_var, psd_THEORY_mean, ...)
+    are computed the first time that one of them is accessed, and then kept (see LAZY_ATTRIBUTES). For example, a
+    full-resolution HeatCurrent that is only resampled (resample_current) never computes its periodogram.
     """
 
-    def __init__(self, j, units, DT_FS, TEMPERATURE, VOLUME, PSD_FILTER_W=None, freq_units='THz', do_mel=False, mel_scale=1e12, mel_nrecursion=1, mel_nfilt=None,mel_log_flag=True):
+    def __init__(self, j, units, DT_FS, TEMPERATURE, VOLUME, PSD_FILTER_W=None, freq_units='THz', do_mel=False, mel_scale=1e12, mel_nrecursion=1, mel_nfilt=None,mel_log_flag=True, dtype=float,
+                 onsager_currents=None):
+
+        self._pending = set()   # stages not computed yet
 
         # check if we have a multicomponent fluid
-        j = np.array(j, dtype=float)
+        j = np.asarray(j, dtype=dtype)
         if (len(j.shape) == 3):
             if (j.shape[0] == 1):
                 self.many_currents = False
@@ -54,46 +95,40 @@ class HeatCurrent(MDSample):
 
         if self.many_currents:
             log.write_log('Using multicomponent code.')
-            MDSample.__init__(self, traj=j[0], DT_FS=DT_FS)
+            MDSample.__init__(self, traj=j[0], DT_FS=DT_FS, dtype=dtype)
             # initialize other MDSample objects needed to make the work
             self.otherMD = []
             for js in j[1:]:
-                self.otherMD.append(MDSample(traj=js, DT_FS=DT_FS))
+                self.otherMD.append(MDSample(traj=js, DT_FS=DT_FS, dtype=dtype))
+            # the spectra of all the currents are computed together (once) and shared
+            self.spectral_store = md.cospectrum.SpectralStore([self.traj] + [other.traj for other in self.otherMD])
         else:
             log.write_log('Using single component code.')
-            MDSample.__init__(self, traj=j, DT_FS=DT_FS)
+            MDSample.__init__(self, traj=j, DT_FS=DT_FS, dtype=dtype)
+            if onsager_currents is not None:
+                raise ValueError('onsager_currents can be used only with many currents.')
+        self.onsager_currents = onsager_currents
+        self.onsager_dct = None
 
         self.initialize_units(units, TEMPERATURE, VOLUME, DT_FS)
         self.initialize_mel(do_mel, mel_scale, mel_nrecursion, mel_nfilt,mel_log_flag=mel_log_flag)
 
         if self.traj is not None:
             if PSD_FILTER_W is None:
-                if not self.many_currents:
-                    self.compute_psd()
-                else:
-                    self.compute_kappa_multi(others=self.otherMD)
+                FILTER_WINDOW_WIDTH = None
+            elif (freq_units == 'thz') or (freq_units == 'THz'):
+                FILTER_WINDOW_WIDTH = freq_THz_to_red(PSD_FILTER_W, DT_FS)
+            elif (freq_units == 'red'):
+                FILTER_WINDOW_WIDTH = PSD_FILTER_W
             else:
-                if (freq_units == 'thz') or (freq_units == 'THz'):
-                    if not self.many_currents:
-                        self.compute_psd(freq_THz_to_red(PSD_FILTER_W, DT_FS))
-                    else:
-                        self.compute_kappa_multi(self.otherMD, freq_THz_to_red(PSD_FILTER_W, DT_FS))
-                elif (freq_units == 'red'):
-                    if not self.many_currents:
-                        self.compute_psd(PSD_FILTER_W)
-                    else:
-                        self.compute_kappa_multi(self.otherMD, PSD_FILTER_W)
-                else:
-                    raise ValueError('Freq units not valid.')
-            
-
-            if self.do_mel:
-                if(self.mel_log_flag):
-                    self.compute_mel_filter_log()
-                else:
-                    self.compute_mel_filter()
-
-            self.initialize_cepstral_parameters()
+                raise ValueError('Freq units not valid.')
+            self.initialize_frequencies()
+            # the filter window is defined now (as filter_psd does), the psd is filtered when it is computed
+            if FILTER_WINDOW_WIDTH is not None:
+                self.FILTER_WINDOW_WIDTH = FILTER_WINDOW_WIDTH
+                self.FILTER_WF = int(round(self.FILTER_WINDOW_WIDTH * self.Nfreqs * 2.))
+            # psd, mel filter and cepstral parameters are computed when they are needed (see _evaluate)
+            self._pending.update(LAZY_STAGES)
         else:
             log.write_log('Warning: trajectory not initialized. You should manually initialize what you need.')
 
@@ -106,16 +141,75 @@ class HeatCurrent(MDSample):
             msg += self.dct.__repr__()
         return msg
 
+    ###################################
+    ###  LAZY EVALUATION
+    ###################################
+
+    def _evaluate(self, stage):
+        """Compute the pending stages up to stage (see LAZY_STAGES), with the parameters given to __init__."""
+        for name in LAZY_STAGES[:LAZY_STAGES.index(stage) + 1]:
+            if name not in self._pending:
+                continue
+            if (name == 'psd'):
+                self.compute_psd(self.FILTER_WINDOW_WIDTH)
+            elif (name == 'mel') and self.do_mel:
+                if self.mel_log_flag:
+                    self.compute_mel_filter_log()
+                else:
+                    self.compute_mel_filter()
+            elif (name == 'cepstral'):
+                self.initialize_cepstral_parameters()
+            self._pending.discard(name)
+        return
+
+    def _start(self, stage):
+        """Compute the pending stages that stage depends on, and mark stage as computed (it is being computed)."""
+        index = LAZY_STAGES.index(stage)
+        if (index > 0):
+            self._evaluate(LAZY_STAGES[index - 1])
+        self._pending.discard(stage)
+        return
+
+    def is_computed(self, stage):
+        """Return True if the quantities of stage ('psd', 'mel', 'cepstral') were already computed."""
+        return stage not in self._pending
+
+    def initialize_frequencies(self):
+        """Define the frequency grid of the periodogram (the same that compute_psd/compute_kappa_multi compute)."""
+        self.Nfreqs = self.N // 2 + 1
+        if self.many_currents:
+            self.freqs = np.linspace(0., 0.5, self.Nfreqs)
+        else:
+            self.freqs = np.fft.rfftfreq(self.N)
+        self.DF = 0.5 / (self.Nfreqs - 1)
+        self.freqs_THz = self.freqs / self.DT_FS * 1000.
+        self.Nyquist_f_THz = self.freqs_THz[-1]
+        return
+
     # overrides MDSample methos
     def compute_psd(self, FILTER_WINDOW_WIDTH=None, method='trajectory', DT_FS=None, average_components=True,
                     normalize=False):  # yapf: disable
+        self._start('psd')
         if self.many_currents:
             if self.otherMD is None:
                 raise RuntimeError('self.otherMD cannot be None (wrong/missing initialization?)')
-            self.compute_kappa_multi(self.otherMD, FILTER_WINDOW_WIDTH, method, DT_FS, average_components, normalize)
+            self.compute_kappa_multi(self.otherMD, FILTER_WINDOW_WIDTH, method, DT_FS, average_components, normalize,
+                                     onsager_currents=self.onsager_currents)
             return
         super(HeatCurrent, self).compute_psd(FILTER_WINDOW_WIDTH, method, DT_FS, average_components, normalize)
 
+    def compute_kappa_multi(self, *args, **kwargs):
+        self._start('psd')
+        super(HeatCurrent, self).compute_kappa_multi(*args, **kwargs)
+
+    def compute_mel_filter(self, triang=False):
+        self._start('mel')
+        super(HeatCurrent, self).compute_mel_filter(triang)
+
+    def compute_mel_filter_log(self, triang=False):
+        self._start('mel')
+        super(HeatCurrent, self).compute_mel_filter_log(triang)
+
     @staticmethod
     def get_units_list():
         return ['metal', 'real', 'qepw', 'gpumd', 'dlpoly']
@@ -169,6 +263,7 @@ class HeatCurrent(MDSample):
         """
         Defines the parameters of the theoretical distribution of the cepstrum.
         """
+        self._start('cepstral')
         if not self.many_currents:
             self.ndf_chi = self.N_COMPONENTS
             self.ck_THEORY_var, self.psd_THEORY_mean = \
@@ -212,6 +307,43 @@ class HeatCurrent(MDSample):
         log.write_log(self.cepstral_log)
         return
 
+    def onsager_cepstral_analysis(self, aic_type='aic', Kmin_corrfactor=1.0, K_PSD=None):
+        """
+        Performs Cepstral Analysis on the reduced PSDs of all the currents of interest (Onsager-matrix mode, see
+        onsager_currents), with a batched DCT (see md.cepstral.batch_cos_filter).
+           aic_type      = the Akaike Information Criterion function used to choose the cutoff ('aic', 'aicc')
+           Kmin_corrfactor = correction factor multiplied by the AIC cutoff (cutoff = Kmin_corrfactor * aic_Kmin)
+
+        Results (arrays with one element for each current of interest):
+            onsager_tau_Kmin  +/-  onsager_tau_std_Kmin     S_0* of each current
+            onsager_kappa_Kmin  +/-  onsager_kappa_Kmin_std   0.5 * kappa_scale * S_0*  [W/(m*K)]
+        The transport coefficients are converted with the kappa_scale of the heat current, so they are in W/(m*K) only
+        for currents with the same units (the current 0 gives kappa_Kmin).
+        """
+        if self.onsager_psd is None:
+            raise ValueError('Reduced PSDs not computed: initialize the HeatCurrent with onsager_currents.')
+        self.onsager_dct = md.cepstral.batch_cos_filter(np.log(self.onsager_psd), ck_theory_var=self.ck_THEORY_var,
+                                                        psd_theory_mean=self.psd_THEORY_mean, aic_type=aic_type,
+                                                        Kmin_corrfactor=Kmin_corrfactor, K_PSD=K_PSD)
+        self.onsager_tau_Kmin = np.array([dct.tau_Kmin for dct in self.onsager_dct])
+        self.onsager_tau_std_Kmin = np.array([dct.tau_std_Kmin for dct in self.onsager_dct])
+        self.onsager_kappa_Kmin = self.onsager_tau_Kmin * self.kappa_scale * 0.5
+        self.onsager_kappa_Kmin_std = self.onsager_tau_std_Kmin * self.kappa_scale * 0.5
+
+        self.onsager_cepstral_log = \
+              '-----------------------------------------------------\n' +\
+              '  ONSAGER CEPSTRAL ANALYSIS\n' +\
+              '-----------------------------------------------------\n'
+        for current, dct, kappa, kappa_std in zip(self.onsager_currents, self.onsager_dct, self.onsager_kappa_Kmin,
+                                                  self.onsager_kappa_Kmin_std):
+            self.onsager_cepstral_log += \
+              '  current {:d}:  AIC_Kmin = {:d}  (P* = {:d})\n'.format(current, dct.aic_Kmin, dct.aic_Kmin + 1) +\
+              '    S_0*   = {:18f} +/- {:10f}\n'.format(dct.tau_Kmin, dct.tau_std_Kmin) +\
+              '    kappa* = {:18f} +/- {:10f}  W/mK\n'.format(kappa, kappa_std)
+        self.onsager_cepstral_log += '-----------------------------------------------------\n'
+        log.write_log(self.onsager_cepstral_log)
+        return
+
     def mel_cepstral_analysis(self, aic_type='aic', Kmin_corrfactor=1.0, K_PSD=None,debug = False):
         """
         Performs Cepstral Analysis on the heat current trajectory.
@@ -285,7 +417,7 @@ class HeatCurrent(MDSample):
             else:
                 if self.otherMD is None:
                     raise ValueError('self.otherMD cannot be None (missing initialization?)')
-                self.compute_kappa_multi(others=self.otherMD)
+                self.compute_kappa_multi(others=self.otherMD, onsager_currents=self.onsager_currents)
         if PSD_FILTER_W is None:
             if self.FILTER_WINDOW_WIDTH is None:
                 self.filter_psd(0.)
@@ -436,6 +568,10 @@ class HeatCurrent(MDSample):
 #      multi_hc.cospectrum = multi_mdsample.cospectrum
 #      return multi_hc
 
+for _stage, _names in LAZY_ATTRIBUTES.items():
+    for _name in _names:
+        setattr(HeatCurrent, _name, _lazy_property(_name, _stage))
+
 ################################################################################
 
 
@@ -493,7 +629,8 @@ def resample_current(x, TSKIP=None, fstar_THz=None, FILTER_W=None, plot=True, PS
 
     # define new HeatCurrent
     if not x.many_currents:
-        xf = HeatCurrent(trajf, x.units, x.DT_FS * TSKIP, x.TEMPERATURE, x.VOLUME, PSD_FILTER_W, freq_units)
+        xf = HeatCurrent(trajf, x.units, x.DT_FS * TSKIP, x.TEMPERATURE, x.VOLUME, PSD_FILTER_W, freq_units,
+                         dtype=x.dtype)
     else:
         if x.otherMD is None:
             raise RuntimeError('x.otherMD cannot be none (wrong/missing initialization?)')
@@ -503,7 +640,8 @@ def resample_current(x, TSKIP=None, fstar_THz=None, FILTER_W=None, plot=True, PS
         for y in x.otherMD:
             tmp = md.tools.filter_and_sample(y.traj, FILTER_W, TSKIP, 'rectangular')
             yf.append(tmp)
-        xf = HeatCurrent(yf, x.units, x.DT_FS * TSKIP, x.TEMPERATURE, x.VOLUME, PSD_FILTER_W, freq_units)
+        xf = HeatCurrent(yf, x.units, x.DT_FS * TSKIP, x.TEMPERATURE, x.VOLUME, PSD_FILTER_W, freq_units,
+                         dtype=x.dtype, onsager_currents=x.onsager_currents)
     if plot:
         if (freq_units == 'thz') or (freq_units == 'THz'):
             xf.plot_periodogram(x.FILTER_WINDOW_WIDTH * 1000. / x.DT_FS, 'thz', TSKIP, axes=axes)
@@ -523,7 +661,7 @@ def resample_current(x, TSKIP=None, fstar_THz=None, FILTER_W=None, plot=True, PS
         '                             =  {:12.3f} fs\n'.format(TSKIP * x.DT_FS) +\
         ' Original  n. of frequencies =  {:12d}\n'.format(x.Nfreqs) +\
         ' Resampled n. of frequencies =  {:12d}\n'.format(xf.Nfreqs)
-    if x.fpsd is not None and xf.fpsd is not None:
+    if x.is_computed('psd') and (x.fpsd is not None) and (xf.fpsd is not None):   # do not compute the PSD of x
         xf.resample_log += \
             ' PSD      @cutoff  (pre-filter) = {:12.5f}\n'.format(x.fpsd[fstar_idx]) +\
             '                  (post-filter) = {:12.5f}\n'.format(xf.fpsd[-1]) +\
@@ -1,6 +1,14 @@
-__all__ = ['read_tablefile', 'read_lammps_dump', 'read_lammps_log', 'read_lammps_datafile']
+__all__ = ['read_tablefile', 'read_lammps_dump', 'read_lammps_bindump', 'read_lammps_log', 'read_lammps_datafile',
+           'read_multifile', 'dump_currents', 'dictfile', 'hdf5file', 'resample', 'chunkparse', 'fileindex',
+           'ingestcache', 'compressed']
 
 from . import *
 from .read_tablefile import TableFile
 from .read_lammps_dump import LAMMPS_Dump
+from .read_lammps_bindump import LAMMPS_BinaryDump
 from .read_lammps_log import LAMMPSLogFile
+from .read_multifile import MultiFile
+from .dump_currents import compute_dump_currents
+from .dictfile import DictFile, load_dict, save_dict
+from .hdf5file import HDF5File, write_currents, write_results
+from .resample import read_resampled
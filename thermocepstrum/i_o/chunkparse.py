@@ -0,0 +1,571 @@
+################################################################################
+###
+###   ChunkParse
+###
+################################################################################
+###
+###  Vectorized parsing of whitespace-separated numerical tables.
+###  The file is read in large byte chunks made of complete lines, and each
+###  chunk is converted to a (lines x columns) array with a single NumPy call,
+###  instead of splitting and converting every line in Python.
+###
+###  Malformed lines (wrong number of columns, non-numerical tokens) and the
+###  end-of-run keyword of LAMMPS log files are detected by scanning the whole
+###  byte chunk, so that no Python code is executed per line.
+###
+###  These functions are used by the readers of this package (TableFile,
+###  LAMMPSLogFile), that call them on the binary buffer of their text file.
+###
+###  When only a few columns of a wide table are needed, their tokens are
+###  gathered from the chunk (using the token positions) and only these are
+###  converted, so that the parsing cost scales with the number of selected
+###  columns rather than with the width of the file.
+###
+###  read_parallel splits the data in byte ranges aligned to the lines, and
+###  parses them in several worker processes that write into shared memory.
+###
+################################################################################
+
+import io
+import os
+import warnings
+import numpy as np
+from multiprocessing import Pool, RawArray
+from .compressed import is_compressed
+
+CHUNK_SIZE = 4 * 1024**2   # default size of the chunks read from file [bytes]
+PROJECT_FRACTION = 0.25   # convert only the selected columns when they are at most this fraction of all the columns
+
+_NEWLINE = ord('\n')
+
+
+def read_line_chunks(f, chunk_size=CHUNK_SIZE, nbytes=None):
+    """
+    Generator that reads a binary file object from its current position and yields byte chunks made of complete
+    lines (each chunk ends with a newline, except for the last line of a file without the final newline).
+    If nbytes is given, at most nbytes bytes are read.
+    """
+    tail = b''
+    while True:
+        if nbytes is None:
+            buf = f.read(chunk_size)
+        else:
+            buf = f.read(min(chunk_size, nbytes))
+            nbytes -= len(buf)
+        if not buf:   # EOF
+            if tail:
+                yield tail
+            return
+        if tail:
+            buf = tail + buf
+        end = buf.rfind(b'\n') + 1
+        if (end == 0):   # no complete line yet: read more
+            tail = buf
+            continue
+        tail = buf[end:]
+        yield buf[:end]
+
+
+def line_ends(buf):
+    """Return the positions of the newline characters in buf."""
+    return np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == _NEWLINE)
+
+
+def skip_lines(f, nlines, chunk_size=CHUNK_SIZE):
+    """
+    Advance the binary file object f by nlines lines, counting the newlines of large chunks.
+    Returns the number of lines actually skipped (less than nlines if EOF is reached).
+    """
+    skipped = 0
+    while (skipped < nlines):
+        pos = f.tell()
+        buf = f.read(chunk_size)
+        if not buf:   # EOF
+            break
+        ends = line_ends(buf)
+        if (skipped + ends.size >= nlines):
+            f.seek(pos + ends[nlines - skipped - 1] + 1)
+            return nlines
+        skipped += ends.size
+        if (len(buf) < chunk_size) and (buf[-1:] != b'\n'):   # last line without newline
+            skipped += 1
+    return skipped
+
+
+def read_lines(f, nlines, chunk_size=CHUNK_SIZE):
+    """
+    Read the next nlines lines of the binary file object f in large chunks, and return them as a single bytes object
+    (with less lines if EOF is reached). f is left positioned just after the last line returned.
+    """
+    bufs = []
+    nfound = 0
+    while (nfound < nlines):
+        buf = f.read(chunk_size)
+        if not buf:   # EOF
+            break
+        ends = line_ends(buf)
+        if (nfound + ends.size >= nlines):
+            end = ends[nlines - nfound - 1] + 1
+            f.seek(end - len(buf), io.SEEK_CUR)
+            bufs.append(buf[:end])
+            break
+        nfound += ends.size
+        bufs.append(buf)
+    return b''.join(bufs)
+
+
+def _isspace(arr):
+    """Return a boolean mask of the whitespace bytes (' \\t\\n\\v\\f\\r') of the byte array arr."""
+    return (arr == ord(' ')) | ((arr - np.uint8(ord('\t'))) <= np.uint8(4))   # '\t'...'\r' are contiguous
+
+
+def _token_bounds(arr):
+    """Return the start and end (excluded) positions of the whitespace-separated tokens of the byte array arr."""
+    edges = np.diff(_isspace(arr).view(np.int8), prepend=np.int8(1), append=np.int8(1))
+    return np.flatnonzero(edges == -1), np.flatnonzero(edges == 1)
+
+
+def count_tokens(buf):
+    """
+    Return the number of whitespace-separated tokens of each line of buf.
+    A final line without newline is counted as a line.
+    """
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    starts, _ = _token_bounds(arr)
+    return _line_counts(arr, starts)[0]
+
+
+def _line_counts(arr, starts):
+    """Return the number of tokens of each line of arr, given the token start positions, and the newline positions."""
+    ends = np.flatnonzero(arr == _NEWLINE)
+    bounds = np.searchsorted(starts, ends)   # number of tokens before each newline
+    if (arr.size > 0) and (arr[-1] != _NEWLINE):   # last line without newline
+        bounds = np.append(bounds, starts.size)
+    return np.diff(bounds, prepend=0), ends
+
+
+def _fromstring(buf, dtype):
+    """Convert buf into a flat array. Returns None if some token is not a number."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            return np.fromstring(buf, dtype=dtype, sep=' ')
+        except (ValueError, DeprecationWarning):
+            return None
+
+
+def _gather_tokens(arr, starts, ends, lines, ncols, columns):
+    """
+    Return the bytes of the selected columns of the given lines, separated by spaces.
+    starts and ends are the token bounds of arr, that contains exactly ncols tokens in each line.
+    """
+    sel = (lines[:, np.newaxis] * ncols + columns).ravel()
+    first = starts[sel]
+    lengths = ends[sel] - first
+    nchars = int(lengths.sum())
+    offsets = np.cumsum(lengths) - lengths   # position of each token in the gathered characters
+    src = np.arange(nchars) - np.repeat(offsets - first, lengths)
+    out = np.full(nchars + sel.size, ord(' '), dtype=np.uint8)
+    out[np.arange(nchars) + np.repeat(np.arange(sel.size), lengths)] = arr[src]   # one space after each token
+    return out.tobytes()
+
+
+def parse_block(buf, ncols, dtype=float, columns=None):
+    """
+    Convert a chunk of complete lines into a (nlines, ncols) array.
+    Parsing stops at the first malformed line, i.e. a line that does not contain exactly ncols numbers.
+    If a sorted array of column indexes is given, only these columns are converted, and the array has shape
+    (nlines, len(columns)): the token count of each line is still checked, but non-numeric tokens of the other
+    columns are not detected.
+
+    OUTPUT:
+      values  ->  (nlines, ncols) array with the values of the valid lines
+      nbytes  ->  number of bytes of buf occupied by the valid lines
+      stop    ->  True if a malformed line was found
+    """
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    starts, token_ends = _token_bounds(arr)
+    counts, ends = _line_counts(arr, starts)
+    bad = np.flatnonzero(counts != ncols)
+    nvalid = bad[0] if bad.size else counts.size
+    stop = (nvalid < counts.size)
+    if (nvalid == 0):
+        nbytes = 0
+    elif (nvalid <= ends.size):
+        nbytes = ends[nvalid - 1] + 1
+    else:   # last line without newline
+        nbytes = len(buf)
+
+    if columns is not None:   # convert only the selected columns
+        columns = np.asarray(columns, dtype=int)
+        values = _fromstring(_gather_tokens(arr, starts, token_ends, np.arange(nvalid), ncols, columns), dtype)
+        if (values is None) or (values.size != nvalid * columns.size):
+            # some selected token is not a number: find the first bad line
+            for iline in range(nvalid):
+                line = _fromstring(_gather_tokens(arr, starts, token_ends, np.array([iline]), ncols, columns), dtype)
+                if (line is None) or (line.size != columns.size):
+                    nvalid, nbytes, stop = iline, (ends[iline - 1] + 1 if iline else 0), True
+                    break
+            values = _fromstring(_gather_tokens(arr, starts, token_ends, np.arange(nvalid), ncols, columns), dtype)
+            if values is None:
+                values = np.zeros(0, dtype=dtype)
+        return values.reshape((nvalid, columns.size)), nbytes, stop
+
+    values = _fromstring(buf[:nbytes], dtype)
+    if (values is None) or (values.size != nvalid * ncols):
+        # some token is not a number: find the first bad line and parse up to it
+        start = 0
+        for iline in range(nvalid):
+            end = (ends[iline] + 1) if (iline < ends.size) else len(buf)
+            line = _fromstring(buf[start:end], dtype)
+            if (line is None) or (line.size != ncols):
+                nvalid, nbytes, stop = iline, start, True
+                break
+            start = end
+        values = _fromstring(buf[:nbytes], dtype)
+        if values is None:
+            values = np.zeros(0, dtype=dtype)
+    return values.reshape((nvalid, ncols)), nbytes, stop
+
+
+def parse_strings(buf, ncols, columns):
+    """
+    Return the tokens of the selected columns of a chunk of lines, that must contain exactly ncols tokens each, as a
+    (nlines, len(columns)) array of byte strings (of the length of the longest token).
+    """
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    starts, ends = _token_bounds(arr)
+    columns = np.asarray(columns, dtype=int)
+    nlines = starts.size // ncols
+    sel = (np.arange(nlines)[:, np.newaxis] * ncols + columns).ravel()
+    first = starts[sel]
+    lengths = ends[sel] - first
+    width = max(int(lengths.max()) if lengths.size else 1, 1)
+    rows = np.repeat(np.arange(sel.size), lengths)   # token of each character
+    pos = np.arange(rows.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)   # position in the token
+    out = np.zeros((sel.size, width), dtype=np.uint8)
+    out[rows, pos] = arr[first[rows] + pos]
+    return out.view('S{:d}'.format(width)).reshape((nlines, columns.size))
+
+
+def projection(ncols, ckey):
+    """
+    Return the sorted array of the columns used by ckey and the ckey dictionary of their positions in it, if only a
+    fraction of the ncols columns (at most PROJECT_FRACTION) is used, so that parsing only them is worth it.
+    Otherwise return None and ckey itself.
+    """
+    columns = np.unique(np.concatenate([np.ravel(idx) for idx in ckey.values()] + [[]]).astype(int))
+    if (columns.size > PROJECT_FRACTION * ncols):
+        return None, ckey
+    return columns, {key: np.searchsorted(columns, idx) for key, idx in ckey.items()}
+
+
+def accumulated_ckey(ckey, all_ckeys, accumulators, max_vector_dim=None):
+    """
+    Return the ckey dictionary of the columns to read: the ones of ckey, and the ones of the keys of accumulators
+    (taken from all_ckeys, up to max_vector_dim components), that are read only to be accumulated.
+    """
+    read_ckey = dict(ckey)
+    for key in (accumulators or {}):
+        if key not in read_ckey:
+            if key not in all_ckeys:
+                raise KeyError('{} key not found.'.format(key))
+            read_ckey[key] = all_ckeys[key][:max_vector_dim]
+    return read_ckey
+
+
+def read_chunked(textfile, NSTEPS, ncols, data, ckey, endrun_keyword=None, progress=None, chunk_size=CHUNK_SIZE,
+                 accumulators=None):
+    """
+    Read up to NSTEPS lines of numerical data from the current position of a text file object, and store the columns
+    selected by ckey into the preallocated arrays of the data dictionary.
+    When ckey uses only a few of the ncols columns, only these are converted (see projection).
+    The reading stops at the first malformed line, or at the first line containing endrun_keyword (if given).
+    At the end the text file is positioned just after the last line read (or after the line where the reading stopped).
+
+    INPUT:
+      textfile       -> the (text) file object, positioned at the beginning of a line
+      NSTEPS         -> maximum number of lines to read
+      ncols          -> number of columns of each line
+      data           -> dictionary of arrays of shape (>= NSTEPS, len(ckey[key]))
+      ckey           -> dictionary of the column indexes to store in each key of data
+      endrun_keyword -> string that marks the end of the data block (optional)
+      progress       -> function called as progress(steps_read) after each chunk (optional)
+      accumulators   -> dictionary of objects with an add(values) method (e.g. md.tools.BlockingAccumulator), that
+                        receive the columns of their key of ckey chunk by chunk. The keys that are not in data are
+                        only accumulated, and never stored (optional)
+    OUTPUT:
+      nread     -> number of lines read and stored
+      stop      -> False       if NSTEPS lines or the whole file were read
+                   'endrun'    if the endrun_keyword was found
+                   'malformed' if a malformed line was found
+    """
+    if endrun_keyword is not None:
+        endrun_keyword = endrun_keyword.encode()
+    pos = textfile.tell()
+    f = textfile.buffer
+    f.seek(pos)
+    if accumulators is None:
+        accumulators = {}
+    columns, local_ckey = projection(ncols, ckey)
+    nread = 0
+    stop = False
+    for buf in read_line_chunks(f, chunk_size):
+        ends = line_ends(buf)
+        if (nread + ends.size >= NSTEPS):   # the last line to read is in this chunk
+            buf = buf[:ends[NSTEPS - nread - 1] + 1]
+        full = buf
+        endrun = False
+        if endrun_keyword is not None:
+            kpos = buf.find(endrun_keyword)
+            if (kpos >= 0):   # keep only the lines before the one containing the keyword
+                buf = buf[:buf.rfind(b'\n', 0, kpos) + 1]
+                endrun = True
+        values, nbytes, malformed = parse_block(buf, ncols, columns=columns)
+        n = values.shape[0]
+        for key, idx in local_ckey.items():   # save (or accumulate) the selected columns
+            if key in accumulators:
+                accumulators[key].add(values[:, idx])
+            if key in data:
+                data[key][nread:nread + n, :] = values[:, idx]
+        nread += n
+        pos += nbytes
+        if progress is not None:
+            progress(nread)
+        if malformed:
+            stop = 'malformed'
+        elif endrun:
+            stop = 'endrun'
+        if stop:   # skip the line where the reading stopped (as a line-by-line reader would do)
+            eol = full.find(b'\n', nbytes)
+            pos += (eol + 1 if (eol >= 0) else len(full)) - nbytes
+            break
+        if (nread >= NSTEPS):
+            break
+    textfile.seek(pos)
+    return nread, stop
+
+
+def read_growing(textfile, ncols, data, ckey, endrun_keyword=None, progress=None, chunk_size=CHUNK_SIZE,
+                 accumulators=None):
+    """
+    Read all the lines of numerical data from the current position of a text file object, like read_chunked, in a
+    single pass and without knowing their number in advance.
+    The data are stored in arrays that grow while reading and are trimmed at the end, and that replace the arrays of
+    the data dictionary (and have the same dtype). After the first lines, the size of the arrays is estimated from the
+    number of bytes left in the file, so that usually they are reallocated only once.
+    The keys of ckey that are in accumulators and not in data are only accumulated (see read_chunked).
+
+    INPUT:
+      textfile, ncols, data, ckey, endrun_keyword, chunk_size, accumulators  ->  see read_chunked
+      progress       -> function called as progress(steps_read, estimated_steps) after each chunk (optional)
+    OUTPUT:
+      nread, stop    ->  see read_chunked
+    """
+    begin = textfile.tell()
+    try:
+        nbytes_left = os.fstat(textfile.fileno()).st_size - begin
+    except (OSError, io.UnsupportedOperation):   # decompressed stream: the size is unknown
+        nbytes_left = 0
+    capacity = 1024
+    if accumulators is None:
+        accumulators = {}
+    dtypes = {key: data[key].dtype if (key in data) else float for key in ckey
+              if (key in data) or (key not in accumulators)}
+    arrays = {key: np.zeros((capacity, len(ckey[key])), dtype=dtype) for key, dtype in dtypes.items()}
+    nread = 0
+    while True:
+        free = {key: value[nread:] for key, value in arrays.items()}
+        if progress is not None:
+            block_progress = lambda step: progress(nread + step, capacity)
+        else:
+            block_progress = None
+        nblock, stop = read_chunked(textfile, capacity - nread, ncols, free, ckey, endrun_keyword, block_progress,
+                                    chunk_size, accumulators)
+        nread += nblock
+        if stop or (nread < capacity):   # end of data
+            break
+        # arrays full: estimate the number of lines from the average line length (or grow by 50%)
+        estimate = int(1.02 * nbytes_left * nread / max(textfile.tell() - begin, 1)) + 1024
+        capacity = max(estimate, capacity + capacity // 2)
+        for key, value in arrays.items():
+            arrays[key] = np.zeros((capacity, value.shape[1]), dtype=value.dtype)
+            arrays[key][:nread] = value[:nread]
+    for key, value in arrays.items():
+        data[key] = value[:nread]
+    return nread, stop
+
+
+def iter_chunked(textfile, block_steps, NSTEPS, ncols, ckey, endrun_keyword=None, dtype=float):
+    """
+    Generator that reads up to NSTEPS lines of numerical data from the current position of a text file object, like
+    read_chunked, in blocks of block_steps lines.
+    It yields (block, stop) tuples, where block is a dictionary of newly allocated arrays (of type dtype) with the
+    columns selected by ckey, and stop is the value returned by read_chunked for that block. The last block may be
+    shorter (or empty, if the reading stopped at its first line).
+    After each block the text file is positioned just after its last line, so at most one block is kept in memory.
+    """
+    nread = 0
+    chunk_size = CHUNK_SIZE
+    while (nread < NSTEPS):
+        nsteps = min(block_steps, NSTEPS - nread)
+        block = {key: np.zeros((nsteps, len(idx)), dtype=dtype) for key, idx in ckey.items()}
+        pos = textfile.tell()
+        nblock, stop = read_chunked(textfile, nsteps, ncols, block, ckey, endrun_keyword, chunk_size=chunk_size)
+        if (nblock > 0):
+            # read chunks just larger than a block, not to read and discard many lines each time
+            chunk_size = min(CHUNK_SIZE, (textfile.tell() - pos) * (nsteps + 16) // nblock + 4096)
+        if (nblock > 0) or stop:
+            yield {key: value[:nblock] for key, value in block.items()}, stop
+        if stop or (nblock < nsteps):
+            return
+        nread += nblock
+
+
+def count_lines(f, nbytes, chunk_size=CHUNK_SIZE):
+    """
+    Count the lines contained in the next nbytes bytes of the binary file object f.
+    A final line without newline is counted as a line.
+    """
+    nlines = 0
+    last = b'\n'
+    while (nbytes > 0):
+        buf = f.read(min(chunk_size, nbytes))
+        if not buf:   # EOF
+            break
+        nlines += buf.count(b'\n')
+        nbytes -= len(buf)
+        last = buf[-1:]
+    return nlines + int(last != b'\n')
+
+
+def split_ranges(f, begin, end, nranges):
+    """
+    Split the bytes [begin, end) of the binary file object f into (at most) nranges contiguous ranges of similar
+    size, each one starting at the beginning of a line. Returns a list of (begin, end) tuples.
+    """
+    bounds = [begin]
+    for i in range(1, nranges):
+        pos = max(begin + (end - begin) * i // nranges, bounds[-1])
+        f.seek(pos - 1)   # find the beginning of the first line after pos
+        buf = f.readline()
+        pos += len(buf) - 1
+        if (pos >= end):
+            break
+        if (pos > bounds[-1]):
+            bounds.append(pos)
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+_shared_data = None   # arrays in shared memory, set in each worker process by _init_worker
+
+
+def _shared_array(raw, shape, dtype):
+    return np.frombuffer(raw, dtype=dtype).reshape(shape)
+
+
+def _init_worker(raw_data):
+    global _shared_data
+    _shared_data = {key: _shared_array(*args) for key, args in raw_data.items()}
+
+
+def _count_range(args):
+    filename, begin, end = args
+    with open(filename, 'rb') as f:
+        f.seek(begin)
+        return count_lines(f, end - begin)
+
+
+def _parse_range(args):
+    """Parse nlines lines starting at byte begin, and store them in the shared arrays starting from row0."""
+    filename, begin, row0, nlines, ncols, ckey = args
+    data = {key: value[row0:] for key, value in _shared_data.items()}
+    with open(filename, 'r') as textfile:
+        textfile.seek(begin)
+        nread, stop = read_chunked(textfile, nlines, ncols, data, ckey)
+        return nread, stop, textfile.tell()
+
+
+def read_parallel(textfile, NSTEPS, ncols, data, ckey, endrun_keyword=None, progress=None, workers=2,
+                  accumulators=None):
+    """
+    Read up to NSTEPS lines of numerical data from the current position of a text file object, like read_chunked,
+    using several worker processes.
+    The data section (that ends at the first line containing endrun_keyword, if given) is split in byte ranges aligned
+    to the lines. The lines of each range are first counted, to know where they have to be stored, and then parsed
+    by the workers into arrays in shared memory, that replace the arrays of the data dictionary (and have the same
+    dtype, float32 or float64).
+    If a malformed line is found, the lines that follow it are discarded.
+    At the end the text file is positioned just after the last line read (or after the line where the reading stopped).
+    The columns to accumulate (see read_chunked) are parsed by the workers as the others, and they are passed to the
+    accumulators in order at the end.
+
+    INPUT:
+      textfile, NSTEPS, ncols, data, ckey, endrun_keyword, progress, accumulators  ->  see read_chunked
+      workers        -> number of worker processes
+    OUTPUT:
+      nread, stop    ->  see read_chunked
+    """
+    filename = textfile.name
+    if is_compressed(filename):   # the workers cannot seek in the decompressed stream
+        return read_chunked(textfile, NSTEPS, ncols, data, ckey, endrun_keyword, progress, accumulators=accumulators)
+    begin = textfile.tell()
+    end = os.path.getsize(filename)
+    endrun = False
+    with open(filename, 'rb') as f:
+        if endrun_keyword is not None:   # the data end at the line containing endrun_keyword
+            f.seek(begin)
+            for buf in read_line_chunks(f):
+                kpos = buf.find(endrun_keyword.encode())
+                if (kpos >= 0):
+                    end = f.tell() - len(buf) + buf.rfind(b'\n', 0, kpos) + 1
+                    endrun = True
+                    break
+            if (end < begin):   # the reading starts after endrun_keyword (it cannot happen in a LAMMPS log)
+                end = begin
+        ranges = split_ranges(f, begin, end, 4 * workers)
+    if (len(ranges) <= 1):   # not worth it
+        return read_chunked(textfile, NSTEPS, ncols, data, ckey, endrun_keyword, progress, accumulators=accumulators)
+
+    raw_data = {}
+    for key, idx in ckey.items():
+        shape = (NSTEPS, len(idx))
+        dtype = np.dtype(data[key].dtype if (key in data) else float)
+        raw_data[key] = (RawArray(dtype.char, int(np.prod(shape))), shape, dtype)
+    with Pool(workers, initializer=_init_worker, initargs=(raw_data,)) as pool:
+        counts = pool.map(_count_range, [(filename, rbegin, rend) for rbegin, rend in ranges])
+        # keep only the ranges needed to read NSTEPS lines
+        tasks = []
+        row0 = 0
+        for (rbegin, rend), nlines in zip(ranges, counts):
+            nlines = min(nlines, NSTEPS - row0)
+            if (nlines <= 0):
+                break
+            tasks.append((filename, rbegin, row0, nlines, ncols, ckey))
+            row0 += nlines
+        nread = 0
+        stop = False
+        pos = begin
+        for task, (nread_range, stop_range, pos) in zip(tasks, pool.imap(_parse_range, tasks)):
+            nread = task[2] + nread_range
+            if progress is not None:
+                progress(nread)
+            if stop_range:   # malformed line: discard the following ranges
+                stop = stop_range
+                pool.terminate()
+                break
+    if accumulators is None:
+        accumulators = {}
+    for key, args in raw_data.items():
+        if key in accumulators:
+            accumulators[key].add(_shared_array(*args)[:nread])
+        if (key in data) or (key not in accumulators):
+            data[key] = _shared_array(*args)
+    if (not stop) and endrun and (nread < NSTEPS):   # skip the endrun line (as read_chunked does)
+        stop = 'endrun'
+        with open(filename, 'rb') as f:
+            f.seek(end)
+            pos = end + len(f.readline())
+    textfile.seek(pos)
+    return nread, stop
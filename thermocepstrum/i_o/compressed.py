@@ -0,0 +1,184 @@
+################################################################################
+###
+###   Compressed
+###
+################################################################################
+###
+###  Transparent reading of compressed files (gzip, bzip2, xz).
+###
+###  The compression format is detected from the first bytes of the file.
+###  The file is decompressed in a background thread, that fills a queue of
+###  decompressed blocks while the main thread parses the previous ones (the
+###  decompression libraries release the GIL). The decompressed stream is
+###  seekable: the last HISTORY_SIZE bytes read are kept in memory, so that the
+###  readers can go back to the end of the last line parsed, while seeking
+###  further back restarts the decompression from the beginning of the file.
+###
+###  open_text and open_binary return the usual file objects for uncompressed
+###  files, so the readers of this package can always use them.
+###
+################################################################################
+
+import io
+import bz2
+import gzip
+import lzma
+import queue
+import threading
+from collections import deque
+
+BLOCK_SIZE = 1024**2   # size of the decompressed blocks [bytes]
+QUEUE_BLOCKS = 16   # maximum number of blocks decompressed in advance
+HISTORY_SIZE = 16 * 1024**2   # bytes kept in memory behind the current position [bytes]
+
+_MAGIC = [
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+]
+
+
+def _compressed_opener(filename):
+    """Return the function that opens filename, if it is compressed, or None."""
+    with open(filename, 'rb') as f:
+        magic = f.read(6)
+    for prefix, opener in _MAGIC:
+        if magic.startswith(prefix):
+            return opener
+    return None
+
+
+def is_compressed(filename):
+    """Return True if filename is compressed with gzip, bzip2 or xz."""
+    return _compressed_opener(filename) is not None
+
+
+class ThreadedDecompressor(io.RawIOBase):
+    """
+    A read-only, seekable, raw binary stream with the decompressed content of a compressed file.
+    The decompression is performed by a background thread.
+    """
+
+    def __init__(self, filename, opener=None):
+        self.name = filename
+        self._opener = opener or _compressed_opener(filename)
+        if self._opener is None:
+            raise ValueError('{} is not a compressed file.'.format(filename))
+        self._thread = None
+        self._restart()
+        return
+
+    def _restart(self):
+        """(Re)start the decompression from the beginning of the file."""
+        self._stop_thread()
+        self._queue = queue.Queue(maxsize=QUEUE_BLOCKS)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decompress, args=(self._queue, self._stop), daemon=True)
+        self._thread.start()
+        self._blocks = deque()   # decompressed blocks kept in memory, as (offset, data) tuples
+        self._end = 0   # offset of the end of the last block received
+        self._pos = 0
+        self._eof = False
+        return
+
+    def _decompress(self, blocks, stop):
+        """Target of the decompression thread: put the decompressed blocks in the queue (b'' at EOF)."""
+        try:
+            with self._opener(self.name, 'rb') as f:
+                while not stop.is_set():
+                    block = f.read(BLOCK_SIZE)
+                    while not stop.is_set():
+                        try:
+                            blocks.put(block, timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+                    if not block:
+                        return
+        except Exception as e:   # raised again by the main thread
+            blocks.put(e)
+        return
+
+    def _stop_thread(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return
+
+    def _fill(self, end):
+        """Receive blocks until end (or EOF), dropping the ones that are too far behind the current position."""
+        while (self._end < end) and not self._eof:
+            block = self._queue.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                self._eof = True
+                break
+            self._blocks.append((self._end, block))
+            self._end += len(block)
+            while self._blocks and (self._blocks[0][0] + len(self._blocks[0][1]) < self._pos - HISTORY_SIZE):
+                self._blocks.popleft()
+        return
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if (whence == io.SEEK_CUR):
+            pos += self._pos
+        elif (whence == io.SEEK_END):
+            self._fill(float('inf'))
+            pos += self._end
+        if (pos < 0):
+            raise ValueError('negative seek position {}'.format(pos))
+        start = self._blocks[0][0] if self._blocks else self._end
+        if (pos < start):   # already dropped: decompress again
+            self._restart()
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        self._fill(self._pos + len(b))
+        view = memoryview(b).cast('B')
+        n = 0
+        for offset, block in self._blocks:
+            if (offset + len(block) <= self._pos + n):
+                continue
+            start = self._pos + n - offset
+            data = block[start:start + len(view) - n]
+            view[n:n + len(data)] = data
+            n += len(data)
+            if (n == len(view)):
+                break
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop_thread()
+            self._blocks = deque()
+        super().close()
+        return
+
+
+def open_binary(filename):
+    """Open filename for reading in binary mode, decompressing it if it is compressed."""
+    opener = _compressed_opener(filename)
+    if opener is None:
+        return open(filename, 'rb')
+    return io.BufferedReader(ThreadedDecompressor(filename, opener), buffer_size=BLOCK_SIZE)
+
+
+def open_text(filename):
+    """Open filename for reading in text mode, decompressing it if it is compressed."""
+    opener = _compressed_opener(filename)
+    if opener is None:
+        return open(filename, 'r')
+    return io.TextIOWrapper(open_binary(filename))
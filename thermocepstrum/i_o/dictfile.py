@@ -0,0 +1,140 @@
+################################################################################
+###
+###   DictFile
+###
+################################################################################
+###
+###  Pickle-free file format of the 'dict' input (a dictionary of arrays and
+###  scalars, e.g. the output of save_hc_npz).
+###
+###  The dictionary is saved as an uncompressed NumPy .npz file (a zip archive
+###  of .npy files, one for each key), that can be read with np.load without
+###  allow_pickle. DictFile opens it lazily: the list of keys is read from the
+###  zip directory, and each array is memory-mapped (read-only) from its
+###  position in the archive only when it is accessed. Scalars (0-d arrays)
+###  are returned as Python numbers.
+###
+###  Old files containing a pickled dictionary (np.save of a dict) can still
+###  be read with load_dict, but they are unpickled completely.
+###
+################################################################################
+
+## example:
+##   save_dict('flux.npz', {'flux': flux, 'Temp_ave': 300., 'Volume': 1000.})
+##   data = load_dict('flux.npz')
+##   print(list(data.keys()), data['flux'].shape)
+##
+
+import struct
+import zipfile
+import numpy as np
+from collections.abc import MutableMapping
+from thermocepstrum.utils.utils import PrintMethod
+log = PrintMethod()
+
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')   # zip local file header (the same as zipfile.structFileHeader)
+
+
+def save_dict(filename, data):
+    """
+    Save a dictionary of arrays and scalars into an uncompressed .npz file (the extension is added if missing).
+    Object arrays (that would require pickle) are not allowed.
+    """
+    arrays = {}
+    for key, value in data.items():
+        arrays[key] = np.asarray(value)
+        if arrays[key].dtype.hasobject:
+            raise ValueError('The value of {} cannot be saved without pickle.'.format(key))
+    np.savez(filename, **arrays)
+    return
+
+
+def load_dict(filename):
+    """
+    Open a file of the 'dict' format: return a DictFile if it is a .npz file, or the unpickled dictionary if it is an
+    old .npy file containing a pickled dictionary.
+    """
+    if zipfile.is_zipfile(filename):
+        return DictFile(filename)
+    log.write_log('Warning: {} is not a .npz file: loading it as a pickled dictionary.'.format(filename))
+    return np.load(filename, allow_pickle=True).tolist()
+
+
+class DictFile(MutableMapping):
+    """
+    A dictionary of arrays and scalars read lazily from a .npz file (see save_dict).
+    The keys are read when the file is opened, while each value is read only when it is accessed for the first time:
+    arrays stored uncompressed are memory-mapped (read-only), scalars (0-d arrays) are returned as Python numbers.
+    Values can be replaced or added (in memory only, the file is not modified).
+    example:
+      data = DictFile('flux.npz')
+      print(list(data.keys()))
+      flux = data['flux']
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with zipfile.ZipFile(filename) as archive:
+            self._members = {}
+            for info in archive.infolist():
+                if info.filename.endswith('.npy'):
+                    self._members[info.filename[:-4]] = info
+        self._values = {}
+        return
+
+    def __repr__(self):
+        return 'DictFile({}): {}'.format(self.filename, list(self.keys()))
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            if key not in self._members:
+                raise KeyError(key)
+            self._values[key] = self._load(self._members[key])
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+
+    def __delitem__(self, key):
+        if (key not in self._values) and (key not in self._members):
+            raise KeyError(key)
+        self._values.pop(key, None)
+        self._members.pop(key, None)
+
+    def __iter__(self):
+        for key in self._members:
+            yield key
+        for key in self._values:
+            if key not in self._members:
+                yield key
+
+    def __len__(self):
+        return len(self._members) + len([key for key in self._values if key not in self._members])
+
+    def _load(self, info):
+        """Read the array stored in a member of the archive, memory-mapping it if possible."""
+        with open(self.filename, 'rb') as f:
+            f.seek(info.header_offset)
+            header = _LOCAL_HEADER.unpack(f.read(_LOCAL_HEADER.size))
+            f.seek(header[-2] + header[-1], 1)   # skip the name and the extra field of the member
+            if (info.compress_type != zipfile.ZIP_STORED):   # compressed (e.g. np.savez_compressed): read it
+                with zipfile.ZipFile(self.filename) as archive:
+                    with archive.open(info) as member:
+                        value = np.lib.format.read_array(member, allow_pickle=False)
+            else:
+                if (np.lib.format.read_magic(f) == (1, 0)):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+                if dtype.hasobject:
+                    raise ValueError('{}: object arrays are not supported.'.format(info.filename))
+                if (len(shape) == 0):   # scalar
+                    value = np.fromfile(f, dtype=dtype, count=1).reshape(())
+                elif (np.prod(shape) == 0):
+                    value = np.zeros(shape, dtype=dtype)
+                else:
+                    value = np.memmap(self.filename, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                      order='F' if fortran_order else 'C')
+        if (value.ndim == 0):
+            return value.item()
+        return value
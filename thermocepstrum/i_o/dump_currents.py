@@ -0,0 +1,130 @@
+################################################################################
+###
+###   DumpCurrents
+###
+################################################################################
+###
+###  compute the mass, charge and energy currents of a LAMMPS trajectory,
+###  reading the dump file (LAMMPS_Dump or LAMMPS_BinaryDump) one timestep at
+###  a time, so that only the arrays of one frame are kept in memory.
+###
+###  For every timestep:
+###   - the velocity sum of each species  V_s = sum_{i in s} v_i
+###   - the mass current of each species  J_s = m_s V_s           (masses given)
+###   - the charge current                J_Q = sum_s q_s V_s     (charges given)
+###   - the energy current                J_E = sum_i e_i v_i - sum_i S_i v_i
+###     (per-atom energy and stress columns present, e.g. from the LAMMPS
+###      computes pe/atom + ke/atom and stress/atom)
+###  The currents are extensive (not divided by the volume), as the output of
+###  the LAMMPS compute heat/flux, and they can be passed directly to
+###  HeatCurrent, e.g. HeatCurrent([J['energy'], J['mass_1']], 'metal', ...).
+###
+################################################################################
+
+## example:
+##   import thermocepstrum as tc
+##   traj = tc.i_o.LAMMPS_Dump(filename)
+##   J = tc.i_o.compute_dump_currents(traj, (0, 100000), energy_key='energy', stress_key='stress', units='metal')
+##   jen = tc.HeatCurrent([J['energy'], J['vsum_1']], 'metal', DT_FS, TEMPERATURE, VOLUME)
+##
+
+import numpy as np
+from time import time
+from thermocepstrum.utils.utils import PrintMethod
+log = PrintMethod()
+
+# conversion factors of the LAMMPS per-atom stress (pressure*volume units) to energy units (force->nktv2p)
+NKTV2P = {'metal': 1.6021765e6, 'real': 68568.415}
+_STRESS_TENSOR = [0, 3, 4, 3, 1, 5, 4, 5, 2]   # (xx, yy, zz, xy, xz, yz) --> 3x3 matrix
+
+
+def _stack_columns(frame, keys):
+    """Return the (NATOMS, ncols) array of the columns of keys in a frame."""
+    return np.hstack([frame[key] for key in keys])
+
+
+def compute_dump_currents(traj, selection, start_step=-1, species_key='type', velocity_keys=('vx', 'vy', 'vz'),
+                          masses=None, charges=None, energy_key=None, stress_key=None, units=None, fast_check=True):
+    """
+    Compute the currents of a LAMMPS dump trajectory, streaming its timesteps.
+    INPUT:
+     - traj           a LAMMPS_Dump (or LAMMPS_BinaryDump) object
+     - selection      the timesteps to read, as in LAMMPS_Dump.read_timesteps (e.g. N, (first, last), ...)
+     - start_step     first timestep (as in LAMMPS_Dump.read_timesteps)
+     - species_key    the ckey of the species of the atoms (e.g. 'type', 'element')
+     - velocity_keys  the ckeys of the velocity components (or a single vector ckey)
+     - masses         dictionary of the mass of each species (optional)  -->  mass currents
+     - charges        dictionary of the charge of each species (optional)  -->  charge current
+     - energy_key     the ckey of the per-atom energy (optional)  -->  energy current
+     - stress_key     the ckey(s) of the per-atom stress (6 columns: xx, yy, zz, xy, xz, yz), optional
+     - units          units of the LAMMPS per-atom stress ('metal', 'real'). If given, the stress (pressure*volume)
+                      is converted to energy units, as in the LAMMPS compute heat/flux.
+                      If None, the stress columns are assumed to be already in energy units.
+    OUTPUT:
+     a dictionary with the (nsteps, 3) arrays of the currents, and the list of timesteps:
+     'vsum_<species>', 'mass_<species>', 'charge', 'energy', 'TIMESTEP', and 'species' (the list of species).
+    The species of each atom are read from the first timestep, and they are assumed not to change.
+    """
+    if isinstance(velocity_keys, str):
+        velocity_keys = [velocity_keys]
+    if isinstance(stress_key, str):
+        stress_key = [stress_key]
+    select_ckeys = [species_key] + list(velocity_keys)
+    if energy_key is not None:
+        select_ckeys.append(energy_key)
+    if stress_key is not None:
+        if energy_key is None:
+            raise ValueError('stress_key requires energy_key.')
+        select_ckeys += list(stress_key)
+    for key in select_ckeys:
+        if key not in traj.all_ckeys:
+            raise KeyError('{} key not found.'.format(key))
+    stress_factor = 1.0 if (units is None) else 1.0 / NKTV2P[units]
+
+    start_time = time()
+    currents = None
+    for istep, frame in enumerate(traj.iter_timesteps(selection, start_step, select_ckeys, fast_check)):
+        if currents is None:   # first frame: group the atoms by species and allocate the output
+            labels = frame[species_key][:, 0]
+            if species_key in traj.categories:   # categorical column (e.g. element)
+                labels = traj.decode(species_key, labels)
+            else:
+                labels = labels.astype(int)
+            species, counts = np.unique(labels, return_counts=True)
+            order = np.argsort(labels, kind='stable')   # atoms sorted by species
+            bounds = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            species = list(species.tolist())
+            currents = {'vsum_{}'.format(s): np.zeros((traj.nsteps, 3)) for s in species}
+            if energy_key is not None:
+                currents['energy'] = np.zeros((traj.nsteps, 3))
+            currents['TIMESTEP'] = np.zeros(traj.nsteps, dtype=int)
+
+        velocity = _stack_columns(frame, velocity_keys)
+        vsum = np.add.reduceat(velocity[order], bounds, axis=0)   # (nspecies, 3)
+        for s, v in zip(species, vsum):
+            currents['vsum_{}'.format(s)][istep] = v
+        if energy_key is not None:
+            current = np.dot(frame[energy_key][:, 0], velocity)
+            if stress_key is not None:
+                stress = _stack_columns(frame, stress_key)[:, _STRESS_TENSOR].reshape((-1, 3, 3))
+                current -= stress_factor * np.einsum('iab,ib->a', stress, velocity)
+            currents['energy'][istep] = current
+        currents['TIMESTEP'][istep] = frame['TIMESTEP']
+
+    if currents is None:
+        raise ValueError('No timestep read.')
+    nsteps = istep + 1
+    if (nsteps < traj.nsteps):
+        log.write_log('Warning:  less steps read.')
+        for key in currents:
+            currents[key] = currents[key][:nsteps]
+    if masses is not None:
+        for s in species:
+            currents['mass_{}'.format(s)] = masses[s] * currents['vsum_{}'.format(s)]
+    if charges is not None:
+        currents['charge'] = sum(charges[s] * currents['vsum_{}'.format(s)] for s in species)
+    currents['species'] = species
+    if not traj._quiet:
+        log.write_log('  ( %d ) steps read.' % (nsteps))
+        log.write_log('DONE.  Elapsed time: ', time() - start_time, 'seconds')
+    return currents
@@ -0,0 +1,142 @@
+################################################################################
+###
+###   FileIndex
+###
+################################################################################
+###
+###  Persistent byte-offset indexes of large text files.
+###
+###  An index is a JSON dictionary saved in a sidecar file next to the indexed
+###  one ('<filename>.tcindex'). It records the size and modification time of
+###  the indexed file, and it is discarded (and rebuilt by the reader) as soon
+###  as any of them changes.
+###  If the sidecar file cannot be written (e.g. read-only folder), the index
+###  is only kept in memory.
+###  The offsets of compressed files refer to their decompressed content.
+###
+################################################################################
+
+import os
+import json
+import mmap
+import numpy as np
+from thermocepstrum.utils.utils import PrintMethod
+from .compressed import is_compressed, open_binary
+log = PrintMethod()
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.tcindex'
+
+
+def index_filename(filename):
+    """Return the name of the sidecar index file of filename."""
+    return filename + INDEX_SUFFIX
+
+
+def _file_signature(filename):
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def load_index(filename, kind):
+    """
+    Load the index of the given kind (e.g. 'lammps_log') of filename.
+    Returns None if the index does not exist, is not readable, or is out of date.
+    """
+    try:
+        with open(index_filename(filename), 'r') as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    signature = _file_signature(filename)
+    if (index.get('version') != INDEX_VERSION) or (index.get('kind') != kind) or \
+       (index.get('size') != signature['size']) or (index.get('mtime') != signature['mtime']):
+        return None
+    return index
+
+
+def save_index(filename, kind, index):
+    """
+    Save the index of the given kind of filename into its sidecar file.
+    The signature (size, mtime) of filename is added to the index.
+    Returns True if the index was written.
+    """
+    index.update(_file_signature(filename))
+    index['version'] = INDEX_VERSION
+    index['kind'] = kind
+    try:
+        with open(index_filename(filename), 'w') as f:
+            json.dump(index, f)
+    except (IOError, OSError):
+        log.write_log('Warning: cannot write index file {}'.format(index_filename(filename)))
+        return False
+    return True
+
+
+def find_bytes(filename, pattern, start=0, chunk_size=4 * 1024**2):
+    """Return the byte offset of the first occurrence of pattern (bytes) in filename, after start (-1 if not found)."""
+    if is_compressed(filename):   # search the decompressed stream
+        with open_binary(filename) as f:
+            f.seek(start)
+            offset = start   # offset of buf
+            buf = b''
+            while True:
+                data = f.read(chunk_size)
+                if not data:   # EOF
+                    return -1
+                buf += data
+                pos = buf.find(pattern)
+                if (pos >= 0):
+                    return offset + pos
+                keep = min(len(pattern) - 1, len(buf))   # the pattern may continue in the next chunk
+                offset += len(buf) - keep
+                buf = buf[len(buf) - keep:]
+    with open(filename, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:   # empty file
+            return -1
+        try:
+            return mm.find(pattern, start)
+        finally:
+            mm.close()
+
+
+def count_file_lines(filename, start=0, end=None, chunk_size=64 * 1024**2):
+    """
+    Count the lines of filename between the byte offsets start and end (default: EOF), counting the newlines of the
+    memory-mapped file. A final line without newline is counted as a line.
+    """
+    if is_compressed(filename):   # count the newlines of the decompressed stream
+        with open_binary(filename) as f:
+            f.seek(start)
+            nbytes = float('inf') if (end is None) else (end - start)
+            nlines = 0
+            last = b'\n'
+            while (nbytes > 0):
+                buf = f.read(min(chunk_size, nbytes))
+                if not buf:   # EOF
+                    break
+                nlines += buf.count(b'\n')
+                nbytes -= len(buf)
+                last = buf[-1:]
+            if (end is None) and (last != b'\n'):
+                nlines += 1
+            return nlines
+    with open(filename, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:   # empty file
+            return 0
+        try:
+            stop = len(mm) if (end is None) else min(end, len(mm))
+            nlines = 0
+            for pos in range(start, stop, chunk_size):
+                chunk = np.frombuffer(mm, dtype=np.uint8, count=min(chunk_size, stop - pos), offset=pos)
+                nlines += np.count_nonzero(chunk == ord('\n'))
+                del chunk   # release the buffer before closing the mmap
+            if (stop == len(mm)) and (stop > start) and (mm[stop - 1] != ord('\n')):
+                nlines += 1
+        finally:
+            mm.close()
+    return nlines
@@ -0,0 +1,206 @@
+################################################################################
+###
+###   HDF5File
+###
+################################################################################
+###
+###  Read and write currents and analysis results in HDF5 files (requires the
+###  optional h5py package: pip install thermocepstrum[hdf5]).
+###
+###  Currents are stored as chunked (and optionally compressed) datasets of
+###  shape (N, N_COMPONENTS), one for each current, in the same group. The
+###  metadata needed by HeatCurrent are attributes of the group:
+###    DT_FS        MD time step [fs]
+###    TEMPERATURE  average temperature [K]
+###    VOLUME       cell volume [A^3]
+###    units        units of the currents ('metal', 'real', ...)
+###  Only the selected range of steps (start_step, NSTEPS) is read from file.
+###
+###  The results of the analysis of a HeatCurrent (periodogram, cospectrum,
+###  cepstral coefficients, kappa(P*), ...) can be written in a group with
+###  write_results.
+###
+################################################################################
+
+## example:
+##   write_currents('currents.h5', {'flux': flux, 'vcm': vcm}, DT_FS=5., TEMPERATURE=1400., VOLUME=4.e4, units='metal')
+##   hfile = HDF5File('currents.h5')
+##   j = hfile.heatcurrent(['flux', 'vcm'], NSTEPS=100000)
+##
+
+import numpy as np
+from thermocepstrum.utils.utils import PrintMethod
+log = PrintMethod()
+
+HEATCURRENT_ATTRIBUTES = ['units', 'DT_FS', 'TEMPERATURE', 'VOLUME']   # arguments of HeatCurrent
+CHUNK_STEPS = 65536   # default number of steps of the chunks of the datasets
+
+
+def _import_h5py():
+    """Import the optional h5py package."""
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError('h5py is needed to read and write HDF5 files (pip install thermocepstrum[hdf5]).')
+    return h5py
+
+
+def _attribute(value):
+    """Convert an HDF5 attribute to a Python value."""
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def write_currents(filename, currents, DT_FS=None, TEMPERATURE=None, VOLUME=None, units=None, group='/',
+                   chunk_steps=CHUNK_STEPS, compression='gzip', mode='a'):
+    """
+    Write a dictionary of currents (arrays of shape (N, N_COMPONENTS)) as chunked datasets of a group of an HDF5 file.
+    The metadata that are given (not None) are saved as attributes of the group.
+    compression can be any filter supported by h5py (e.g. 'gzip', 'lzf') or None.
+    """
+    h5py = _import_h5py()
+    with h5py.File(filename, mode) as f:
+        g = f.require_group(group)
+        for key, value in currents.items():
+            value = np.asarray(value)
+            if (value.ndim == 1):
+                value = value[:, np.newaxis]
+            if key in g:
+                del g[key]
+            chunks = (min(chunk_steps, value.shape[0]), value.shape[1]) if value.size else None
+            g.create_dataset(key, data=value, chunks=chunks, compression=compression)
+        for name, value in zip(HEATCURRENT_ATTRIBUTES, [units, DT_FS, TEMPERATURE, VOLUME]):
+            if value is not None:
+                g.attrs[name] = value
+    return
+
+
+def write_results(filename, j, group='results', compression='gzip', mode='a'):
+    """
+    Write the results of the analysis of a HeatCurrent j in a group of an HDF5 file:
+      periodogram      freqs_THz, psd, fpsd, logpsd, flogpsd (and cospectrum, fcospectrum for many currents)
+      cepstral         ck, ck_std, L0(P*), L0_std(P*), kappa(P*), kappa_std(P*), cepstrum-filtered psd and logpsd
+                       (if the cepstral analysis was performed)
+    and the main parameters and results as attributes (kappa_Kmin, kappa_Kmin_std, aic_Kmin, ...).
+    """
+    h5py = _import_h5py()
+    with h5py.File(filename, mode) as f:
+        if group in f:
+            del f[group]
+        g = f.create_group(group)
+
+        def write(subgroup, name, value):
+            if value is None:   # not computed
+                return
+            value = np.asarray(value)
+            subgroup.create_dataset(name, data=value, compression=compression if value.ndim else None)
+
+        for name in HEATCURRENT_ATTRIBUTES + ['kappa_scale', 'Nyquist_f_THz']:
+            g.attrs[name] = getattr(j, name)
+        periodogram = g.create_group('periodogram')
+        for name in ['freqs_THz', 'psd', 'fpsd', 'logpsd', 'flogpsd']:
+            write(periodogram, name, getattr(j, name))
+        if getattr(j, 'many_currents', False):
+            write(periodogram, 'cospectrum', j.cospectrum)
+            if getattr(j, 'fcospectrum', None) is not None:
+                write(periodogram, 'fcospectrum', j.fcospectrum)
+        if getattr(j, 'dct', None) is not None:
+            cepstral = g.create_group('cepstral')
+            write(cepstral, 'ck', j.dct.logpsdK)
+            write(cepstral, 'ck_std', j.dct.logpsdK_THEORY_std)
+            write(cepstral, 'L0', j.dct.logtau)
+            write(cepstral, 'L0_std', j.dct.logtau_THEORY_std)
+            write(cepstral, 'kappa', j.dct.tau * j.kappa_scale * 0.5)
+            write(cepstral, 'kappa_std', j.dct.tau_THEORY_std * j.kappa_scale * 0.5)
+            write(cepstral, 'psd', j.dct.psd)
+            write(cepstral, 'logpsd', j.dct.logpsd)
+            g.attrs['kappa_Kmin'] = j.kappa_Kmin
+            g.attrs['kappa_Kmin_std'] = j.kappa_Kmin_std
+            g.attrs['aic_Kmin'] = j.dct.aic_Kmin
+            g.attrs['Kmin_corrfactor'] = j.dct.Kmin_corrfactor
+    return
+
+
+class HDF5File(object):
+    """
+    A group of an HDF5 file containing currents (see write_currents), that can be read in ranges of steps.
+    example:
+      hfile = HDF5File('currents.h5')
+      data = hfile.read_datalines(NSTEPS=1000, start_step=500, select_ckeys=['flux'])
+      j = hfile.heatcurrent(['flux', 'vcm'], PSD_FILTER_W=0.1)
+    The attributes of the group (DT_FS, TEMPERATURE, VOLUME, units, ...) are in the attrs dictionary.
+    Only the steps requested are read from file: the datasets are sliced before being loaded.
+    """
+
+    def __init__(self, filename, group='/'):
+        h5py = _import_h5py()
+        self.filename = filename
+        self.file = h5py.File(filename, 'r')
+        self.group = self.file[group]
+        self.all_ckeys = [key for key, value in self.group.items() if isinstance(value, h5py.Dataset)]
+        self.attrs = {name: _attribute(value) for name, value in self.group.attrs.items()}
+        self.data = None
+        return
+
+    def __repr__(self):
+        return 'HDF5File:\n' + \
+               '  filename:      {}\n'.format(self.filename) + \
+               '  group:         {}\n'.format(self.group.name) + \
+               '  all_ckeys:     {}\n'.format(self.all_ckeys) + \
+               '  attrs:         {}\n'.format(self.attrs)
+
+    def close(self):
+        self.file.close()
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read_datalines(self, NSTEPS=0, start_step=0, select_ckeys=None, dtype=None):
+        """
+        Read NSTEPS steps of the selected ckeys, starting from start_step.
+          NSTEPS        -> number of steps to read (default: 0 -> read up to the end)
+          start_step    -> first step to read (default: 0)
+          select_ckeys  -> list of the datasets to read (default: all)
+          dtype         -> type of the data arrays (default: the type of the datasets)
+        Returns a dictionary with the (NSTEPS, N_COMPONENTS) arrays.
+        """
+        if select_ckeys is None:
+            select_ckeys = self.all_ckeys
+        self.data = {}
+        for key in select_ckeys:
+            if key not in self.all_ckeys:
+                raise KeyError('{} key not found.'.format(key))
+            dataset = self.group[key]
+            end = dataset.shape[0] if (NSTEPS == 0) else min(start_step + NSTEPS, dataset.shape[0])
+            if (end <= start_step):
+                raise ValueError('No step to read from {} (start_step = {}).'.format(key, start_step))
+            if dtype is None:
+                self.data[key] = dataset[start_step:end]
+            else:
+                self.data[key] = np.empty((end - start_step,) + dataset.shape[1:], dtype=dtype)
+                dataset.read_direct(self.data[key], np.s_[start_step:end])
+        log.write_log('  ( %d ) steps read.' % (end - start_step))
+        return self.data
+
+    def heatcurrent(self, select_ckeys, NSTEPS=0, start_step=0, **kwargs):
+        """
+        Return a HeatCurrent built with the currents select_ckeys (the first one is the heat current, the others are
+        the additional currents of a multi-component fluid), read from start_step for NSTEPS steps.
+        units, DT_FS, TEMPERATURE and VOLUME are taken from the attributes of the group, unless they are given as
+        keyword arguments. The other keyword arguments are passed to HeatCurrent (e.g. PSD_FILTER_W, dtype).
+        """
+        from thermocepstrum.heatcurrent import HeatCurrent
+        data = self.read_datalines(NSTEPS, start_step, select_ckeys, kwargs.get('dtype', None))
+        for name in HEATCURRENT_ATTRIBUTES:
+            if name not in kwargs:
+                if name not in self.attrs:
+                    raise ValueError('{} not found in the attributes: please give it as an argument.'.format(name))
+                kwargs[name] = self.attrs[name]
+        return HeatCurrent([data[key] for key in select_ckeys], **kwargs)
@@ -0,0 +1,129 @@
+################################################################################
+###
+###   IngestCache
+###
+################################################################################
+###
+###  Binary cache of the data parsed from text files.
+###
+###  The arrays read from a file (e.g. the selected columns of a TableFile or
+###  LAMMPSLogFile) are saved in a directory of .npy files, together with a
+###  meta.json file. The name of the directory is a hash of the absolute path,
+###  size and modification time of the source file, and of the parameters of
+###  the reading (selected columns, start step, number of steps, ...).
+###  Later reads of the same data load the .npy files memory-mapped, i.e.
+###  without parsing the source file again.
+###
+###  The state of the accumulators fed while reading (e.g. the statistics of
+###  the temperature, see md.tools.BlockingAccumulator) is saved with the
+###  arrays, so that a read from the cache gives the same statistics.
+###
+###  The cache directory can be chosen with the THERMOCEPSTRUM_CACHE
+###  environment variable (default: ~/.cache/thermocepstrum).
+###  Cached entries are never removed automatically: just delete the
+###  directory to free the space.
+###
+################################################################################
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+from thermocepstrum.utils.utils import PrintMethod
+log = PrintMethod()
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.environ.get('THERMOCEPSTRUM_CACHE',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'thermocepstrum'))
+
+
+def cache_dirname(cache):
+    """
+    Return the cache directory selected by the cache option of the readers:
+      None/False/''  ->  None (no cache)
+      True           ->  DEFAULT_CACHE_DIR
+      a string       ->  the string itself
+    """
+    if not cache:
+        return None
+    if cache is True:
+        return DEFAULT_CACHE_DIR
+    return cache
+
+
+def cacheable_accumulators(accumulators):
+    """Return True if the state of the accumulators can be saved in the cache (and restored from it): they must be
+    empty and have the state/set_state methods (as md.tools.BlockingAccumulator)."""
+    return all(hasattr(accumulator, 'set_state') and (accumulator.n == 0)
+               for accumulator in (accumulators or {}).values())
+
+
+def _json_params(params):
+    """Convert the arrays contained in a dictionary of parameters to lists, so that it can be saved as JSON."""
+    if isinstance(params, dict):
+        return {key: _json_params(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple, np.ndarray)):
+        return [_json_params(value) for value in params]
+    if isinstance(params, np.generic):
+        return params.item()
+    return params
+
+
+def cache_entry(filename, params, cache_dir=DEFAULT_CACHE_DIR):
+    """Return the directory of the cache entry of filename read with the given parameters."""
+    stat = os.stat(filename)
+    key = {
+        'file': os.path.abspath(filename),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'version': CACHE_VERSION,
+        'params': _json_params(params)
+    }
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    return os.path.join(cache_dir, digest)
+
+
+def load_cached(filename, params, cache_dir=DEFAULT_CACHE_DIR, mmap_mode='r'):
+    """
+    Load the data of filename read with the given parameters from the cache.
+    The arrays are memory-mapped (read-only) by default.
+    Returns (data, meta), i.e. the dictionary of arrays and the dictionary of metadata saved with them,
+    or None if the entry does not exist.
+    """
+    entry = cache_entry(filename, params, cache_dir)
+    try:
+        with open(os.path.join(entry, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        data = {}
+        for i, key in enumerate(meta['keys']):
+            data[key] = np.load(os.path.join(entry, '{:d}.npy'.format(i)), mmap_mode=mmap_mode)
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+    return data, meta['meta']
+
+
+def save_cached(filename, params, data, meta=None, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Save the dictionary of arrays data, obtained reading filename with the given parameters, into the cache.
+    meta is an optional dictionary of metadata (JSON-serializable) saved with the arrays.
+    Returns True if the entry was written.
+    """
+    entry = cache_entry(filename, params, cache_dir)
+    tmp = entry + '.tmp{:d}'.format(os.getpid())
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        keys = list(data.keys())
+        for i, key in enumerate(keys):
+            np.save(os.path.join(tmp, '{:d}.npy'.format(i)), np.asarray(data[key]))
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'file': os.path.abspath(filename), 'params': _json_params(params), 'keys': keys,
+                       'meta': _json_params(meta or {})}, f)
+        if os.path.isdir(entry):   # written in the meantime by someone else
+            shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tmp, entry)   # the entry appears only when it is complete
+    except (IOError, OSError):
+        log.write_log('Warning: cannot write cache entry {}'.format(entry))
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+    return True
@@ -0,0 +1,290 @@
+################################################################################
+###
+###   ReadLAMMPSBinaryDump
+###
+################################################################################
+###
+###  a package to read LAMMPS binary dump files ("dump ... binary yes", or
+###  dump files with the .bin suffix), with the same interface of the text
+###  dump reader (LAMMPS_Dump).
+###
+###  Each timestep of a binary dump is made of a small header followed by the
+###  per-atom values, stored as double-precision numbers in one or more chunks
+###  (one for each writing process). Only the headers are parsed: the data are
+###  taken as NumPy views of a memory map of the file, without any conversion.
+###
+###  Both layouts written by LAMMPS are supported:
+###   - the old one, that starts directly with the timestep and does not
+###     contain the names of the columns (they must be given, see below);
+###   - the new one, where each header starts with a magic string (e.g.
+###     "DUMPATOM", "DUMPCUSTOM"), an endianness flag and a revision number,
+###     and (revision > 1) contains the units, the time and the column names.
+###
+################################################################################
+
+## example:
+##   import read_lammps_bindump as rd
+##   traj = rd.LAMMPS_BinaryDump(filename)
+##   traj.read_timesteps((0, 1000), select_ckeys=['id', 'vx', 'vy', 'vz'])
+##
+
+import io
+import struct
+import numpy as np
+from thermocepstrum.utils.utils import PrintMethod
+from .read_lammps_dump import LAMMPS_Dump, columns_ckeys
+log = PrintMethod()
+
+DUMP_ATOM_COLUMNS = ['id', 'type', 'xs', 'ys', 'zs']   # columns of "dump atom" (used if the file has no column names)
+_BOUNDARY_TYPES = 'pfsm'   # LAMMPS boundary codes 0, 1, 2, 3
+
+
+def _unpack(f, fmt):
+    """Read and unpack the struct format fmt from the binary file object f."""
+    size = struct.calcsize(fmt)
+    buf = f.read(size)
+    if (len(buf) < size):
+        raise EOFError('Truncated binary dump header.')
+    return struct.unpack(fmt, buf)
+
+
+def read_frame_header(f):
+    """
+    Read the header of the timestep that starts at the current position of the binary file object f.
+    Returns a dictionary with the header fields, or None at EOF. The data chunks are not read: their byte offsets and
+    sizes (number of values) are listed in header['chunks'], and f is left positioned at the end of the timestep
+    (header['end']).
+    """
+    offset = f.tell()
+    buf = f.read(8)
+    if (len(buf) < 8):   # EOF
+        return None
+    order = '<'
+    timestep, = struct.unpack(order + 'q', buf)
+    header = {'offset': offset, 'magic': None, 'revision': 0, 'units': None, 'time': None, 'columns': None}
+    if (timestep < 0):   # new format: the first number is minus the length of the magic string
+        header['magic'] = f.read(-timestep).decode()
+        if (_unpack(f, order + 'i')[0] != 1):   # endianness flag
+            order = '>'
+        header['revision'], = _unpack(f, order + 'i')
+        timestep, = _unpack(f, order + 'q')
+    header['order'] = order
+    header['timestep'] = timestep
+    header['natoms'], = _unpack(f, order + 'q')
+    header['triclinic'], = _unpack(f, order + 'i')
+    boundary = _unpack(f, order + '6i')
+    header['boundary'] = [_BOUNDARY_TYPES[boundary[2 * i]] + _BOUNDARY_TYPES[boundary[2 * i + 1]] for i in range(3)]
+    header['box'] = np.reshape(_unpack(f, order + '6d'), (3, 2))
+    if header['triclinic']:   # xy, xz, yz tilt factors
+        header['box'] = np.column_stack((header['box'], _unpack(f, order + '3d')))
+    header['size_one'], = _unpack(f, order + 'i')
+    if (header['revision'] > 1):   # units, time and column names
+        length, = _unpack(f, order + 'i')
+        if (length > 0):
+            header['units'] = f.read(length).decode()
+        if _unpack(f, 'b')[0]:
+            header['time'], = _unpack(f, order + 'd')
+        length, = _unpack(f, order + 'i')
+        header['columns'] = f.read(length).decode().split()
+    nchunk, = _unpack(f, order + 'i')
+    header['chunks'] = []
+    for i in range(nchunk):
+        n, = _unpack(f, order + 'i')
+        header['chunks'].append((f.tell(), n))
+        f.seek(8 * n, io.SEEK_CUR)
+    header['end'] = f.tell()
+    return header
+
+
+def frame_values(buffer, header):
+    """
+    Return the (natoms, size_one) array of the values of a timestep, given its header and the content of the file
+    (e.g. a np.memmap). If the data are stored in a single chunk, the array is a read-only view of the buffer.
+    """
+    dtype = np.dtype(header['order'] + 'f8')
+    parts = [np.frombuffer(buffer, dtype=dtype, count=n, offset=offset) for offset, n in header['chunks']]
+    if (len(parts) == 0):
+        return np.zeros((0, header['size_one']), dtype=dtype)
+    values = parts[0] if (len(parts) == 1) else np.concatenate(parts)
+    return values.reshape((-1, header['size_one']))
+
+
+def build_bindump_index(filename):
+    """
+    Scan the headers of a LAMMPS binary dump file and return an index with the list of timesteps and their byte
+    offsets ({'timesteps': [...], 'offsets': [...]}). A truncated last timestep is not included.
+    """
+    timesteps = []
+    offsets = []
+    with open(filename, 'rb') as f:
+        size = f.seek(0, io.SEEK_END)
+        f.seek(0)
+        while True:
+            try:
+                header = read_frame_header(f)
+            except EOFError:
+                break
+            if (header is None) or (header['end'] > size):
+                break
+            timesteps.append(header['timestep'])
+            offsets.append(header['offset'])
+    return {'timesteps': timesteps, 'offsets': offsets}
+
+
+class LAMMPS_BinaryDump(LAMMPS_Dump):
+    """
+    A LAMMPS binary dump file that can be read in blocks, like a LAMMPS_Dump (text) file.
+    example:
+      traj = LAMMPS_BinaryDump(filename)
+      traj.read_timesteps(10, start_step=0, select_ckeys=['id', 'vx', 'vy', 'vz'])  -->>  Read first 10 timesteps
+      traj.read_timesteps((10,30,2))    -->>  Read every 2 steps from TIMESTEP 10 to 30
+      print(traj.data)
+
+    The values of each timestep are read from a memory map of the file, without any conversion.
+    The files written by recent LAMMPS versions contain the names of the columns. For older files they can be given
+    with the columns keyword, e.g. columns=['id', 'type', 'vx', 'vy', 'vz'] (default: the columns of "dump atom",
+    i.e. id type xs ys zs, if the file contains 5 columns).
+    The other keywords (preload, index, group_vectors, quiet, GUI) have the same meaning as in LAMMPS_Dump.
+    """
+
+    _INDEX_KIND = 'lammps_bindump'
+    _build_index = staticmethod(build_bindump_index)
+
+    def __init__(self, *args, **kwargs):
+        self._columns = kwargs.get('columns', None)
+        super(LAMMPS_BinaryDump, self).__init__(*args, **kwargs)
+        return
+
+    def _open_file(self):
+        """Open the file and map it in memory."""
+        try:
+            self.file = open(self.filename, 'rb')
+        except:
+            raise ValueError('File does not exist.')
+        self._buffer = np.memmap(self.filename, dtype=np.uint8, mode='r')
+        return
+
+    def _next_header(self):
+        """Read the header of the timestep at the current position, recording its offset. Returns None at EOF."""
+        header = read_frame_header(self.file)
+        if (header is None) or (header['end'] > self._buffer.size):   # EOF or truncated timestep
+            return None
+        self._timestep_offsets[header['timestep']] = header['offset']
+        return header
+
+    def _read_ckeys(self, group_vectors=True, preload_timesteps=True):
+        """Read the column keys from the first header. If group_vectors=True the vector ckeys are grouped togheter"""
+        self._start_byte = 0
+        self.file.seek(self._start_byte)
+        self.preload_timesteps = preload_timesteps
+        header = self._next_header()
+        if header is None:
+            raise RuntimeError('Reached EOF, no timestep found.')
+        self.current_timestep = self.FIRST_TIMESTEP = header['timestep']
+        self.NATOMS = header['natoms']
+        self.BOX_BOUNDS_TYPE = header['boundary']
+        self.BOX_BOUNDS = header['box']
+        self.UNITS = header['units']
+        columns = header['columns'] or self._columns
+        if columns is None:
+            if (header['size_one'] != len(DUMP_ATOM_COLUMNS)):
+                raise ValueError('The file does not contain the names of the columns: please give them with the '
+                                 'columns keyword.')
+            columns = DUMP_ATOM_COLUMNS
+        if (len(columns) != header['size_one']):
+            raise ValueError('{} column names given, but the file contains {} columns.'.format(
+                len(columns), header['size_one']))
+        self.NALLCKEYS = header['size_one']
+        self.all_ckeys = columns_ckeys(columns, group_vectors)
+        self._string_columns = []   # binary dumps contain only numbers
+
+        self.all_timesteps = [self.FIRST_TIMESTEP]
+        if self.preload_timesteps:
+            # get the list of time steps
+            if self.index is not None:
+                self.all_timesteps = list(self.index['timesteps'])
+            else:
+                header = self._next_header()
+                while header is not None:
+                    self.all_timesteps.append(header['timestep'])
+                    header = self._next_header()
+            self.LAST_TIMESTEP = self.all_timesteps[-1]
+            self.DELTA_TIMESTEP = self.all_timesteps[1] - self.FIRST_TIMESTEP
+            self.TOT_TIMESTEPS = len(self.all_timesteps)
+            self.all_timesteps = np.array(self.all_timesteps)
+        else:
+            log.write_log(' ** No timesteps pre-loaded. Be careful in the selection. **')
+            header = self._next_header()   # get the first 2 timesteps
+            if header is not None:
+                self.all_timesteps.append(header['timestep'])
+            self.LAST_TIMESTEP = None
+            self.DELTA_TIMESTEP = self.all_timesteps[1] - self.FIRST_TIMESTEP
+            self.TOT_TIMESTEPS = None
+            self.all_timesteps = None
+
+        # go back to the first timestep
+        self.gototimestep(0)
+        log.write_log('  all_ckeys      = ', self.all_ckeys)
+        log.write_log('  TOT_TIMESTEPS  = ', self.TOT_TIMESTEPS)
+        log.write_log('  FIRST_TIMESTEP = ', self.FIRST_TIMESTEP)
+        log.write_log('  DELTA_TIMESTEP = ', self.DELTA_TIMESTEP)
+        log.write_log('  LAST_TIMESTEP  = ', self.LAST_TIMESTEP)
+        log.write_log('  all_timesteps  = ', self.all_timesteps)
+        return
+
+    def _gototimestep(self, start_step, fast_check=True):
+        """
+        Go to the start_step-th timestep and read its header.
+          start_step = -1  -->  ignore, continue from current step
+                        0  -->  go to FIRST timestep
+                        N  -->  go to N-th timestep
+          fast_check = True --> assumes the TIMESTEP are a monotonously increasing.
+                                If the the start_step is passed and not found then stop.
+        """
+        if (start_step < 0):
+            return
+        goto_step = self.FIRST_TIMESTEP if (start_step == 0) else start_step
+        offset = self._timestep_offsets.get(goto_step, None)
+        if offset is None:
+            if self.index is not None:   # the index contains all the timesteps
+                if (not fast_check) or (goto_step > self.index['timesteps'][-1]):
+                    raise EOFError('Warning (gototimestep):  reached EOF. Timestep {} NOT FOUND.'.format(goto_step))
+                raise Warning('Warning (gototimestep):  Timestep {} NOT FOUND in the index.'.format(goto_step))
+            # scan the headers, starting from the closest timestep already found
+            previous = [step for step in self._timestep_offsets if (step < goto_step)]
+            self.file.seek(self._timestep_offsets[max(previous)] if previous else self._start_byte)
+            while True:
+                header = self._next_header()
+                if header is None:
+                    raise EOFError('Warning (gototimestep):  reached EOF. Timestep {} NOT FOUND.'.format(goto_step))
+                if (header['timestep'] == goto_step):
+                    offset = header['offset']
+                    break
+                if fast_check and (header['timestep'] > goto_step):
+                    raise Warning('Warning (gototimestep):  Timestep {} NOT FOUND up to current_step = {}. '
+                                  '(To force check the whole trajectory set fast_check=False)'.format(
+                                      goto_step, header['timestep']))
+        self.file.seek(offset)
+        self._header = read_frame_header(self.file)
+        self.current_timestep = self._header['timestep']
+        return
+
+    def _prepare_frames(self):
+        """Find the column of the atom ids (if present), before reading the timesteps."""
+        self._atomid_col = self.all_ckeys['id'][0] if ('id' in self.all_ckeys) else None
+        return
+
+    def _read_frame(self, frame, step):
+        """Store the values of the current timestep in the frame dictionary (sorted by atom id, if present)."""
+        if (self._header['end'] > self._buffer.size):
+            raise EOFError('Warning:  reached EOF.')
+        values = frame_values(self._buffer, self._header)
+        if (values.shape[0] != self.NATOMS):
+            raise ValueError('Timestep {} contains {} atoms instead of {}.'.format(step, values.shape[0], self.NATOMS))
+        if self._atomid_col is not None:
+            atomid = values[:, self._atomid_col].astype(int) - 1   # atom indexes (in LAMMPS they start from 1)
+        else:
+            atomid = slice(None)
+        for key, idx in self.ckey.items():   # save the selected columns
+            frame[key][atomid, :] = values[:, idx]
+        return
@@ -17,8 +17,14 @@
 import numpy as np
 from time import time
 from thermocepstrum.utils.utils import PrintMethod
+from .compressed import open_text, open_binary
+from .chunkparse import read_line_chunks, read_lines, parse_block, parse_strings, PROJECT_FRACTION
+from .fileindex import load_index, save_index
 log = PrintMethod()
 
+_TIMESTEP_ITEM = b'ITEM: TIMESTEP\n'
+CATEGORY_DTYPE = np.int32   # type of the codes of the categorical (string) columns
+
 
 def is_string(string):
     try:
@@ -35,6 +41,37 @@ def is_vector_variable(string):
     return bracket
 
 
+def columns_ckeys(columns, group_vectors=True):
+    """
+    Return the dictionary of the column indexes of each key, given the list of column names of the atoms section.
+    If group_vectors=True the vector ckeys (e.g. c_flux[1], c_flux[2], c_flux[3]) are grouped together.
+    """
+    ckeys = {}
+    for i in range(len(columns)):
+        if group_vectors:
+            bracket = is_vector_variable(columns[i])   # get position of left square bracket
+        else:
+            bracket = 0
+        if (bracket == 0):   # the variable is a scalar
+            key = columns[i]
+            if (key[:2] == 'c_'):   # remove 'c_' if present
+                key = key[2:]
+            ckeys[key] = [i]
+        else:   # the variable is a vector
+            key = columns[i][:bracket]   # name of vector
+            if (key[:2] == 'c_'):   # remove 'c_' if present
+                key = key[2:]
+            vecidx = int(columns[i][bracket + 1:-1])   # current index
+            if key in ckeys:   # if this vector is already defined, add this component
+                if (vecidx > ckeys[key].size):
+                    ckeys[key] = np.resize(ckeys[key], vecidx)
+                ckeys[key][vecidx - 1] = i
+            else:   # if it is not, define a vector
+                ckeys[key] = np.array([0] * vecidx)
+                ckeys[key][-1] = i
+    return ckeys
+
+
 def file_length(filename):
     i = -1
     with open(filename) as f:
@@ -70,6 +107,40 @@ def get_natoms(filename):
     return natoms
 
 
+def build_dump_index(filename):
+    """
+    Scan a LAMMPS dump file and return its index, i.e. a dictionary with:
+      timesteps  ->  the list of the timesteps of the file
+      offsets    ->  the byte offset of the 'ITEM: TIMESTEP' line of each timestep
+    The file is read in large chunks and only the 'ITEM: TIMESTEP' lines are searched, the atoms data are never parsed.
+    """
+    timesteps = []
+    offsets = []
+    with open_binary(filename) as f:
+        offset = 0   # offset of buf
+        buf = b''
+        for chunk in read_line_chunks(f):
+            buf += chunk
+            pos = buf.find(_TIMESTEP_ITEM)
+            while (pos >= 0):
+                end = pos + len(_TIMESTEP_ITEM)
+                if (pos == 0) or (buf[pos - 1:pos] == b'\n'):   # the item must be a whole line
+                    eol = buf.find(b'\n', end)
+                    if (eol < 0):   # the timestep line is in the next chunk
+                        break
+                    timesteps.append(int(buf[end:eol]))
+                    offsets.append(offset + pos)
+                    end = eol
+                pos = buf.find(_TIMESTEP_ITEM, end)
+            keep = pos if (pos >= 0) else len(buf)   # keep the last item, if incomplete
+            offset += keep
+            buf = buf[keep:]
+        if (len(buf) > len(_TIMESTEP_ITEM)) and buf.startswith(_TIMESTEP_ITEM):   # last line without newline
+            timesteps.append(int(buf[len(_TIMESTEP_ITEM):]))
+            offsets.append(offset)
+    return {'timesteps': timesteps, 'offsets': offsets}
+
+
 class LAMMPS_Dump(object):
     """
     A LAMMPS_Dump file that can be read in blocks.
@@ -80,8 +151,20 @@ class LAMMPS_Dump(object):
       traj.read_timesteps((10,30))      -->>  Read from TIMESTEP 10 to 30
       traj.read_timesteps((10,30,2))    -->>  Read every 2 steps from TIMESTEP 10 to 30
       print(traj.data)
+
+    The first time a file is preloaded, the byte offset of each timestep is saved in an index next to it
+    ('<filename>.tcindex', see fileindex.py), so that any timestep can be reached directly. The following times the
+    list of timesteps is taken from the index, also if preload=False. Use index=False to disable it.
+
+    The atom lines of each timestep are read as a single chunk and converted with NumPy. The string columns (e.g.
+    element) are stored as categorical data: data[istep]['element'] contains integer codes, that are the indexes of
+    the labels in the categories['element'] list (the same for all the timesteps). Use decode('element', codes) to
+    get the labels back.
     """
 
+    _INDEX_KIND = 'lammps_dump'
+    _build_index = staticmethod(build_dump_index)
+
     def __init__(self, *args, **kwargs):
         #*******
         if (len(args) > 0):
@@ -94,6 +177,7 @@ class LAMMPS_Dump(object):
             raise ValueError('No file given.')
         group_vectors = kwargs.get('group_vectors', True)
         preload_timesteps = kwargs.get('preload', True)
+        use_index = kwargs.get('index', True)
         self._quiet = kwargs.get('quiet', False)
         self._GUI = kwargs.get('GUI', False)
         if self._GUI:
@@ -101,7 +185,12 @@ class LAMMPS_Dump(object):
             from IPython.display import display
             global FloatProgress, display
 
+        self.categories = {}   # labels of the categorical (string) columns
+        self._category_codes = {}   # code of each label
         self._open_file()
+        self._load_index(use_index, preload_timesteps)
+        if self.index is not None:
+            preload_timesteps = True   # the list of timesteps is known
         self._read_ckeys(group_vectors, preload_timesteps)
         self.ckey = None
         #self.MAX_NSTEPS = data_length(self.filename)
@@ -126,13 +215,32 @@ class LAMMPS_Dump(object):
         return msg
 
     def _open_file(self):
-        """Open the file."""
+        """Open the file (gzip, bzip2 and xz compressed files are decompressed while reading)."""
         try:
-            self.file = open(self.filename, 'r')
+            self.file = open_text(self.filename)
         except:
             raise ValueError('File does not exist.')
         return
 
+    def _load_index(self, use_index=True, build=True):
+        """
+        Load the timesteps index of the file. If it does not exist or is out of date, build it only if build=True.
+        The byte offsets of the timesteps are stored in the _timestep_offsets dictionary. Without a (complete) index,
+        this dictionary is filled with the timesteps found while reading the file.
+        """
+        self.index = None
+        self._timestep_offsets = {}
+        if not use_index:
+            return
+        self.index = load_index(self.filename, self._INDEX_KIND)
+        if (self.index is None) and build:
+            log.write_log('  Indexing {}...'.format(self.filename))
+            self.index = self._build_index(self.filename)
+            save_index(self.filename, self._INDEX_KIND, self.index)
+        if self.index is not None:
+            self._timestep_offsets = dict(zip(self.index['timesteps'], self.index['offsets']))
+        return
+
     def _read_ckeys(self, group_vectors=True, preload_timesteps=True):
         """Read the column keys. If group_vectors=True the vector ckeys are grouped togheter"""
         self._start_byte = self.file.tell()
@@ -146,7 +254,9 @@ class LAMMPS_Dump(object):
             values = np.array(line.split())
             if (values[0] == 'ITEM:'):
                 if (values[1] == 'TIMESTEP'):
+                    offset = self.file.tell() - len(line)
                     self.current_timestep = int(self.file.readline())
+                    self._timestep_offsets.setdefault(self.current_timestep, offset)
                     self.FIRST_TIMESTEP = self.current_timestep
                     self.all_timesteps.append(self.current_timestep)
                 # facoltativo:
@@ -159,28 +269,11 @@ class LAMMPS_Dump(object):
                     zbox = self.file.readline().split()
                     self.BOX_BOUNDS = np.array([xbox, ybox, zbox], dtype='float')
                 elif (values[1] == 'ATOMS'):
-                    for i in range(2, len(values)):
-                        if group_vectors:
-                            bracket = is_vector_variable(values[i])   # get position of left square bracket
-                        else:
-                            bracket = 0
-                        if (bracket == 0):   # the variable is a scalar
-                            key = values[i]
-                            if (key[:2] == 'c_'):   # remove 'c_' if present
-                                key = key[2:]
-                            self.all_ckeys[key] = [i - 2]   # -2 offset
-                        else:   # the variable is a vector
-                            key = values[i][:bracket]   # name of vector
-                            if (key[:2] == 'c_'):   # remove 'c_' if present
-                                key = key[2:]
-                            vecidx = int(values[i][bracket + 1:-1])   # current index
-                            if key in self.all_ckeys:   # if this vector is already defined, add this component
-                                if (vecidx > self.all_ckeys[key].size):
-                                    self.ckeys[key] = np.resize(self.all_ckeys[key], vecidx)
-                                self.all_ckeys[key][vecidx - 1] = i - 2   # -2 offset!
-                            else:   # if it is not, define a vector
-                                self.all_ckeys[key] = np.array([0] * vecidx)
-                                self.all_ckeys[key][-1] = i - 2   # -2 offset!
+                    self.NALLCKEYS = len(values) - 2
+                    self.all_ckeys = columns_ckeys(values[2:], group_vectors)
+                    # find the string columns from the first atom line
+                    values = self.file.readline().split()
+                    self._string_columns = [i for i in range(len(values)) if is_string(values[i])]
                     #self._start_byte = self.file.tell()
                     break
             #else:
@@ -188,12 +281,16 @@ class LAMMPS_Dump(object):
 
         if self.preload_timesteps:
             # get the list of time steps
-            while True:
+            if self.index is not None:
+                self.all_timesteps = list(self.index['timesteps'])
+            while (self.index is None):
                 line = self.file.readline()
                 if len(line) == 0:   # EOF
                     break
-                if (line == 'ITEM: TIMESTEP\n'):
+                if (line == 'ITEM: TIMESTEP\n'):   # (the offsets are recorded for random access)
+                    offset = self.file.tell() - len(line)
                     self.current_timestep = int(self.file.readline())
+                    self._timestep_offsets.setdefault(self.current_timestep, offset)
                     self.all_timesteps.append(self.current_timestep)
 
             self.LAST_TIMESTEP = self.all_timesteps[-1]
@@ -207,8 +304,10 @@ class LAMMPS_Dump(object):
                 line = self.file.readline()
                 if len(line) == 0:   # EOF
                     break
-                if (line == 'ITEM: TIMESTEP\n'):
+                if (line == 'ITEM: TIMESTEP\n'):   # (the offsets are recorded for random access)
+                    offset = self.file.tell() - len(line)
                     self.current_timestep = int(self.file.readline())
+                    self._timestep_offsets.setdefault(self.current_timestep, offset)
                     self.all_timesteps.append(self.current_timestep)
 
             self.LAST_TIMESTEP = None
@@ -310,15 +409,39 @@ class LAMMPS_Dump(object):
             raise ValueError('ckey not set.')
         if self.timestep is None:
             raise ValueError('timestep not set.')
-        self.data = [dict() for i in range(self.nsteps)]
-        for istep in range(self.nsteps):
-            for key, idx in self.ckey.items():
-                if (key == 'element'):   # this should be improved
-                    self.data[istep][key] = np.zeros((self.NATOMS, len(idx)), dtype='S8')
-                else:
-                    self.data[istep][key] = np.zeros((self.NATOMS, len(idx)), dtype='float64')
+        self.data = [self._new_frame() for i in range(self.nsteps)]
         return
 
+    def _new_frame(self):
+        """Return a dictionary with the arrays of the selected ckeys of one timestep."""
+        frame = {}
+        for key, idx in self.ckey.items():
+            if self._is_categorical(key):
+                frame[key] = np.zeros((self.NATOMS, len(idx)), dtype=CATEGORY_DTYPE)
+            else:
+                frame[key] = np.zeros((self.NATOMS, len(idx)), dtype='float64')
+        return frame
+
+    def _is_categorical(self, key):
+        """Return True if the columns of key contain strings."""
+        return all((i in self._string_columns) for i in self.all_ckeys[key])
+
+    def _encode(self, key, labels):
+        """Return the codes of an array of labels (byte strings) of key, adding the new ones to its categories."""
+        unique, inverse = np.unique(labels, return_inverse=True)
+        categories = self.categories.setdefault(key, [])
+        codes = self._category_codes.setdefault(key, {})
+        for label in unique:
+            if label not in codes:
+                codes[label] = len(categories)
+                categories.append(label.decode())
+        return np.array([codes[label] for label in unique], dtype=CATEGORY_DTYPE)[inverse].reshape(labels.shape)
+
+    def decode(self, key, codes):
+        """Return the labels (strings) of the codes of a categorical column.
+        Example:  decode('element', data[0]['element'])"""
+        return np.array(self.categories[key])[codes]
+
     def _gototimestep(self, start_step, fast_check=True):
         """
         Go to the start_step-th line in the time series (assumes step=1).
@@ -329,21 +452,42 @@ class LAMMPS_Dump(object):
                                 If the the start_step is passed and not found then stop.
         """
         if (start_step >= 0):
-            if (start_step <= self.current_timestep):
-                # or (self.current_timestep == -1):  # if start_step is before/equal the current step
-                self.file.seek(self._start_byte)   #  --> start over
             if (start_step == 0):   # or (self.current_timestep == -1):
                 goto_step = self.FIRST_TIMESTEP
             else:
                 goto_step = start_step
 
-            # search until start_step is found     ***** MAY BE IMPROVED KNOWING THE N OF LINES TO SKIP ******
+            offset = self._timestep_offsets.get(goto_step, None)
+            if offset is not None:   # jump directly to the timestep
+                self.file.seek(offset)
+                self.file.readline()
+                self.current_timestep = int(self.file.readline())
+                while (self.file.readline().find('ITEM: ATOMS') < 0):   # jump to the data part
+                    pass
+                return
+            if self.index is not None:   # the index contains all the timesteps
+                if (not fast_check) or (goto_step > self.index['timesteps'][-1]):
+                    raise EOFError('Warning (gototimestep):  reached EOF. Timestep {} NOT FOUND.'.format(goto_step))
+                raise Warning('Warning (gototimestep):  Timestep {} NOT FOUND in the index.'.format(goto_step))
+
+            if (start_step <= self.current_timestep):
+                # or (self.current_timestep == -1):  # if start_step is before/equal the current step
+                # --> start over from the closest timestep already found
+                previous = [step for step in self._timestep_offsets if (step < goto_step)]
+                if previous:
+                    self.file.seek(self._timestep_offsets[max(previous)])
+                else:
+                    self.file.seek(self._start_byte)
+
+            # search until start_step is found
             while True:
                 line = self.file.readline()
                 if len(line) == 0:   # EOF
                     raise EOFError('Warning (gototimestep):  reached EOF. Timestep {} NOT FOUND.'.format(goto_step))
                 if (line == 'ITEM: TIMESTEP\n'):
+                    offset = self.file.tell() - len(line)
                     self.current_timestep = int(self.file.readline())
+                    self._timestep_offsets[self.current_timestep] = offset
                     if (self.current_timestep == goto_step):
                         while (self.file.readline().find('ITEM: ATOMS') < 0):   # jump to the data part
                             pass
@@ -370,6 +514,64 @@ class LAMMPS_Dump(object):
         self._gototimestep(start_step, fast_check)
         return
 
+    def _prepare_frames(self):
+        """Prepare the conversion of the selected columns of the atom lines, before reading the timesteps."""
+        atomid_col = self.all_ckeys['id'][0]
+        string_keys = [key for key in self.ckey if self._is_categorical(key)]
+        number_keys = [key for key in self.ckey if key not in string_keys]
+        columns = np.unique(np.concatenate([[atomid_col]] + [self.ckey[key] for key in number_keys]).astype(int))
+        if (not self._string_columns) and (columns.size > PROJECT_FRACTION * self.NALLCKEYS):
+            columns = np.arange(self.NALLCKEYS)   # convert all the columns
+            projected = None
+        else:   # convert only the numerical columns needed
+            projected = columns
+        self._frame_plan = {
+            'string_keys': string_keys,
+            'projected': projected,
+            'local_ckey': {key: np.searchsorted(columns, self.ckey[key]) for key in number_keys},
+            'atomid': np.searchsorted(columns, atomid_col)
+        }
+        return
+
+    def _read_frame(self, frame, step):
+        """Read the atom lines of the current timestep as a single chunk, and store them in the frame dictionary."""
+        plan = self._frame_plan
+        f = self.file.buffer
+        f.seek(self.file.tell())
+        buf = read_lines(f, self.NATOMS)
+        self.file.seek(f.tell())
+        values, nbytes, malformed = parse_block(buf, self.NALLCKEYS, columns=plan['projected'])
+        if (values.shape[0] < self.NATOMS):
+            if malformed:
+                raise ValueError('Malformed line found in timestep {}.'.format(step))
+            raise EOFError('Warning:  reached EOF.')
+        atomid = values[:, plan['atomid']].astype(int) - 1   # atom indexes (in LAMMPS they start from 1)
+        for key, idx in plan['local_ckey'].items():   # save the selected columns
+            frame[key][atomid, :] = values[:, idx]
+        for key in plan['string_keys']:
+            frame[key][atomid, :] = self._encode(key, parse_strings(buf, self.NALLCKEYS, self.ckey[key]))
+        return
+
+    def iter_timesteps(self, selection, start_step=-1, select_ckeys=None, fast_check=True):
+        """
+        Iterate over the selected timesteps (same arguments of read_timesteps) without storing them: a single frame
+        dictionary is allocated, and it is overwritten at every step. Copy its arrays if they must be kept.
+        Example:
+            for frame in traj.iter_timesteps((0, 1000), select_ckeys=['id', 'vx']):
+                print(frame['TIMESTEP'], frame['vx'].sum())
+        """
+        self._set_ckey(select_ckeys)   # set the ckeys to read      --> ckey
+        self._set_timesteps(selection, start_step)   # set the timesteps to read  --> timestep
+        frame = self._new_frame()
+        self._prepare_frames()
+        for step in self.timestep:
+            self._gototimestep(step, fast_check)   # jump to the desired step,
+            frame['TIMESTEP'] = step
+            self._read_frame(frame, step)
+            self._compute_current_step = False   # next time do not compute the current_step
+            yield frame
+        return
+
     def read_timesteps(self, selection, start_step=-1, select_ckeys=None, fast_check=True):
         """
         Read selected keys of file, within the provided range.
@@ -389,21 +591,11 @@ class LAMMPS_Dump(object):
 
         # extract the steps from the file
         progbar_step = max(1000, int(0.005 * self.nsteps))
-        atomid_col = self.all_ckeys['id'][0]
+        self._prepare_frames()
         for istep, step in enumerate(self.timestep):
             self._gototimestep(step, fast_check)   # jump to the desired step,
             self.data[istep]['TIMESTEP'] = step
-            for nat in range(self.NATOMS):   # read data (may be unsorted)
-                line = self.file.readline()
-                if len(line) == 0:   # EOF
-                    raise EOFError('Warning:  reached EOF.')
-                values = np.array(line.split())
-                for key, idx in self.ckey.items():   # save the selected columns
-                    atomid = int(values[atomid_col]) - 1   # current atom index (in LAMMPS it starts from 1)
-                    if (key == 'element'):   # this should be improved
-                        self.data[istep][key][atomid, :] = np.array(list(map(str, values[idx])))
-                    else:
-                        self.data[istep][key][atomid, :] = np.array(list(map(float, values[idx])))
+            self._read_frame(self.data[istep], step)
             if ((istep + 1) % progbar_step == 0):
                 if self._GUI:
                     progbar.value = float(istep + 1) / self.nsteps * 100.
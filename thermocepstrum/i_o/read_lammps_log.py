@@ -46,11 +46,23 @@
 ###     save_hc_npz(data, ['flux'], 'lammps.data', 'flux.npz')
 ################################################################################
 
+import os
+import re
 import numpy as np
-from time import time
+from time import time, sleep
 from thermocepstrum.utils.utils import PrintMethod
+from .compressed import open_text, open_binary
+from .chunkparse import read_chunked, read_growing, read_parallel, iter_chunked, skip_lines, read_line_chunks, line_ends
+from .chunkparse import parse_block, projection, accumulated_ckey
+from .compressed import is_compressed
+from .dictfile import save_dict
+from .fileindex import load_index, save_index, find_bytes, count_file_lines
+from .ingestcache import cache_dirname, load_cached, save_cached, cacheable_accumulators
 log = PrintMethod()
 
+CHECKPOINT_LINES = 10000   # number of lines between two checkpoints of the log index
+_HEADER_REGEX = re.compile(br'^[ \t]*Step(?=\s)', re.MULTILINE)   # column headers line of a thermo output block
+
 
 def is_string(string):
     try:
@@ -85,6 +97,46 @@ def data_length(filename):
     return i
 
 
+def build_log_index(filename):
+    """
+    Scan a LAMMPS log file and return its index, i.e. a dictionary with:
+      nlines            ->  the number of lines of the file
+      runs              ->  a list of the column headers lines ('Step ...') of each thermo output block, as
+                            dictionaries containing the line number, its byte offset and the header itself
+      checkpoint_lines  ->  the interval of lines between two checkpoints
+      checkpoints       ->  the byte offset of every checkpoint_lines-th line (line 0, CHECKPOINT_LINES, ...)
+      keywords          ->  a dictionary of the run_keywords already searched, with the number of the run they select
+    """
+    nlines = 0
+    offset = 0
+    runs = []
+    checkpoints = []
+    with open_binary(filename) as f:
+        for buf in read_line_chunks(f):
+            ends = line_ends(buf)
+            nl = ends.size + int(buf[-1:] != b'\n')   # number of lines in this chunk
+            starts = np.concatenate(([0], ends + 1))[:nl]   # byte position of each line in this chunk
+            icheck = np.arange((-nlines) % CHECKPOINT_LINES, nl, CHECKPOINT_LINES)
+            checkpoints.extend((offset + starts[icheck]).tolist())
+            for match in _HEADER_REGEX.finditer(buf):
+                iline = np.searchsorted(ends, match.start())
+                eol = ends[iline] if (iline < ends.size) else len(buf)
+                runs.append({
+                    'line': int(nlines + iline),
+                    'offset': int(offset + starts[iline]),
+                    'header': buf[starts[iline]:eol].decode().strip()
+                })
+            nlines += nl
+            offset += len(buf)
+    return {
+        'nlines': nlines,
+        'runs': runs,
+        'checkpoint_lines': CHECKPOINT_LINES,
+        'checkpoints': checkpoints,
+        'keywords': {}
+    }
+
+
 class LAMMPSLogFile(object):
     """
   A package that reads a LAMMPS Log file and organizes it into a dictionary according to the column headers.
@@ -101,6 +153,17 @@ class LAMMPSLogFile(object):
   If a start_step is not specified the file is read from the current position.
   This allows one to read the file in blocks.
 
+  The first time a file is opened, an index of its thermo output blocks and of the byte offsets of its lines is
+  saved next to it ('<filename>.tcindex', see fileindex.py). The following times the index is used to jump directly
+  to the selected run and start_step. Use index=False to disable it.
+
+  If cache=True (or the path of a directory) is passed, the data read with a given start_step are saved in a binary
+  cache (see ingestcache.py), and the following reads of the same data are memory-mapped from there (the arrays are
+  then read-only).
+
+  The log of a simulation that is still running can be followed (see follow, poll, iter_poll): at each poll only the
+  complete lines appended since the previous one are read, and they are appended to the data arrays.
+
 #############################################################################
   Example of LAMMPS Log file:
 
@@ -145,6 +208,8 @@ class LAMMPSLogFile(object):
         self.run_keyword = kwargs.get('run_keyword', None)
         self.endrun_keyword = kwargs.get('endrun_keyword', 'Loop time')
         group_vectors = kwargs.get('group_vectors', True)
+        use_index = kwargs.get('index', True)
+        self._cache_dir = cache_dirname(kwargs.get('cache', None))
         self._GUI = kwargs.get('GUI', False)
         if self.run_keyword is None:
             raise ValueError('Please specify run_keyword.')
@@ -154,7 +219,7 @@ class LAMMPSLogFile(object):
             global FloatProgress, display
 
         self._open_file()
-        self.MAX_NSTEPS = file_length(self.filename)
+        self._load_index(use_index)
         self._read_ckeys(self.run_keyword, group_vectors)
         self.ckey = None
         return
@@ -170,26 +235,66 @@ class LAMMPSLogFile(object):
         return msg
 
     def _open_file(self):
-        """Open the file."""
+        """Open the file (gzip, bzip2 and xz compressed files are decompressed while reading)."""
         try:
-            self.file = open(self.filename, 'r')
+            self.file = open_text(self.filename)
         except:
             raise ValueError('File does not exist.')
         return
 
+    @property
+    def MAX_NSTEPS(self):
+        """The number of lines of the file after the column headers. It is counted the first time it is needed."""
+        if self._MAX_NSTEPS is None:
+            self._MAX_NSTEPS = count_file_lines(self.filename, self._start_byte)
+        return self._MAX_NSTEPS
+
+    def _load_index(self, use_index=True):
+        """Load the index of the file, or build it if it does not exist or is out of date."""
+        self.index = None
+        if not use_index:
+            return
+        self.index = load_index(self.filename, 'lammps_log')
+        if self.index is None:
+            log.write_log('  Indexing {}...'.format(self.filename))
+            self.index = build_log_index(self.filename)
+            save_index(self.filename, 'lammps_log', self.index)
+        return
+
+    def _find_run(self, run_keyword):
+        """Return the number of the indexed run that follows the first occurrence of 'run_keyword'."""
+        keywords = self.index['keywords']
+        if run_keyword not in keywords:
+            pos = find_bytes(self.filename, run_keyword.encode())
+            if (pos < 0):
+                raise RuntimeError('Reached EOF, run_keyword was not found!')
+            # the column headers are searched from the line after the one containing run_keyword
+            following = [irun for irun, run in enumerate(self.index['runs']) if (run['offset'] > pos)]
+            if not following:
+                raise RuntimeError('Reached EOF, no ckeys found.')
+            keywords[run_keyword] = following[0]
+            save_index(self.filename, 'lammps_log', self.index)
+        return keywords[run_keyword]
+
     def _read_ckeys(self, run_keyword, group_vectors=True):
         """Seek the line containing 'run_keyword'. Read the column keys. If group_vectors=True the vector ckeys are grouped togheter."""
         self.all_ckeys = {}
         nlines = 0
-        while True:
-            line = self.file.readline()
-            nlines += 1
-            if len(line) == 0:   # EOF
-                raise RuntimeError('Reached EOF, run_keyword was not found!')
-            # check if run_keyword string is found
-            if run_keyword in line:
-                log.write_log('  run_keyword found at line {:d}.'.format(nlines))
-                break
+        if self.index is not None:   # jump to the column headers line
+            irun = self._find_run(run_keyword)
+            log.write_log('  run_keyword found (run {:d} of the index).'.format(irun))
+            self.file.seek(self.index['runs'][irun]['offset'])
+            nlines = self.index['runs'][irun]['line']
+        else:
+            while True:
+                line = self.file.readline()
+                nlines += 1
+                if len(line) == 0:   # EOF
+                    raise RuntimeError('Reached EOF, run_keyword was not found!')
+                # check if run_keyword string is found
+                if run_keyword in line:
+                    log.write_log('  run_keyword found at line {:d}.'.format(nlines))
+                    break
         while True:
             line = self.file.readline()
             nlines += 1
@@ -222,7 +327,11 @@ class LAMMPSLogFile(object):
                             self.all_ckeys[key] = np.array([0] * vecidx)
                             self.all_ckeys[key][-1] = i
                 self._start_byte = self.file.tell()
-                self.MAX_NSTEPS -= nlines
+                self._start_line = nlines   # number of the first data line (counting from 0)
+                if self.index is not None:
+                    self._MAX_NSTEPS = self.index['nlines'] - nlines
+                else:
+                    self._MAX_NSTEPS = None   # counted only when needed
                 break
         self.NALLCKEYS = np.concatenate(list(self.all_ckeys.values())).size
         log.write_log(' #####################################')
@@ -250,7 +359,7 @@ class LAMMPSLogFile(object):
             log.write_log('  ckey = ', self.ckey)
         return
 
-    def _initialize_dic(self, NSTEPS=None):
+    def _initialize_dic(self, NSTEPS=None, dtype=float):
         """Initialize the data dictionary once the ckeys have been set."""
         if self.ckey is None:
             raise ValueError('ckey not set.')
@@ -262,7 +371,29 @@ class LAMMPSLogFile(object):
         self.NSTEPS = 0
         self.data = {}
         for key, idx in self.ckey.items():
-            self.data[key] = np.zeros((NSTEPS, len(idx)))
+            self.data[key] = np.zeros((NSTEPS, len(idx)), dtype=dtype)
+        return
+
+    def _load_cache(self, params, accumulators=None):
+        """Load the data read with the given parameters (and the state of the accumulators) from the cache.
+        Returns True if found."""
+        cached = load_cached(self.filename, params, self._cache_dir)
+        if cached is None:
+            return False
+        self.data, meta = cached
+        for key, accumulator in (accumulators or {}).items():
+            accumulator.set_state(meta['accumulators'][key])
+        self.NSTEPS = meta['NSTEPS']
+        self.file.seek(meta['end_pos'])   # as if the data were read from file
+        log.write_log('  ( %d ) steps loaded from cache.' % (self.NSTEPS))
+        return True
+
+    def _save_cache(self, params, accumulators=None):
+        """Save the data just read with the given parameters (and the state of the accumulators) into the cache."""
+        meta = {'NSTEPS': self.NSTEPS, 'end_pos': self.file.tell()}
+        if accumulators:
+            meta['accumulators'] = {key: accumulator.state() for key, accumulator in accumulators.items()}
+        save_cached(self.filename, params, self.data, meta, self._cache_dir)
         return
 
     def gotostep(self, start_step):
@@ -274,74 +405,139 @@ class LAMMPSLogFile(object):
         """
         if (start_step >= 0):
             self.file.seek(self._start_byte)
-            for i in range(start_step):   # advance of start_step-1 lines
-                self.file.readline()
+            if (start_step > 0):   # advance of start_step lines
+                if self.index is not None:   # start from the closest checkpoint
+                    line = self._start_line + start_step
+                    icheck = min(line // self.index['checkpoint_lines'], len(self.index['checkpoints']) - 1)
+                    if (icheck * self.index['checkpoint_lines'] > self._start_line):
+                        self.file.buffer.seek(self.index['checkpoints'][icheck])
+                        skip_lines(self.file.buffer, line - icheck * self.index['checkpoint_lines'])
+                        self.file.seek(self.file.buffer.tell())
+                        return
+                self.file.buffer.seek(self._start_byte)
+                skip_lines(self.file.buffer, start_step)
+                self.file.seek(self.file.buffer.tell())
         return
 
-    def read_datalines(self, NSTEPS=0, start_step=-1, select_ckeys=None, max_vector_dim=None, even_NSTEPS=True):
+    def read_datalines(self, NSTEPS=0, start_step=-1, select_ckeys=None, max_vector_dim=None, even_NSTEPS=True,
+                       engine='numpy', workers=1, dtype=float, accumulators=None):
         """
         Read NSTEPS steps of file, starting from start_step, and store only the selected ckeys.
 
         INPUT:
-          NSTEPS         -> number of steps to read (default: 0 -> reads all the file)
+          NSTEPS         -> number of steps to read (default: 0 -> reads all the run; with the numpy engine and
+                            workers=1 this is done in a single pass, without counting the lines of the file first)
           start_step  = -1 -> continue from current step (default)
                          0 -> go to start step
                          N -> go to N-th step
           select_ckeys   -> an array with the column keys you want to read (see all_ckeys for a list)
           max_vector_dim -> when reading vectors read only this number of components (None = read all components)
           even_NSTEPS    -> round the number of steps to an even number (default: True)
+          engine         -> 'numpy'  read large chunks of lines and convert them with NumPy (default)
+                            'python' read and convert one line at a time
+          workers        -> number of processes that parse the file in parallel (numpy engine only, default: 1)
+          dtype          -> type of the data arrays (default: float; np.float32 halves the memory, keeping ~7
+                            significant digits: the values are parsed in double precision and then rounded)
+          accumulators   -> dictionary {key: accumulator} of columns whose statistics are accumulated while reading
+                            (e.g. {'Temp': md.tools.BlockingAccumulator()}): each accumulator receives the values of
+                            its column chunk by chunk (also the step dropped by even_NSTEPS). These columns are not
+                            stored, unless they are also selected (default: None)
 
         OUTPUT:
           data    ->  a dictionary with the selected-column steps
+
+        If the cache is used and start_step >= 0, the data are loaded from the cache if they were already read (the
+        accumulators, if given, must be empty: their state is restored from the cache too).
         """
         if self._GUI:
             progbar = FloatProgress(min=0, max=100)
             display(progbar)
         start_time = time()
-        if (NSTEPS == 0):
-            NSTEPS = self.MAX_NSTEPS
+        read_all = (NSTEPS == 0)
+        if read_all and ((engine != 'numpy') or (workers > 1)):
+            NSTEPS = self.MAX_NSTEPS   # the number of steps to allocate is needed
         self._set_ckey(select_ckeys, max_vector_dim)   # set the ckeys to read
-        self._initialize_dic(NSTEPS)   # allocate dictionary
+        read_ckey = accumulated_ckey(self.ckey, self.all_ckeys, accumulators, max_vector_dim)
+        cache_params = None
+        if (self._cache_dir is not None) and (start_step >= 0) and cacheable_accumulators(accumulators):
+            cache_params = {'reader': 'LAMMPSLogFile', 'run_keyword': self.run_keyword,
+                            'endrun_keyword': self.endrun_keyword, 'ckey': self.ckey, 'start_step': start_step,
+                            'NSTEPS': NSTEPS, 'even_NSTEPS': even_NSTEPS, 'dtype': np.dtype(dtype).name,
+                            'accumulated': {key: read_ckey[key] for key in (accumulators or {})}}
+            if self._load_cache(cache_params, accumulators):
+                log.write_log('DONE.  Elapsed time: ', time() - start_time, 'seconds')
+                return self.data
+        self._initialize_dic(NSTEPS, dtype)   # allocate dictionary
         self.gotostep(start_step)   # jump to the starting step
 
         # read NSTEPS of the file
         progbar_step = max(100000, int(0.005 * NSTEPS))
-        for step in range(NSTEPS):
-            line = self.file.readline()
-            if (len(line) == 0):   # EOF
-                log.write_log('Warning:  reached EOF.')
-                break
-            if self.endrun_keyword in line:   # end-of-run keyword
+        last_progress = [0]
+
+        def progress(step, total=NSTEPS):
+            if (step // progbar_step == last_progress[0] // progbar_step):
+                return
+            last_progress[0] = step
+            if self._GUI:
+                progbar.value = float(step) / total * 100.
+                progbar.description = '{:6.2f}%'.format(progbar.value)
+            else:
+                log.write_log('    step = {:9d} - {:6.2f}% completed'.format(step, float(step) / total * 100.))
+
+        if (engine == 'numpy'):
+            if (NSTEPS == 0):   # single pass, without counting the lines of the file
+                nread, stop = read_growing(self.file, self.NALLCKEYS, self.data, read_ckey, self.endrun_keyword,
+                                           progress, accumulators=accumulators)
+            elif (workers > 1):
+                nread, stop = read_parallel(self.file, NSTEPS, self.NALLCKEYS, self.data, read_ckey,
+                                            self.endrun_keyword, progress, workers, accumulators)
+            else:
+                nread, stop = read_chunked(self.file, NSTEPS, self.NALLCKEYS, self.data, read_ckey,
+                                           self.endrun_keyword, progress, accumulators=accumulators)
+            if (stop == 'endrun'):
                 log.write_log('  endrun_keyword found.')
-                step -= 1
-                break
-            values = np.array(line.split())
-            if (values.size != self.NALLCKEYS):
+            elif (stop == 'malformed'):
                 log.write_log('Warning:  line with wrong number of columns found. Stopping here...')
-                log.write_log(line)
-                break
-            for key, idx in self.ckey.items():   # save the selected columns
-                self.data[key][step, :] = np.array(list(map(float, values[idx])))
-            if ((step + 1) % progbar_step == 0):
-                if self._GUI:
-                    progbar.value = float(step + 1) / NSTEPS * 100.
-                    progbar.description = '{:6.2f}%'.format(progbar.value)
-                else:
-                    log.write_log('    step = {:9d} - {:6.2f}% completed'.format(step + 1,
-                                                                                 float(step + 1) / NSTEPS * 100.))
+        elif (engine == 'python'):
+            if (workers > 1):
+                raise ValueError('Parallel reading is available only with the numpy engine.')
+            nread = 0
+            for step in range(NSTEPS):
+                line = self.file.readline()
+                if (len(line) == 0):   # EOF
+                    log.write_log('Warning:  reached EOF.')
+                    break
+                if self.endrun_keyword in line:   # end-of-run keyword
+                    log.write_log('  endrun_keyword found.')
+                    break
+                values = line.split()
+                if (len(values) != self.NALLCKEYS):
+                    log.write_log('Warning:  line with wrong number of columns found. Stopping here...')
+                    log.write_log(line)
+                    break
+                for key, idx in self.ckey.items():   # save the selected columns
+                    self.data[key][step, :] = [float(values[i]) for i in idx]
+                for key, accumulator in (accumulators or {}).items():
+                    accumulator.add(np.array([[float(values[i]) for i in read_ckey[key]]]))
+                nread = step + 1
+                progress(nread)
+        else:
+            raise ValueError('Parse engine not valid.')
 
         if self._GUI:
             progbar.close()
         # check number of steps read, keep an even number of steps
-        if (step + 1 < NSTEPS):
-            if (step == 0):
+        if (nread < NSTEPS) or (nread == 0):
+            if (nread == 0):
                 log.write_log('WARNING:  no step read.')
                 return
             else:
-                if (NSTEPS != self.MAX_NSTEPS):   # if NSTEPS was specified
+                if not read_all:   # if NSTEPS was specified
                     log.write_log('Warning:  less steps read.')
-                NSTEPS = step + 1   # the correct number of read steps
+                NSTEPS = nread   # the correct number of read steps
         # even the number of steps
+        if read_all:
+            NSTEPS = nread
         if even_NSTEPS:
             if (NSTEPS % 2 == 1):
                 NSTEPS = NSTEPS - 1
@@ -350,14 +546,141 @@ class LAMMPSLogFile(object):
             self.data[key] = self.data[key][:NSTEPS, :]
         log.write_log('  ( %d ) steps read.' % (NSTEPS))
         self.NSTEPS = NSTEPS
+        if cache_params is not None:
+            self._save_cache(cache_params, accumulators)
         log.write_log('DONE.  Elapsed time: ', time() - start_time, 'seconds')
         return self.data
 
+    def follow(self, select_ckeys=None, start_step=0, max_vector_dim=None, dtype=float):
+        """
+        Start following the file while it is being written (e.g. the log of a running simulation).
+        The data already present from start_step are read immediately, then each call to poll (or iter_poll) reads
+        only the complete lines appended since the previous call, and appends them to the arrays of the data
+        dictionary. The reading stops at the endrun_keyword (or at a malformed line), as read_datalines does.
+        The number of steps is not rounded to an even number. Use index=False for a file that is still growing.
+
+        INPUT:
+          start_step     -> 0 (default), N or -1, see read_datalines
+          select_ckeys, max_vector_dim, dtype  -> see read_datalines
+        OUTPUT:
+          data    ->  a dictionary with the selected-column steps read so far
+        """
+        if is_compressed(self.filename):
+            raise ValueError('A compressed file cannot be followed.')
+        self._set_ckey(select_ckeys, max_vector_dim)   # set the ckeys to read
+        self._initialize_dic(0, dtype)
+        self.gotostep(start_step)   # jump to the starting step
+        columns, local_ckey = projection(self.NALLCKEYS, self.ckey)
+        self._follow = {'pos': self.file.tell(), 'stop': False, 'columns': columns, 'local_ckey': local_ckey,
+                        'arrays': dict(self.data)}
+        self.poll()
+        log.write_log('  ( {:d} ) steps read. Following {}...'.format(self.NSTEPS, self.filename))
+        return self.data
+
+    def poll(self):
+        """
+        Read the complete lines appended to the file since the last poll (see follow), and append them to the arrays
+        of the data dictionary. Returns the number of new steps read.
+        """
+        state = getattr(self, '_follow', None)
+        if state is None:
+            raise RuntimeError('Not following the file: call follow first.')
+        if state['stop']:
+            return 0
+        f = self.file.buffer
+        size = os.fstat(f.fileno()).st_size
+        if (size < state['pos']):
+            raise RuntimeError('The file was truncated while following it.')
+        f.seek(state['pos'])
+        buf = f.read(size - state['pos'])
+        buf = buf[:buf.rfind(b'\n') + 1]   # only the complete lines
+        endrun = False
+        kpos = buf.find(self.endrun_keyword.encode())
+        if (kpos >= 0):   # keep only the lines before the one containing the keyword
+            buf = buf[:buf.rfind(b'\n', 0, kpos) + 1]
+            endrun = True
+        values, nbytes, malformed = parse_block(buf, self.NALLCKEYS, columns=state['columns'])
+        nnew = values.shape[0]
+        arrays = state['arrays']
+        capacity = next(iter(arrays.values())).shape[0]
+        if (self.NSTEPS + nnew > capacity):   # grow the arrays (at least by 50%)
+            capacity = max(self.NSTEPS + nnew, capacity + capacity // 2, 1024)
+            for key, value in arrays.items():
+                arrays[key] = np.zeros((capacity, value.shape[1]), dtype=value.dtype)
+                arrays[key][:self.NSTEPS] = value[:self.NSTEPS]
+        for key, idx in state['local_ckey'].items():   # save the selected columns
+            arrays[key][self.NSTEPS:self.NSTEPS + nnew, :] = values[:, idx]
+        self.NSTEPS += nnew
+        for key, value in arrays.items():
+            self.data[key] = value[:self.NSTEPS]
+        state['pos'] += nbytes
+        if malformed:
+            log.write_log('Warning:  line with wrong number of columns found. Stopping here...')
+            state['stop'] = 'malformed'
+        elif endrun:
+            log.write_log('  endrun_keyword found.')
+            state['stop'] = 'endrun'
+        self.file.seek(state['pos'])
+        return nnew
+
+    def iter_poll(self, interval=10., timeout=None):
+        """
+        Generator that polls the followed file (see follow) every interval seconds, and yields the data dictionary
+        each time that new steps are read. Example:
+          jfile.follow(select_ckeys=['Step', 'flux'])
+          for data in jfile.iter_poll(60.):
+              print(data['flux'].shape[0], 'steps read')
+        It returns when the reading stops (e.g. the endrun_keyword is found), or when no new step is written for
+        timeout seconds (default: None -> wait forever).
+        """
+        last_time = time()
+        while True:
+            if (self.poll() > 0):
+                last_time = time()
+                yield self.data
+            elif self._follow['stop']:
+                return
+            elif (timeout is not None) and (time() - last_time > timeout):
+                log.write_log('  No new steps for {} seconds. Stop following.'.format(timeout))
+                return
+            else:
+                sleep(interval)
+
+    def iter_blocks(self, block_steps, select_ckeys=None, start_step=-1, NSTEPS=0, max_vector_dim=None, dtype=float):
+        """
+        Generator that reads NSTEPS steps of file in blocks of block_steps steps, starting from start_step, and yields
+        each block as a dictionary with the selected-column steps (the last block may be shorter).
+        Only one block at a time is allocated, so that files larger than the memory can be processed. Example:
+          for block in jfile.iter_blocks(100000, select_ckeys=['Temp', 'flux']):
+              process(block['flux'])
+
+        INPUT:
+          block_steps    -> number of steps of each block
+          NSTEPS         -> number of steps to read (default: 0 -> reads all the file)
+          start_step, select_ckeys, max_vector_dim, dtype  -> see read_datalines
+        """
+        if (block_steps <= 0):
+            raise ValueError('block_steps must be positive.')
+        if (NSTEPS == 0):
+            NSTEPS = np.inf   # read up to the end of the data
+        self._set_ckey(select_ckeys, max_vector_dim)   # set the ckeys to read
+        self.gotostep(start_step)   # jump to the starting step
+        for block, stop in iter_chunked(self.file, block_steps, NSTEPS, self.NALLCKEYS, self.ckey, self.endrun_keyword,
+                                        dtype):
+            if (stop == 'endrun'):
+                log.write_log('  endrun_keyword found.')
+            elif (stop == 'malformed'):
+                log.write_log('Warning:  line with wrong number of columns found. Stopping here...')
+            if (len(next(iter(block.values()))) > 0):
+                yield block
+        return
+
 
 def save_hc_npz(lammpslogfile, select_ckeys, lammps_structurefilename, outfilename):
     """
      Takes a LAMMPSLogFile object, a LAMMPS structure data file (optional), takes
      the desired columns and save data into a Numpyz file.
+     The file is written without pickle and can be read lazily with load_dict (the 'dict' input format).
 
      # example to save data into a Numpyz file:
      Save_HC_npz(lammpslogfile_object, ['flux'], 'lammps.data', 'flux.npz')
@@ -404,7 +727,7 @@ def save_hc_npz(lammpslogfile, select_ckeys, lammps_structurefilename, outfilena
 
     log.write_log('These keys will be saved in file \"{:}\" :'.format(outfilename))
     log.write_log(' ', list(dic.keys()))
-    np.savez(outfilename, **dic)
+    save_dict(outfilename, dic)
     return
 
 
@@ -0,0 +1,227 @@
+################################################################################
+###
+###   ReadMultiFile
+###
+################################################################################
+###
+###  a package that reads a time series split into several files (e.g. one
+###  table or LAMMPS log file for each restart of a long simulation) as if it
+###  was a single file.
+###
+###  The files (segments) are given in chronological order. When a segment
+###  starts from a Step that is already contained in the previous one (e.g. the
+###  simulation was restarted from a restart file written before the end of
+###  the previous run), the steps of the previous segment from that Step on are
+###  dropped, so that the Step column of the concatenated series is increasing.
+###
+###  The data of all the segments are parsed directly into a single array for
+###  each key, allocated once with the final number of steps.
+###
+################################################################################
+###   example:
+###      current = MultiFile(['run1.log', 'run2.log'], 'lammps', run_keyword='PRODUCTION RUN')
+###      current.read_datalines(NSTEPS=0, start_step=0, select_ckeys=['Step', 'Temp', 'flux'])
+###      print(current.data)
+################################################################################
+
+import numpy as np
+from time import time
+from thermocepstrum.utils.utils import PrintMethod
+from .read_tablefile import TableFile
+from .read_lammps_log import LAMMPSLogFile
+from .chunkparse import read_chunked, accumulated_ckey
+from .fileindex import find_bytes, count_file_lines
+log = PrintMethod()
+
+
+class MultiFile(object):
+    """
+    A time series split into several table-style or LAMMPS log files, that can be read in blocks like a TableFile or
+    a LAMMPSLogFile.
+
+    Example:
+      current = MultiFile(['run1.dat', 'run2.dat', 'run3.dat'], 'table')
+      current.read_datalines(NSTEPS=100, select_ckeys=['Step', 'Temp', 'flux'])
+      print(current.data)
+
+    INPUT:
+      filenames    -> the list of files, in chronological order
+      file_format  -> 'table'  (TableFile, default)
+                      'lammps' (LAMMPSLogFile, a run_keyword must be given)
+      the other keyword arguments (e.g. group_vectors, run_keyword, endrun_keyword) are passed to the reader of each
+      file.
+
+    All the files must contain the same columns and a 'Step' column. The steps of each file that are not smaller than
+    the first step of the following file are dropped. The steps are counted (start_step, NSTEPS) on the concatenated
+    series.
+    """
+
+    def __init__(self, filenames, file_format='table', **kwargs):
+        if (len(filenames) == 0):
+            raise ValueError('No file given.')
+        self.filenames = list(filenames)
+        self.filename = self.filenames[0]
+        self.file_format = file_format
+        if (file_format == 'table'):
+            self.segments = [TableFile(filename, **kwargs) for filename in self.filenames]
+        elif (file_format == 'lammps'):
+            self.segments = [LAMMPSLogFile(filename, **kwargs) for filename in self.filenames]
+        else:
+            raise ValueError('File format not valid.')
+        self.all_ckeys = self.segments[0].all_ckeys
+        for segment in self.segments[1:]:
+            if (set(segment.all_ckeys) != set(self.all_ckeys)):
+                raise ValueError('The columns of {} do not match the ones of {}.'.format(
+                    segment.filename, self.filename))
+        if 'Step' not in self.all_ckeys:
+            raise KeyError('A Step column is needed to join the files.')
+        self.select_ckeys = None
+        self.ckey = None
+        self._find_overlaps()
+        self._current_step = 0
+        return
+
+    def __repr__(self):
+        msg = 'MultiFile:\n' + \
+              '  filenames:     {}\n'.format(self.filenames) + \
+              '  all_ckeys:     {}\n'.format(self.all_ckeys) + \
+              '  select_ckeys:  {}\n'.format(self.select_ckeys) + \
+              '  used ckey:     {}\n'.format(self.ckey) + \
+              '  segment steps: {}\n'.format(self.segment_nsteps) + \
+              '  current step:  {}\n'.format(self._current_step)
+        return msg
+
+    def _segment_length(self, segment):
+        """Return the number of data lines of a segment."""
+        if isinstance(segment, LAMMPSLogFile):   # the data end at the endrun_keyword
+            end = find_bytes(segment.filename, segment.endrun_keyword.encode(), segment._start_byte)
+            if (end >= 0):
+                return count_file_lines(segment.filename, segment._start_byte, end)
+        return segment.MAX_NSTEPS
+
+    def _read_steps(self, segment, start_step, NSTEPS):
+        """Read NSTEPS values of the Step column of a segment."""
+        data = {'Step': np.zeros((NSTEPS, 1))}
+        segment.gotostep(start_step)
+        nread, stop = read_chunked(segment.file, NSTEPS, segment.NALLCKEYS, data, {'Step': segment.all_ckeys['Step']},
+                                   getattr(segment, 'endrun_keyword', None))
+        return data['Step'][:nread, 0]
+
+    def _find_overlaps(self):
+        """
+        Find the number of steps of each segment that are kept, i.e. the ones preceding the first step of the following
+        segment. Only the first step of each segment and the last steps of the previous one are read.
+        """
+        lengths = [self._segment_length(segment) for segment in self.segments]
+        first_steps = [self._read_steps(segment, 0, 1) for segment in self.segments]
+        self.segment_nsteps = []
+        for i, segment in enumerate(self.segments):
+            nsteps = lengths[i]
+            if (i + 1 < len(self.segments)) and (nsteps > 0) and (first_steps[i + 1].size > 0):
+                next_step = first_steps[i + 1][0]
+                # read the last m steps, increasing m until the first one precedes next_step
+                m = 1
+                while True:
+                    m = min(m, nsteps)
+                    steps = self._read_steps(segment, nsteps - m, m)
+                    if (steps.size < m):   # the data end before the expected length (e.g. a malformed line)
+                        nsteps = nsteps - m + steps.size
+                        continue
+                    if (m == nsteps) or (steps[0] < next_step):
+                        break
+                    m *= 8
+                if (nsteps < lengths[i]):
+                    log.write_log('Warning: less steps read in {}: {:d} instead of {:d}.'.format(
+                        segment.filename, nsteps, lengths[i]))
+                nread = nsteps
+                nsteps = nsteps - m + int(np.searchsorted(steps, next_step))
+                if (nsteps < nread):
+                    log.write_log('  {}: {:d} overlapping steps dropped.'.format(segment.filename, nread - nsteps))
+            self.segment_nsteps.append(nsteps)
+        self.segment_offsets = np.concatenate(([0], np.cumsum(self.segment_nsteps))).astype(int)
+        self.MAX_NSTEPS = int(self.segment_offsets[-1])
+        log.write_log('  segments steps = ', self.segment_nsteps)
+        log.write_log('Data length = ', self.MAX_NSTEPS)
+        return
+
+    def _set_ckey(self, select_ckeys=None, max_vector_dim=None):
+        """Set the ckeys that have been selected, checking the available ones (in each segment)."""
+        if select_ckeys is not None:
+            self.select_ckeys = select_ckeys
+        for segment in self.segments:
+            segment._set_ckey(self.select_ckeys, max_vector_dim)
+        self.ckey = self.segments[0].ckey
+        return
+
+    def gotostep(self, start_step):
+        """Go to the start_step-th step of the concatenated series.
+         start_step = -1  -->  ignore, continue from current step
+                       0  -->  go to start step
+                       N  -->  go to N-th step"""
+        if (start_step >= 0):
+            self._current_step = start_step
+        return
+
+    def read_datalines(self, NSTEPS=0, start_step=-1, select_ckeys=None, max_vector_dim=None, even_NSTEPS=True,
+                       dtype=float, accumulators=None):
+        """
+        Read NSTEPS steps of the concatenated series, starting from start_step, and store only the selected ckeys.
+        Each segment is parsed directly into the final arrays.
+
+        INPUT:
+          NSTEPS         -> number of steps to read (default: 0 -> reads all the series)
+          start_step  = -1 -> continue from current step (default)
+                         0 -> go to start step
+                         N -> go to N-th step
+          select_ckeys   -> an array with the column keys you want to read (see all_ckeys for a list)
+          max_vector_dim -> when reading vectors read only this number of components (None = read all components)
+          even_NSTEPS    -> round the number of steps to an even number (default: True)
+          dtype          -> type of the data arrays (default: float, see TableFile.read_datalines)
+          accumulators   -> dictionary {key: accumulator} of columns whose statistics are accumulated while reading
+                            (see TableFile.read_datalines). The overlapping steps dropped are not accumulated.
+
+        OUTPUT:
+          data    ->  a dictionary with the selected-column steps
+        """
+        start_time = time()
+        self.gotostep(start_step)
+        first = self._current_step
+        if (NSTEPS == 0) or (first + NSTEPS > self.MAX_NSTEPS):
+            if (NSTEPS != 0):
+                log.write_log('Warning:  less steps available.')
+            NSTEPS = max(self.MAX_NSTEPS - first, 0)
+        self._set_ckey(select_ckeys, max_vector_dim)
+        self.data = {key: np.zeros((NSTEPS, len(idx)), dtype=dtype) for key, idx in self.ckey.items()}
+
+        nread = 0
+        for segment, offset, nsteps in zip(self.segments, self.segment_offsets, self.segment_nsteps):
+            # steps [begin, end) of this segment are needed
+            begin = max(first + nread - offset, 0)
+            end = min(first + NSTEPS - offset, nsteps)
+            if (begin >= end):
+                continue
+            log.write_log('  reading steps {:d}-{:d} of {}'.format(begin, end, segment.filename))
+            segment.gotostep(begin)
+            views = {key: value[nread:] for key, value in self.data.items()}
+            read_ckey = accumulated_ckey(segment.ckey, segment.all_ckeys, accumulators, max_vector_dim)
+            nseg, stop = read_chunked(segment.file, end - begin, segment.NALLCKEYS, views, read_ckey,
+                                      getattr(segment, 'endrun_keyword', None), accumulators=accumulators)
+            nread += nseg
+            if (nseg < end - begin):   # (should never happen)
+                log.write_log('Warning:  less steps read in {}. Stopping here...'.format(segment.filename))
+                break
+
+        if (nread == 0):
+            log.write_log('WARNING:  no step read.')
+            return
+        NSTEPS = nread
+        self._current_step = first + nread
+        if even_NSTEPS:
+            if (NSTEPS % 2 == 1):
+                NSTEPS = NSTEPS - 1
+        for key in self.data:   # free the memory not used
+            self.data[key] = self.data[key][:NSTEPS, :]
+        log.write_log('  ( %d ) steps read.' % (NSTEPS))
+        self.NSTEPS = NSTEPS
+        log.write_log('DONE.  Elapsed time: ', time() - start_time, 'seconds')
+        return self.data
@@ -36,6 +36,10 @@
 import numpy as np
 from time import time
 from thermocepstrum.utils.utils import PrintMethod
+from .compressed import open_text
+from .chunkparse import read_chunked, read_growing, read_parallel, iter_chunked, skip_lines, accumulated_ckey
+from .fileindex import count_file_lines
+from .ingestcache import cache_dirname, load_cached, save_cached, cacheable_accumulators
 log = PrintMethod()
 
 
@@ -98,6 +102,10 @@ class TableFile(object):
     1 247.37505 -1085.734 -1909.333 -133.77141 124.25897 -103.27461 -61.022597 -83.17237
     2 238.37359 -1087.9214 -1874.56 -138.58616 115.84038 -5.7728078 -58.471318 -74.51758
     etc.
+
+    If cache=True (or the path of a directory) is passed, the data read with a given start_step are saved in a
+    binary cache (see ingestcache.py), and the following reads of the same data are memory-mapped from there (the
+    arrays are then read-only).
     """
 
     def __init__(self, *args, **kwargs):
@@ -111,6 +119,7 @@ class TableFile(object):
         else:
             raise ValueError('No file given.')
         group_vectors = kwargs.get('group_vectors', True)
+        self._cache_dir = cache_dirname(kwargs.get('cache', None))
         self._GUI = kwargs.get('GUI', False)
         if self._GUI:
             from ipywidgets import FloatProgress
@@ -120,8 +129,7 @@ class TableFile(object):
         self._open_file()
         self._read_ckeys(group_vectors)
         self.ckey = None
-        self.MAX_NSTEPS = data_length(self.filename)
-        log.write_log('Data length = ', self.MAX_NSTEPS)
+        self._MAX_NSTEPS = None   # counted only when needed
         return
 
     def __repr__(self):
@@ -135,13 +143,34 @@ class TableFile(object):
         return msg
 
     def _open_file(self):
-        """Open the file."""
+        """Open the file (gzip, bzip2 and xz compressed files are decompressed while reading)."""
         try:
-            self.file = open(self.filename, 'r')
+            self.file = open_text(self.filename)
         except:
             raise ValueError('File does not exist.')
         return
 
+    @property
+    def MAX_NSTEPS(self):
+        """The number of data lines of the file. It is counted the first time it is needed."""
+        if self._MAX_NSTEPS is None:
+            self._set_data_length()
+        return self._MAX_NSTEPS
+
+    def _set_data_length(self):
+        """Count the data lines of the file (or take their number from the cache, if used)."""
+        params = {'reader': 'TableFile', 'data_length': True}
+        if self._cache_dir is not None:
+            cached = load_cached(self.filename, params, self._cache_dir)
+            if cached is not None:
+                self._MAX_NSTEPS = cached[1]['MAX_NSTEPS']
+                return
+        self._MAX_NSTEPS = count_file_lines(self.filename, self._start_byte)
+        log.write_log('Data length = ', self._MAX_NSTEPS)
+        if self._cache_dir is not None:
+            save_cached(self.filename, params, {}, {'MAX_NSTEPS': self._MAX_NSTEPS}, self._cache_dir)
+        return
+
     def _read_ckeys(self, group_vectors=True):
         """Read the column keys. If group_vectors=True the vector ckeys are grouped togheter"""
         self.all_ckeys = {}
@@ -154,6 +183,7 @@ class TableFile(object):
             # text line: read variables names and save indexes in ckey
             if (is_string(values[0]) and (values[0].find('#') < 0)):
                 self.header += line[:-1]
+                self.NALLCKEYS = len(values)
                 for i in range(len(values)):
                     if group_vectors:
                         bracket = is_vector_variable(values[i])   # position of left square bracket
@@ -206,7 +236,7 @@ class TableFile(object):
             log.write_log('  ckey = ', self.ckey)
         return
 
-    def _initialize_dic(self, NSTEPS=None):
+    def _initialize_dic(self, NSTEPS=None, dtype=float):
         """Initialize the data dictionary once the ckeys have been set."""
         if self.ckey is None:
             raise ValueError('ckey not set.')
@@ -218,7 +248,29 @@ class TableFile(object):
         self.NSTEPS = 0
         self.data = {}
         for key, idx in self.ckey.items():
-            self.data[key] = np.zeros((NSTEPS, len(idx)))
+            self.data[key] = np.zeros((NSTEPS, len(idx)), dtype=dtype)
+        return
+
+    def _load_cache(self, params, accumulators=None):
+        """Load the data read with the given parameters (and the state of the accumulators) from the cache.
+        Returns True if found."""
+        cached = load_cached(self.filename, params, self._cache_dir)
+        if cached is None:
+            return False
+        self.data, meta = cached
+        for key, accumulator in (accumulators or {}).items():
+            accumulator.set_state(meta['accumulators'][key])
+        self.NSTEPS = meta['NSTEPS']
+        self.file.seek(meta['end_pos'])   # as if the data were read from file
+        log.write_log('  ( %d ) steps loaded from cache.' % (self.NSTEPS))
+        return True
+
+    def _save_cache(self, params, accumulators=None):
+        """Save the data just read with the given parameters (and the state of the accumulators) into the cache."""
+        meta = {'NSTEPS': self.NSTEPS, 'end_pos': self.file.tell()}
+        if accumulators:
+            meta['accumulators'] = {key: accumulator.state() for key, accumulator in accumulators.items()}
+        save_cached(self.filename, params, self.data, meta, self._cache_dir)
         return
 
     def gotostep(self, start_step):
@@ -228,62 +280,117 @@ class TableFile(object):
                        N  -->  go to N-th step"""
         if (start_step >= 0):
             self.file.seek(self._start_byte)
-            for i in range(start_step):   # advance of start_step-1 lines
-                self.file.readline()
+            if (start_step > 0):   # advance of start_step lines
+                self.file.buffer.seek(self._start_byte)
+                skip_lines(self.file.buffer, start_step)
+                self.file.seek(self.file.buffer.tell())
         return
 
-    def read_datalines(self, NSTEPS=0, start_step=-1, select_ckeys=None, max_vector_dim=None, even_NSTEPS=True):
+    def read_datalines(self, NSTEPS=0, start_step=-1, select_ckeys=None, max_vector_dim=None, even_NSTEPS=True,
+                       engine='numpy', workers=1, dtype=float, accumulators=None):
         """Read NSTEPS steps of file, starting from start_step, and store only
       the selected ckeys.
       INPUT:
-        NSTEPS         -> number of steps to read (default: 0 -> reads all the file)
+        NSTEPS         -> number of steps to read (default: 0 -> reads all the file; with the numpy engine and
+                          workers=1 this is done in a single pass, without counting the lines of the file first)
         start_step  = -1 -> continue from current step (default)
                        0 -> go to start step
                        N -> go to N-th step
         select_ckeys   -> an array with the column keys you want to read (see all_ckeys for a list)
         max_vector_dim -> when reading vectors read only this number of components (None = read all components)
         even_NSTEPS    -> round the number of steps to an even number (default: True)
+        engine         -> 'numpy'  read large chunks of lines and convert them with NumPy (default)
+                          'python' read and convert one line at a time
+        workers        -> number of processes that parse the file in parallel (numpy engine only, default: 1)
+        dtype          -> type of the data arrays (default: float; np.float32 halves the memory, keeping ~7
+                          significant digits: the values are parsed in double precision and then rounded)
+        accumulators   -> dictionary {key: accumulator} of columns whose statistics are accumulated while reading
+                          (e.g. {'Temp': md.tools.BlockingAccumulator()}): each accumulator receives the values of
+                          its column chunk by chunk (also the step dropped by even_NSTEPS). These columns are not
+                          stored, unless they are also selected (default: None)
       OUTPUT:
         data    ->  a dictionary with the selected-column steps
+      If the cache is used and start_step >= 0, the data are loaded from the cache if they were already read (the
+      accumulators, if given, must be empty: their state is restored from the cache too).
       """
         if self._GUI:
             progbar = FloatProgress(min=0, max=100)
             display(progbar)
         start_time = time()
-        if (NSTEPS == 0):
-            NSTEPS = self.MAX_NSTEPS
+        read_all = (NSTEPS == 0)
+        if read_all and ((engine != 'numpy') or (workers > 1)):
+            NSTEPS = self.MAX_NSTEPS   # the number of steps to allocate is needed
         self._set_ckey(select_ckeys, max_vector_dim)   # set the ckeys to read
-        self._initialize_dic(NSTEPS)   # allocate dictionary
+        read_ckey = accumulated_ckey(self.ckey, self.all_ckeys, accumulators, max_vector_dim)
+        cache_params = None
+        if (self._cache_dir is not None) and (start_step >= 0) and cacheable_accumulators(accumulators):
+            cache_params = {'reader': 'TableFile', 'ckey': self.ckey, 'start_step': start_step, 'NSTEPS': NSTEPS,
+                            'even_NSTEPS': even_NSTEPS, 'dtype': np.dtype(dtype).name,
+                            'accumulated': {key: read_ckey[key] for key in (accumulators or {})}}
+            if self._load_cache(cache_params, accumulators):
+                log.write_log('DONE.  Elapsed time: ', time() - start_time, 'seconds')
+                return self.data
+        self._initialize_dic(NSTEPS, dtype)   # allocate dictionary
         self.gotostep(start_step)   # jump to the starting step
 
         # read NSTEPS of the file
         progbar_step = max(100000, int(0.005 * NSTEPS))
-        for step in range(NSTEPS):
-            line = self.file.readline()
-            if len(line) == 0:   # EOF
-                log.write_log('Warning:  reached EOF.')
-                break
-            values = np.array(line.split())
-            for key, idx in self.ckey.items():   # save the selected columns
-                self.data[key][step, :] = np.array(list(map(float, values[idx])))
-            if ((step + 1) % progbar_step == 0):
-                if self._GUI:
-                    progbar.value = float(step + 1) / NSTEPS * 100.
-                    progbar.description = '{:6.2f}%'.format(progbar.value)
-                else:
-                    log.write_log('    step = {:9d} - {:6.2f}% completed'.format(step + 1,
-                                                                                 float(step + 1) / NSTEPS * 100.))
+        last_progress = [0]
+
+        def progress(step, total=NSTEPS):
+            if (step // progbar_step == last_progress[0] // progbar_step):
+                return
+            last_progress[0] = step
+            if self._GUI:
+                progbar.value = float(step) / total * 100.
+                progbar.description = '{:6.2f}%'.format(progbar.value)
+            else:
+                log.write_log('    step = {:9d} - {:6.2f}% completed'.format(step, float(step) / total * 100.))
+
+        if (engine == 'numpy'):
+            if (NSTEPS == 0):   # single pass, without counting the lines of the file
+                nread, stop = read_growing(self.file, self.NALLCKEYS, self.data, read_ckey, progress=progress,
+                                           accumulators=accumulators)
+            elif (workers > 1):
+                nread, stop = read_parallel(self.file, NSTEPS, self.NALLCKEYS, self.data, read_ckey, progress=progress,
+                                            workers=workers, accumulators=accumulators)
+            else:
+                nread, stop = read_chunked(self.file, NSTEPS, self.NALLCKEYS, self.data, read_ckey, progress=progress,
+                                           accumulators=accumulators)
+            if (stop == 'malformed'):
+                log.write_log('Warning:  line with wrong number of columns found. Stopping here...')
+        elif (engine == 'python'):
+            if (workers > 1):
+                raise ValueError('Parallel reading is available only with the numpy engine.')
+            nread = 0
+            for step in range(NSTEPS):
+                line = self.file.readline()
+                if len(line) == 0:   # EOF
+                    log.write_log('Warning:  reached EOF.')
+                    break
+                values = line.split()
+                for key, idx in self.ckey.items():   # save the selected columns
+                    self.data[key][step, :] = [float(values[i]) for i in idx]
+                for key, accumulator in (accumulators or {}).items():
+                    accumulator.add(np.array([[float(values[i]) for i in read_ckey[key]]]))
+                nread = step + 1
+                progress(nread)
+        else:
+            raise ValueError('Parse engine not valid.')
 
         if self._GUI:
             progbar.close()
         # check number of steps read, keep an even number of steps
-        if (step + 1 < self.NSTEPS):
-            if (step == 0):
+        if (nread < NSTEPS) or (nread == 0):
+            if (nread == 0):
                 log.write_log('WARNING:  no step read.')
                 return
             else:
-                log.write_log('Warning:  less steps read.')
-                self.NSTEPS = step + 1
+                if not read_all:   # if NSTEPS was specified
+                    log.write_log('Warning:  less steps read.')
+                NSTEPS = nread
+        if read_all:
+            NSTEPS = nread
         if even_NSTEPS:
             if (NSTEPS % 2 == 1):
                 NSTEPS = NSTEPS - 1
@@ -291,5 +398,33 @@ class TableFile(object):
             self.data[key] = self.data[key][:NSTEPS, :]
         log.write_log('  ( %d ) steps read.' % (NSTEPS))
         self.NSTEPS = NSTEPS
+        if cache_params is not None:
+            self._save_cache(cache_params, accumulators)
         log.write_log('DONE.  Elapsed time: ', time() - start_time, 'seconds')
         return self.data
+
+    def iter_blocks(self, block_steps, select_ckeys=None, start_step=-1, NSTEPS=0, max_vector_dim=None, dtype=float):
+        """
+        Generator that reads NSTEPS steps of file in blocks of block_steps steps, starting from start_step, and yields
+        each block as a dictionary with the selected-column steps (the last block may be shorter).
+        Only one block at a time is allocated, so that files larger than the memory can be processed. Example:
+          for block in current.iter_blocks(100000, select_ckeys=['Temp', 'flux']):
+              process(block['flux'])
+
+        INPUT:
+          block_steps    -> number of steps of each block
+          NSTEPS         -> number of steps to read (default: 0 -> reads all the file)
+          start_step, select_ckeys, max_vector_dim, dtype  -> see read_datalines
+        """
+        if (block_steps <= 0):
+            raise ValueError('block_steps must be positive.')
+        if (NSTEPS == 0):
+            NSTEPS = np.inf   # read up to the end of the data
+        self._set_ckey(select_ckeys, max_vector_dim)   # set the ckeys to read
+        self.gotostep(start_step)   # jump to the starting step
+        for block, stop in iter_chunked(self.file, block_steps, NSTEPS, self.NALLCKEYS, self.ckey, dtype=dtype):
+            if (stop == 'malformed'):
+                log.write_log('Warning:  line with wrong number of columns found. Stopping here...')
+            if (len(next(iter(block.values()))) > 0):
+                yield block
+        return
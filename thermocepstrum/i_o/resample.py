@@ -0,0 +1,80 @@
+################################################################################
+###
+###   Resample
+###
+################################################################################
+###
+###  Filter and resample the time series while they are read from file.
+###
+###  When the resampling period TSKIP (i.e. the cutoff frequency f*) is known
+###  in advance, the columns of a TableFile or LAMMPSLogFile can be read in
+###  blocks and passed through a moving-average filter block by block (the
+###  state of the filter is carried across the blocks), keeping only one step
+###  every TSKIP. The full-resolution time series is never stored, so memory
+###  and FFT size are reduced by TSKIP from the start.
+###
+###  The result is exactly equal to what heatcurrent.resample_current (i.e.
+###  md.tools.filter_and_sample) gives on the data read with read_datalines.
+###
+################################################################################
+
+## example:
+##   jfile = TableFile(filename, group_vectors=True)
+##   data = read_resampled(jfile, TSKIP=18, select_ckeys=['flux1'])
+##   jf = HeatCurrent(data['flux1'], 'metal', DT_FS * 18, TEMPERATURE, VOLUME)
+##
+
+import numpy as np
+from time import time
+from thermocepstrum.md.tools import FilterSampler
+from thermocepstrum.utils.utils import PrintMethod
+log = PrintMethod()
+
+BLOCK_STEPS = 2**18   # default number of steps read in each block
+
+
+def read_resampled(jfile, TSKIP, select_ckeys=None, FILTER_W=None, start_step=0, NSTEPS=0, max_vector_dim=None,
+                   even_NSTEPS=True, block_steps=BLOCK_STEPS, dtype=float):
+    """
+    Read the selected columns of a file, filtering them with a moving average of FILTER_W steps and sampling them
+    every TSKIP steps, one block at a time.
+
+    INPUT:
+      jfile          -> a TableFile or LAMMPSLogFile object (any reader with an iter_blocks method)
+      TSKIP          -> sampling period [steps]
+      FILTER_W       -> width of the moving-average filter [steps] (default: TSKIP, as resample_current)
+      block_steps    -> number of steps read in each block
+      even_NSTEPS    -> round the number of steps read to an even number, as read_datalines (default: True)
+      select_ckeys, start_step, NSTEPS, max_vector_dim, dtype  -> see read_datalines
+
+    OUTPUT:
+      data    ->  a dictionary with the filtered and resampled columns (with an even number of steps), equal to
+                  md.tools.filter_and_sample(read_datalines(...)[key], FILTER_W, TSKIP)
+    """
+    if FILTER_W is None:
+        FILTER_W = TSKIP
+    start_time = time()
+    samplers = {}
+    samples = {}
+    nread = 0
+    for block in jfile.iter_blocks(block_steps, select_ckeys, start_step, NSTEPS, max_vector_dim, dtype):
+        for key, value in block.items():
+            if key not in samplers:
+                samplers[key] = FilterSampler(FILTER_W, TSKIP)
+                samples[key] = []
+            samples[key].append(samplers[key].push(value))
+        nread += value.shape[0]
+    if (nread == 0):
+        log.write_log('WARNING:  no step read.')
+        return
+    data = {}
+    for key, sampler in samplers.items():
+        samples[key].append(sampler.flush())
+        data[key] = np.concatenate(samples[key])
+        # drop the last sampled step, if it is the step dropped by even_NSTEPS
+        if even_NSTEPS and (nread % 2 == 1) and (sampler.first + (data[key].shape[0] - 1) * TSKIP == nread - 1):
+            data[key] = data[key][:-1]
+        data[key] = FilterSampler.finalize(data[key])
+    log.write_log('  ( %d ) steps read, ( %d ) steps kept (TSKIP = %d).' % (nread, data[key].shape[0], TSKIP))
+    log.write_log('DONE.  Elapsed time: ', time() - start_time, 'seconds')
+    return data
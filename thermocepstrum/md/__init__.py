@@ -1,6 +1,6 @@
-__all__ = ['acf', 'aic', 'armodel', 'cepstral', 'lpfilter', 'mdsample', 'tools', 'units']
+__all__ = ['acf', 'aic', 'armodel', 'cepstral', 'cospectrum', 'fftbackend', 'lpfilter', 'mdsample', 'tools', 'units']
 
-from scipy.fftpack import fft, ifft, dct
+from .fftbackend import fft, ifft, dct
 from scipy.signal import periodogram, lfilter
 from . import *
 
@@ -1,4 +1,5 @@
 import numpy as np
+from . import fftbackend
 
 ## functions copied from statstools.tsa
 
@@ -78,8 +79,8 @@ def acovf(x, unbiased=False, demean=True, fft=False, missing='none'):
     if fft:
         nobs = len(xo)
         n = _next_regular(2 * nobs + 1)
-        Frf = np.fft.fft(xo, n=n)
-        acov = np.fft.ifft(Frf * np.conjugate(Frf))[:nobs] / d[nobs - 1:]
+        Frf = fftbackend.fft(xo, n=n)
+        acov = fftbackend.ifft(Frf * np.conjugate(Frf))[:nobs] / d[nobs - 1:]
         acov = acov.real
     else:
         acov = (np.correlate(xo, xo, 'full') / d)[n - 1:]
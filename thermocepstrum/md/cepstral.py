@@ -1,7 +1,7 @@
 import numpy as np
 from scipy.special import polygamma
 from scipy.sparse import diags
-from scipy.fftpack import dct,rfft,irfft, fft, ifft
+from .fftbackend import dct, fft, ifft
 from .tools import logtau_to_tau
 from .aic import *
 from thermocepstrum.utils.utils import PrintMethod
@@ -65,10 +65,20 @@ def mel_multicomp_cepstral_parameters( N_COMPONENTS,bins):
 
     return ck_THEORY_var, psd_THEORY_mean,[var_diag,var_sdiag]
 
-def dct_coefficients(y):
-    """Compute the normalized Discrete Cosine Transform coefficients of y.
+def onecomp_logpsd_theory_mean(NF):
+    """Returns the theoretical mean of the log(PSD) distribution of a one-component periodogram:
+         - EULER_GAMMA - log(2)   for k = {0, N/2}
+         - EULER_GAMMA            otherwise"""
+    logpsd_THEORY_mean = -EULER_GAMMA * np.ones(NF)
+    logpsd_THEORY_mean[0] = -EULER_GAMMA - np.log(2)
+    logpsd_THEORY_mean[-1] = -EULER_GAMMA - np.log(2)
+    return logpsd_THEORY_mean
+
+
+def dct_coefficients(y, axis=-1):
+    """Compute the normalized Discrete Cosine Transform coefficients of y (along axis, for a batch of arrays).
         yk = 0.5 * DCT(y) / (N-1)"""
-    yk = dct(y, type=1) / (y.size - 1) * 0.5   # normalization
+    yk = dct(y, type=1, axis=axis) / (y.shape[axis] - 1) * 0.5   # normalization
     return yk
 
 
@@ -131,21 +141,19 @@ class CosFilter(object):
     psd          = filtered PSD at the specified cutoff K_PSD
 
     p_aic... = Bayesian AIC weighting stuff
+
+    The cepstral coefficients logpsdK can be given, if already computed (see batch_cos_filter).
     """
 
-    def __init__(self, samplelogpsd, ck_theory_var=None, psd_theory_mean=None, aic_type='aic', Kmin_corrfactor=1.0):
+    def __init__(self, samplelogpsd, ck_theory_var=None, psd_theory_mean=None, aic_type='aic', Kmin_corrfactor=1.0,
+                 logpsdK=None):
 
         NF = samplelogpsd.size
         N = 2 * (NF - 1)
 
         if psd_theory_mean is None:
-            # by default the THEORETICAL means are the one component ones:
-            # ck THEORY mean:
-            #    - EULER_GAMMA - log(2)   for k = {0, N/2}
-            #    - EULER_GAMMA            otherwise
-            self.logpsd_THEORY_mean = -EULER_GAMMA * np.ones(NF)
-            self.logpsd_THEORY_mean[0] = -EULER_GAMMA - np.log(2)
-            self.logpsd_THEORY_mean[-1] = -EULER_GAMMA - np.log(2)
+            # by default the THEORETICAL means are the one component ones
+            self.logpsd_THEORY_mean = onecomp_logpsd_theory_mean(NF)
         else:
             self.logpsd_THEORY_mean = psd_theory_mean
 
@@ -153,7 +161,10 @@ class CosFilter(object):
         self.samplelogpsd = samplelogpsd - self.logpsd_THEORY_mean
 
         # compute cepstral coefficients
-        self.logpsdK = dct_coefficients(self.samplelogpsd)
+        if logpsdK is None:
+            self.logpsdK = dct_coefficients(self.samplelogpsd)
+        else:
+            self.logpsdK = logpsdK
 
         # estimate AIC
         if (aic_type == 'aic'):
@@ -378,3 +389,26 @@ class CosFilter(object):
 #            self.optimalK = np.NaN
 #            log.write_log(Warning: optimal cutoff K NOT FOUND.')
 #        return
+
+
+def batch_cos_filter(samplelogpsds, ck_theory_var=None, psd_theory_mean=None, aic_type='aic', Kmin_corrfactor=1.0,
+                     K_PSD=None):
+    """
+    CEPSTRAL ANALYSIS of a batch of sample log-PSDs with the same theoretical distribution (e.g. the reduced log-PSDs
+    of several currents of interest, see MDSample.compute_kappa_multi).
+    samplelogpsds is an array of shape (n, NF): the cepstral coefficients of all the log-PSDs are computed with a
+    single batched DCT. The other parameters are the ones of CosFilter and CosFilter.scan_filter_tau.
+    Returns a list of n CosFilter objects, already scanned with scan_filter_tau.
+    """
+    samplelogpsds = np.atleast_2d(samplelogpsds)
+    if psd_theory_mean is None:
+        psd_theory_mean = onecomp_logpsd_theory_mean(samplelogpsds.shape[1])
+    logpsdK = dct_coefficients(samplelogpsds - psd_theory_mean, axis=1)
+    filters = []
+    for logpsd, ck in zip(samplelogpsds, logpsdK):
+        cos_filter = CosFilter(logpsd, ck_theory_var=ck_theory_var, psd_theory_mean=psd_theory_mean,
+                               aic_type=aic_type, Kmin_corrfactor=Kmin_corrfactor, logpsdK=ck)
+        cos_filter.scan_filter_tau(K_PSD=K_PSD)
+        filters.append(cos_filter)
+    return filters
+
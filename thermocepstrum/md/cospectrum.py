@@ -0,0 +1,218 @@
+################################################################################
+###
+###   Cospectrum
+###
+################################################################################
+###
+###  Memory-bounded computation of the cospectrum matrix of M currents and of
+###  the reduced PSD of the current of interest (multi-component analysis).
+###
+###  The spectra of the M currents are computed by a SpectralStore, one current
+###  at a time into a preallocated (M, Nfreqs, L) array, and cached, so that
+###  they are shared by all the objects that need them.
+###
+###  The cospectrum S_ab(f) = sum_l s_a(f,l) s_b(f,l)^* (summed over the L
+###  equivalent components) is Hermitian, so only its upper triangle (a <= b)
+###  is stored, "packed" in an array of shape (M*(M+1)/2, Nfreqs), in the
+###  order of np.triu_indices(M). It is accumulated in chunks of CHUNK_FREQS
+###  frequencies, so that the (M, M, Nfreqs, L) array of the products of the
+###  spectra is never allocated.
+###
+###  The reduced PSD 1/(S^-1)_00 is obtained from the Cholesky factorization
+###  S = C C^H of the matrix with the current of interest moved to the last
+###  position:  1/(S^-1)_00 = C_{M-1,M-1}^2,  so no inverse is computed.
+###  The reduced PSDs of several currents of interest (Onsager-matrix mode)
+###  are all obtained from a single factorization S = C C^H per frequency:
+###  (S^-1)_kk is the squared norm of the column k of C^-1, computed by
+###  forward substitution.
+###
+################################################################################
+
+## example:
+##   store = SpectralStore([j, j1])
+##   packed = compute_packed_cospectrum(store.spectra, scale)
+##   psd = reduced_psd(packed)
+##   psds = reduced_psds(packed, [0, 1])   # reduced PSDs of the currents 0 and 1
+##   cospectrum = unpack_cospectrum(packed)   # full (M, M, Nfreqs) matrix
+##
+
+import numpy as np
+from .tools import rfft
+
+CHUNK_FREQS = 2**16   # number of frequencies processed at a time
+
+
+class SpectralStore(object):
+    """
+    The spectra (one-sided FFTs along the time axis) of a set of M currents with the same shape (N, L).
+    They are computed when they are needed for the first time, one current at a time into a preallocated
+    (M, Nfreqs, L) array (in single precision if the trajectories are float32 arrays), and then cached.
+    Example:
+      store = SpectralStore([j.traj, j1.traj])
+      spectr_j1 = store[1]   # the FFTs of both currents are computed here
+      spectr_j = store[0]    # cached
+    """
+
+    def __init__(self, trajs):
+        self.trajs = list(trajs)
+        shapes = set(traj.shape for traj in self.trajs)
+        if (len(shapes) != 1):
+            raise ValueError('The currents must have the same shape: {}.'.format(sorted(shapes)))
+        self._spectra = None
+        return
+
+    def __repr__(self):
+        return 'SpectralStore: {} currents of shape {} ({})'.format(len(self), self.trajs[0].shape,
+                                                                   'computed' if self.computed else 'not computed')
+
+    def __len__(self):
+        return len(self.trajs)
+
+    def __getitem__(self, index):
+        return self.spectra[index]
+
+    @property
+    def computed(self):
+        return self._spectra is not None
+
+    @property
+    def spectra(self):
+        """Array of shape (M, Nfreqs, L) with the spectra of the currents."""
+        if self._spectra is None:
+            first = rfft(self.trajs[0], axis=0)
+            spectra = np.empty((len(self.trajs),) + first.shape, dtype=first.dtype)
+            spectra[0] = first
+            del first
+            for i, traj in enumerate(self.trajs[1:], 1):
+                spectra[i] = rfft(traj, axis=0)
+            self._spectra = spectra
+        return self._spectra
+
+    @property
+    def Nfreqs(self):
+        return self.trajs[0].shape[0] // 2 + 1
+
+    def clear(self):
+        """Free the memory of the cached spectra (they will be computed again if needed)."""
+        self._spectra = None
+        return
+
+
+def packed_size(M):
+    """Number of elements of the upper triangle of a (M, M) matrix."""
+    return M * (M + 1) // 2
+
+
+def packed_order(packed):
+    """Return the number of currents M of a packed cospectrum."""
+    M = int(round((np.sqrt(8 * packed.shape[0] + 1) - 1) / 2))
+    if (packed_size(M) != packed.shape[0]):
+        raise ValueError('Not a packed cospectrum: wrong number of elements ({}).'.format(packed.shape[0]))
+    return M
+
+
+def compute_packed_cospectrum(spectra, scale=1.0, chunk_freqs=CHUNK_FREQS):
+    """
+    Compute the upper triangle of the cospectrum matrix of M currents:
+      packed[p] = scale * sum_l spectra[a][:,l] * spectra[b][:,l].conj()     with (a, b) = np.triu_indices(M)[p]
+    spectra is a list of M arrays of shape (Nfreqs, L) (or (Nfreqs,)), also in single precision (complex64): the
+    products and the sums are computed in double precision, chunk_freqs frequencies at a time.
+    Returns a complex128 array of shape (M*(M+1)/2, Nfreqs).
+    """
+    M = len(spectra)
+    Nfreqs = spectra[0].shape[0]
+    rows, cols = np.triu_indices(M)
+    packed = np.zeros((packed_size(M), Nfreqs), dtype=complex)
+    for begin in range(0, Nfreqs, chunk_freqs):
+        end = min(begin + chunk_freqs, Nfreqs)
+        chunk = np.array([np.reshape(s[begin:end], (end - begin, -1)) for s in spectra], dtype=complex)
+        for p, (a, b) in enumerate(zip(rows, cols)):
+            packed[p, begin:end] = np.einsum('fl,fl->f', chunk[a], chunk[b].conj())
+    if (scale != 1.0):
+        packed *= scale
+    return packed
+
+
+def unpack_cospectrum(packed, begin=0, end=None):
+    """
+    Return the full Hermitian cospectrum matrix of shape (M, M, nfreqs) of the frequencies [begin, end) of a packed
+    cospectrum.
+    """
+    M = packed_order(packed)
+    rows, cols = np.triu_indices(M)
+    chunk = packed[:, begin:end]
+    full = np.empty((M, M, chunk.shape[1]), dtype=packed.dtype)
+    full[rows, cols] = chunk
+    full[cols, rows] = chunk.conj()
+    return full
+
+
+def packed_element(packed, a, b):
+    """Return the element (a, b) of the cospectrum matrix (an array of shape (nfreqs,)) of a packed cospectrum."""
+    M = packed_order(packed)
+    if (a > b):
+        return packed[b * M - b * (b - 1) // 2 + (a - b)].conj()
+    return packed[a * M - a * (a - 1) // 2 + (b - a)]
+
+
+def reduced_psd(packed, chunk_freqs=CHUNK_FREQS):
+    """
+    Return 1/(S^-1)_00 for each frequency of a packed cospectrum S (the PSD of the current 0, once the correlation with
+    the other currents has been removed), chunk_freqs frequencies at a time.
+    It is obtained from the Cholesky factor of S with the current 0 moved to the last position. If a matrix of a chunk
+    is not positive definite (e.g. a singular matrix), the inverse of the matrices of that chunk is used.
+    """
+    M = packed_order(packed)
+    Nfreqs = packed.shape[1]
+    order = list(range(1, M)) + [0]   # current 0 at the end
+    psd = np.zeros(Nfreqs)
+    for begin in range(0, Nfreqs, chunk_freqs):
+        end = min(begin + chunk_freqs, Nfreqs)
+        matrices = unpack_cospectrum(packed, begin, end).transpose((2, 0, 1))
+        try:
+            factor = np.linalg.cholesky(matrices[:, order][:, :, order])
+            psd[begin:end] = factor[:, -1, -1].real**2
+        except np.linalg.LinAlgError:
+            psd[begin:end] = (np.linalg.inv(matrices)[:, 0, 0]**-1).real
+    return psd
+
+
+def _inverse_lower(factor):
+    """Inverse of a stack of lower-triangular matrices of shape (nfreqs, M, M), by forward substitution."""
+    M = factor.shape[-1]
+    inverse = np.zeros_like(factor)
+    for i in range(M):
+        row = -np.einsum('fj,fjk->fk', factor[:, i, :i], inverse[:, :i, :])
+        row[:, i] += 1.
+        inverse[:, i, :] = row / factor[:, i, i, np.newaxis]
+    return inverse
+
+
+def reduced_psds(packed, currents=None, chunk_freqs=CHUNK_FREQS):
+    """
+    Return the reduced PSDs 1/(S^-1)_kk of the currents of interest k of a packed cospectrum S, i.e. the PSD of each
+    current once the correlation with all the other currents has been removed, as an array of shape
+    (len(currents), Nfreqs). currents is a list of indexes of the currents (default: all of them).
+    The matrices are factorized only once for all the currents (S = C C^H, and (S^-1)_kk is the squared norm of the
+    column k of C^-1), chunk_freqs frequencies at a time. If a matrix of a chunk is not positive definite, the inverse
+    of the matrices of that chunk is used.
+    """
+    M = packed_order(packed)
+    if currents is None:
+        currents = list(range(M))
+    currents = list(currents)
+    for k in currents:
+        if not (0 <= k < M):
+            raise ValueError('Current index {} out of range (the cospectrum has {} currents).'.format(k, M))
+    Nfreqs = packed.shape[1]
+    psds = np.zeros((len(currents), Nfreqs))
+    for begin in range(0, Nfreqs, chunk_freqs):
+        end = min(begin + chunk_freqs, Nfreqs)
+        matrices = unpack_cospectrum(packed, begin, end).transpose((2, 0, 1))
+        try:
+            inverse = _inverse_lower(np.linalg.cholesky(matrices))
+            psds[:, begin:end] = 1. / np.sum(np.abs(inverse[:, :, currents])**2, axis=1).T
+        except np.linalg.LinAlgError:
+            diagonal = np.diagonal(np.linalg.inv(matrices), axis1=1, axis2=2)
+            psds[:, begin:end] = (diagonal[:, currents]**-1).real.T
+    return psds
@@ -0,0 +1,145 @@
+################################################################################
+###
+###   FFT backend
+###
+################################################################################
+###
+###  All the FFTs and DCTs of the package (periodogram, cospectrum, cepstral
+###  coefficients, autocorrelation functions) are computed through the
+###  functions of this module, that call one of the backends:
+###    'scipy'   scipy.fft (default). The transforms of the components of a
+###              multi-component array are computed in parallel by workers
+###              threads.
+###    'pyfftw'  the FFTW library, through the optional pyFFTW package
+###              (pip install pyfftw). Also the transform of a single long
+###              array is computed by workers threads. The FFTW plans (and
+###              their aligned input/output arrays) are kept in a cache and
+###              reused when a transform with the same shape and type is
+###              repeated.
+###    'numpy'   numpy.fft (single thread, always in double precision).
+###
+###  The backend and the number of workers are selected globally with
+###  set_backend, or for a single call with the backend and workers arguments.
+###  workers = -1 uses all the CPUs.
+###  Single-precision (float32/complex64) arrays are transformed in single
+###  precision by the scipy and pyfftw backends.
+###
+################################################################################
+
+## example:
+##   import thermocepstrum as tc
+##   tc.md.fftbackend.set_backend('pyfftw', workers=8)
+##   jf = tc.HeatCurrent(flux, 'metal', DT_FS, TEMPERATURE, VOLUME)   # FFTs computed by FFTW with 8 threads
+##   spectr = tc.md.fftbackend.rfft(flux, axis=0, backend='numpy')
+##
+
+import numpy as np
+import scipy.fft
+from thermocepstrum.utils.utils import PrintMethod
+log = PrintMethod()
+
+BACKENDS = ['scipy', 'pyfftw', 'numpy']
+PLAN_KEEPALIVE_TIME = 300.   # time [s] an unused FFTW plan is kept in the cache
+
+_settings = {'backend': 'scipy', 'workers': 1}
+
+
+def _import_pyfftw():
+    """Import the scipy.fft interface of the optional pyFFTW package, enabling its plan cache."""
+    try:
+        import pyfftw.interfaces.cache
+        import pyfftw.interfaces.scipy_fft
+    except ImportError:
+        raise ImportError('pyFFTW is needed by the pyfftw FFT backend (pip install pyfftw).')
+    if not pyfftw.interfaces.cache.is_enabled():
+        pyfftw.interfaces.cache.enable()
+        pyfftw.interfaces.cache.set_keepalive_time(PLAN_KEEPALIVE_TIME)
+    return pyfftw.interfaces.scipy_fft
+
+
+def set_backend(backend=None, workers=None):
+    """
+    Select the FFT backend ('scipy', 'pyfftw', 'numpy') and/or the number of workers used by default.
+    Returns the previous settings (backend, workers), that can be restored with set_backend(*previous).
+    """
+    previous = (_settings['backend'], _settings['workers'])
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError('FFT backend not valid. Choose one of {}.'.format(BACKENDS))
+        if (backend == 'pyfftw'):
+            _import_pyfftw()   # check that it is available
+        _settings['backend'] = backend
+    if workers is not None:
+        if (workers == 0) or (workers < -1):
+            raise ValueError('workers must be a positive number, or -1 (all the CPUs).')
+        _settings['workers'] = workers
+    return previous
+
+
+def get_backend():
+    """Return the current settings (backend, workers)."""
+    return _settings['backend'], _settings['workers']
+
+
+def _module(backend):
+    """Return the module implementing the transforms of backend (None = current backend)."""
+    if backend is None:
+        backend = _settings['backend']
+    if (backend == 'scipy'):
+        return scipy.fft
+    if (backend == 'pyfftw'):
+        return _import_pyfftw()
+    if (backend == 'numpy'):
+        return None
+    raise ValueError('FFT backend not valid. Choose one of {}.'.format(BACKENDS))
+
+
+def _workers(workers):
+    return _settings['workers'] if (workers is None) else workers
+
+
+def rfft(x, n=None, axis=-1, backend=None, workers=None):
+    """One-sided FFT of a real array along axis (see numpy.fft.rfft)."""
+    module = _module(backend)
+    if module is None:
+        return np.fft.rfft(x, n=n, axis=axis)
+    return module.rfft(x, n=n, axis=axis, workers=_workers(workers))
+
+
+def irfft(x, n=None, axis=-1, backend=None, workers=None):
+    """Inverse of rfft (see numpy.fft.irfft)."""
+    module = _module(backend)
+    if module is None:
+        return np.fft.irfft(x, n=n, axis=axis)
+    return module.irfft(x, n=n, axis=axis, workers=_workers(workers))
+
+
+def fft(x, n=None, axis=-1, backend=None, workers=None):
+    """FFT of an array along axis (see numpy.fft.fft)."""
+    module = _module(backend)
+    if module is None:
+        return np.fft.fft(x, n=n, axis=axis)
+    return module.fft(x, n=n, axis=axis, workers=_workers(workers))
+
+
+def ifft(x, n=None, axis=-1, backend=None, workers=None):
+    """Inverse FFT of an array along axis (see numpy.fft.ifft)."""
+    module = _module(backend)
+    if module is None:
+        return np.fft.ifft(x, n=n, axis=axis)
+    return module.ifft(x, n=n, axis=axis, workers=_workers(workers))
+
+
+def dct(x, type=2, axis=-1, backend=None, workers=None):
+    """
+    Discrete cosine transform of a real array along axis (unnormalized, see scipy.fft.dct).
+    The numpy backend computes a DCT-I with a real FFT of the even extension of x (other types use scipy.fft).
+    """
+    module = _module(backend)
+    if module is None:
+        if (type != 1):
+            return scipy.fft.dct(x, type=type, axis=axis)
+        x = np.moveaxis(np.asarray(x), axis, -1)
+        y = np.fft.rfft(np.concatenate((x, x[..., -2:0:-1]), axis=-1), axis=-1).real
+        return np.moveaxis(y, -1, axis)
+    return module.dct(x, type=type, axis=axis, workers=_workers(workers))
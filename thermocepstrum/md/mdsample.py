@@ -3,8 +3,9 @@ import numpy as np
 #import matplotlib.pyplot as plt
 from thermocepstrum.utils.loadAfterPlt import plt
 
-from .tools import integrate_acf, runavefilter
-from scipy.signal import periodogram
+from .tools import integrate_acf, runavefilter, rfft, power_spectrum
+from .fftbackend import ifft
+from .cospectrum import compute_packed_cospectrum, unpack_cospectrum, reduced_psd, reduced_psds
 from scipy.interpolate import interp1d
 from .acf import acovf
 
@@ -44,6 +45,14 @@ class MDSample(object):
        - Nfreqs     number of trajectories, should be N/2+1
        - freqs      an array of frequencies, should be [0, 1/(2N*DT)]
        - freqs_THz  an array of frequencies, expressed in THz
+       - dtype      the type of traj (float64 by default, or float32).
+                    With float32 the trajectory takes half of the memory and its FFT is computed in single precision
+                    (complex64), while the squared moduli and the sums over the components (periodogram, cospectrum)
+                    are accumulated in double precision. The rounding error of the FFT is ~1e-7 of the largest
+                    coefficients, so the PSD loses relative accuracy where it is orders of magnitude below its peak;
+                    this is far below the statistical error of the periodogram (kappa changes by ~1e-7 relative).
+                    Use float64 if the mean of the trajectory is much larger than its fluctuations (e.g. the currents
+                    are not centered), as the values are rounded to ~7 significant digits.
 
     MEMBERS:
         self.DT_FS                  timestep in femtoseconds
@@ -58,8 +67,9 @@ class MDSample(object):
     """
 
 
-    def __init__(self, traj=None, spectr=None, psd=None, freqs=None, DT_FS=1.0):
+    def __init__(self, traj=None, spectr=None, psd=None, freqs=None, DT_FS=1.0, dtype=float):
         self.DT_FS = DT_FS
+        self.dtype = np.dtype(dtype)
         self.initialize_traj(traj)
         self.initialize_spectrum(spectr)
         self.initialize_psd(freqs=freqs, psd=psd, DT_FS=DT_FS)
@@ -68,8 +78,13 @@ class MDSample(object):
         self.flogpsd = None
         self.acf = None
         self.NLAGS = None
+        self.spectral_store = None
         self.cospectrum = None
+        self.cospectrum_packed = None
         self.fcospectrum = None
+        self.fcospectrum_packed = None
+        self.onsager_currents = None
+        self.onsager_psd = None
 
         # other variables...
         self.FILTER_WINDOW_WIDTH = None
@@ -91,6 +106,39 @@ class MDSample(object):
             msg = msg + '  acf:    {}  lags\n'.format(self.NLAGS)
         return msg
 
+    @property
+    def cospectrum(self):
+        """
+        Cospectrum matrix of the currents, of shape (N_CURRENTS, N_CURRENTS, Nfreqs). When it is computed by
+        compute_kappa_multi only its upper triangle is stored (cospectrum_packed), and the full matrix is built each
+        time it is accessed (use unpack_cospectrum(cospectrum_packed, begin, end) to build only a range of
+        frequencies).
+        """
+        if self.cospectrum_packed is not None:
+            return unpack_cospectrum(self.cospectrum_packed)
+        return self._cospectrum
+
+    @cospectrum.setter
+    def cospectrum(self, value):
+        self._cospectrum = value
+        self.cospectrum_packed = None
+
+    @property
+    def fcospectrum(self):
+        """
+        Filtered cospectrum matrix (divided by the number of components), of shape (N_CURRENTS, N_CURRENTS, Nfreqs).
+        As for cospectrum, when only its upper triangle is stored (fcospectrum_packed) the full matrix is built each
+        time it is accessed.
+        """
+        if self.fcospectrum_packed is not None:
+            return unpack_cospectrum(self.fcospectrum_packed)
+        return self._fcospectrum
+
+    @fcospectrum.setter
+    def fcospectrum(self, value):
+        self._fcospectrum = value
+        self.fcospectrum_packed = None
+
     #############################################
     ###################################
     ###  INITIALIZE METHODS
@@ -100,10 +148,10 @@ class MDSample(object):
     def initialize_traj(self, array):
         if array is not None:
             if array.shape[0] % 2 == 1:
-                self.traj = np.array(array[1:], dtype=float)
+                self.traj = np.array(array[1:], dtype=self.dtype)
                 print('trajectory has an odd number of points. Removing the first one.')
             else:
-                self.traj = np.array(array, dtype=float)
+                self.traj = np.array(array, dtype=self.dtype)
             self.N = self.traj.shape[0]
             if len(self.traj.shape) > 1:
                 self.MULTI_COMPONENT = True
@@ -119,7 +167,7 @@ class MDSample(object):
 
     def initialize_spectrum(self, array):
         if array is not None:
-            self.spectr = np.array(array, dtype=complex)
+            self.spectr = np.array(array, dtype=np.result_type(self.dtype, np.complex64))
             self.Nfreqs = self.spectr.size
             self.DF = 0.5 / (self.Nfreqs - 1)
         else:
@@ -203,7 +251,7 @@ class MDSample(object):
         if self.spectr is None:
             raise ValueError('Spectrum not defined.')
         full_spectr = np.append(self.spectr, self.spectr[-2:0:-1].conj())
-        self.traj = np.real(np.fft.ifft(full_spectr))   #*np.sqrt(self.Nfreqs-1)
+        self.traj = np.real(ifft(full_spectr))   #*np.sqrt(self.Nfreqs-1)
         self.N = self.traj.size
         return
 
@@ -211,8 +259,7 @@ class MDSample(object):
         """Computes spectrum from trajectory."""
         if self.traj is None:
             raise ValueError('Trajectory not defined.')
-        full_spectr = np.fft.fft(self.traj)
-        self.spectr = full_spectr[:self.N / 2 + 1]
+        self.spectr = rfft(self.traj)
         self.Nfreqs = self.spectr.size
         self.DF = 0.5 / (self.Nfreqs - 1)
         return
@@ -231,12 +278,14 @@ class MDSample(object):
         if (method == 'trajectory'):
             if self.traj is None:
                 raise ValueError('Trajectory not defined.')
+            # |FFT|**2 / N (single-precision FFT if traj is float32, power accumulated in double precision)
+            self.freqs = np.fft.rfftfreq(self.N)
+            psd = power_spectrum(rfft(self.traj, axis=0)) / self.N
             if self.MULTI_COMPONENT:
-                self.freqs, self.psdALL = periodogram(self.traj, detrend=None, axis=0)
+                self.psdALL = psd
                 self.psd = np.mean(self.psdALL, axis=1)
             else:
-                self.freqs, self.psd = periodogram(self.traj, detrend=None)
-            self.psd[1:-1] = self.psd[1:-1] * 0.5
+                self.psd = psd
             self.psd = self.DT_FS * self.psd
             self.Nfreqs = self.freqs.size
             self.DF = 0.5 / (self.Nfreqs - 1)
@@ -271,7 +320,14 @@ class MDSample(object):
             raise ValueError('Filter window width not defined.')
         if (window_type == 'rectangular'):
             self.fpsd = runavefilter(self.psd, self.FILTER_WF)
-            if self.cospectrum is not None:   # try to filter the other currents (if present)
+            if self.cospectrum_packed is not None:   # try to filter the other currents (if present)
+                # the filter is real: only the upper triangle of the Hermitian matrix is filtered
+                fpacked = np.empty_like(self.cospectrum_packed)
+                for i, c in enumerate(self.cospectrum_packed):
+                    fpacked[i] = runavefilter(c, self.FILTER_WF) / self.L
+                self.fcospectrum = None
+                self.fcospectrum_packed = fpacked
+            elif self._cospectrum is not None:
                 self.fcospectrum = []
                 for i in range(self.cospectrum.shape[0]):
                     self.fcospectrum.append([])
@@ -309,7 +365,8 @@ class MDSample(object):
 
     # this is called by HeatCurrent.
     def compute_kappa_multi(self, others, FILTER_WINDOW_WIDTH=None, method='trajectory', DT_FS=None,
-                            average_components=True, normalize=False, call_other=True):   # yapf: disable
+                            average_components=True, normalize=False, call_other=True,
+                            onsager_currents=None):   # yapf: disable
         """
         For multi-component (many current) systems: compute the cospectrum matrix and the transport coefficient.
         The results have almost the same statistical properties. The chi-square distribution has ndf = n - l + 1,
@@ -325,6 +382,15 @@ class MDSample(object):
         j is the energy current and j1, j2, j3 are mass currents (MDSample objects):
 
            j.compute_kappa_multi(others=[j1,j2,j3], FILTER_WINDOW_WIDTH=FILTER_WINDOW_WIDTH)
+
+        If self.spectral_store is set (a SpectralStore of [self] + others, see md.cospectrum), the spectra of all the
+        currents are taken from it, instead of being computed one at a time.
+
+        Onsager-matrix mode: onsager_currents is a list of indexes of the currents of interest (0 = self, 1 = others[0],
+        ...). The reduced PSDs of all of them (the PSD of each current once the correlation with all the others has been
+        removed, i.e. what self.psd would be if that current were the first one) are computed from a single
+        factorization of the cospectrum matrix per frequency, and stored in self.onsager_psd, an array of shape
+        (len(onsager_currents), Nfreqs). See HeatCurrent.onsager_cepstral_analysis.
         """
         # check if others is an array
         if not isinstance(others, (list, tuple, np.ndarray)):
@@ -336,7 +402,12 @@ class MDSample(object):
         if (method == 'trajectory'):
             if self.traj is None:
                 raise ValueError('Trajectory not defined.')
-            self.spectrALL = np.fft.rfft(self.traj, axis=0)
+            if self.spectral_store is not None:   # spectra of all the currents, computed once (see SpectralStore)
+                if (len(self.spectral_store) != N_CURRENTS + 1):
+                    raise ValueError('The spectral store must contain the spectra of this current and of the others.')
+                self.spectrALL = self.spectral_store[0]
+            else:
+                self.spectrALL = rfft(self.traj, axis=0)
             self.Nfreqs = self.spectrALL.shape[0]
             self.freqs = np.linspace(0., 0.5, self.Nfreqs)
             self.DF = 0.5 / (self.Nfreqs - 1)
@@ -346,39 +417,43 @@ class MDSample(object):
         self.Nyquist_f_THz = self.freqs_THz[-1]
 
         # calculate the same thing on the other trajectory
-        if (call_other):
+        if not call_other:
+            return
+        if self.spectral_store is not None:   # reuse the spectra of the other currents
+            for other, spectrALL in zip(others, self.spectral_store.spectra[1:]):
+                other.spectrALL = spectrALL
+        else:
             for other in others:   # call other.compute_kappa_multi (MDsample method)
                 MDSample.compute_kappa_multi(other, [self], FILTER_WINDOW_WIDTH, method, self.DT_FS, average_components,
                                              normalize, False)
-        else:
-            return
 
-        # define the cospectrum matrix. Its shape is (2, 2, Nfreqs,n_spatial_dim)
+        # define the cospectrum matrix, summed over the equivalent (cartesian) components. For 2 currents:
         #  [  self.spectrALL*self.spectrALL.conj()     self.spectrALL*other.spectrALL.conj() ]
         #  [ other.spectrALL*self.spectrALL.conj()    other.spectrALL*other.spectrALL.conj() ]
-        other_spectrALL = []
-        for other in others:
-            other_spectrALL.append(other.spectrALL)
-
-        # compute the matrix defined by the outer product of only the first indexes of the two arrays
-        covarALL = self.DT_FS / (2.*(self.Nfreqs - 1.)) *\
-                    np.einsum('a...,b...->ab...', np.array([self.spectrALL] + other_spectrALL),
-                                                  np.array([self.spectrALL] + other_spectrALL).conj())
+        # only its upper triangle is computed and stored (packed), in frequency chunks and in double precision (also if
+        # the spectra were computed in single precision). See md.cospectrum.
+        spectrALL = [self.spectrALL] + [other.spectrALL for other in others]
+        self.cospectrum_packed = compute_packed_cospectrum(spectrALL, self.DT_FS / (2. * (self.Nfreqs - 1.)))
+        self.L = self.N_COMPONENTS
 
         # number of degrees of freedom of the chi-square distribution of the psd
-        ndf_chi = covarALL.shape[3] - len(other_spectrALL)
+        ndf_chi = self.L - N_CURRENTS
 
-        # compute the sum over the last axis (equivalent cartesian components):
-        self.L = covarALL.shape[3]   ## isn't is == to N_CURRENTS?
-        self.cospectrum = covarALL.sum(axis=3)
-
-        # compute the element 1/"(0,0) of the inverse" (aka the transport coefficient)
+        # compute the element 1/"(0,0) of the inverse" (aka the transport coefficient), from a Cholesky factorization
         # the diagonal elements of the inverse have very convenient statistical properties
-        multi_psd = (np.linalg.inv(self.cospectrum.transpose((2, 0, 1)))[:, 0, 0]**-1).real / ndf_chi
+        multi_psd = reduced_psd(self.cospectrum_packed) / ndf_chi
 
         if normalize:
             multi_psd = multi_psd / np.trapz(multi_psd) / self.N / self.DT_FS
 
+        # reduced PSDs of all the currents of interest, from one factorization per frequency
+        if onsager_currents is not None:
+            self.onsager_currents = list(onsager_currents)
+            self.onsager_psd = reduced_psds(self.cospectrum_packed, self.onsager_currents) / ndf_chi
+            if normalize:
+                self.onsager_psd = self.onsager_psd / np.trapz(self.onsager_psd, axis=1)[:, np.newaxis] / self.N / \
+                                   self.DT_FS
+
         self.ndf_chi = ndf_chi
         self.psd = multi_psd
         self.logpsd = np.log(self.psd)
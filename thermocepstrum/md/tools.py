@@ -1,6 +1,7 @@
 import numpy as np
 from scipy.signal import lfilter
 from thermocepstrum.utils.utils import PrintMethod
+from . import fftbackend
 log = PrintMethod()
 
 ################################################################################
@@ -34,6 +35,17 @@ def runavefilter(X, WF):
     return np.convolve(Y, np.array([1.0 / WF] * WF), 'valid')
 
 
+def rfft(x, axis=0):
+    """One-sided FFT of a real array, computed with the current FFT backend (see fftbackend). It is computed in single
+    precision (complex64) if x is a float32 array (except with the numpy backend), in double precision otherwise."""
+    return fftbackend.rfft(x, axis=axis)
+
+
+def power_spectrum(spectr):
+    """Returns |spectr|**2, accumulated in double precision also if spectr is a complex64 array."""
+    return spectr.real.astype(float)**2 + spectr.imag.astype(float)**2
+
+
 ################################################################################
 
 
@@ -66,6 +78,166 @@ def filter_and_sample(y_big, W, DT, window='rectangular', even_NSTEPS=True, detr
     return y
 
 
+class FilterSampler(object):
+    """Streaming version of filter_and_sample, for a signal given in consecutive chunks along axis 0: the outputs of
+    push and flush, concatenated and passed to finalize, are exactly equal to filter_and_sample on the whole signal."""
+
+    def __init__(self, W, DT, window='rectangular', drop_first=True):
+        if (window != 'rectangular'):
+            raise NotImplementedError('Not implemented window type.')
+        self.W = W
+        self.DT = DT
+        self.b = (1. / W) * np.ones(W)
+        self.first = (W - 1) if ((W > 1) and drop_first) else 0   # index of the first sampled point
+        self.tail = None   # last W-1 input points (carried instead of the lfilter zi state, to round the same way)
+        self.pending = None   # points not filtered yet
+        self.nfiltered = 0   # number of points filtered
+        self.empty = None   # empty output (with the shape and type of the outputs)
+        return
+
+    def push(self, y, flush=False):
+        """Filter the next chunk of the signal and return its sampled points."""
+        if self.pending is not None:
+            y = np.concatenate((self.pending, y))
+            self.pending = None
+        if (self.W > 1):
+            ntail = 0 if (self.tail is None) else self.tail.shape[0]
+            if (ntail + y.shape[0] <= self.W) and not flush:   # too short: wait for more points
+                self.pending = y
+                return y[:0]
+            if ntail:
+                y = np.concatenate((self.tail, y))
+            self.tail = y[-(self.W - 1):]
+            y = lfilter(self.b, 1., y, axis=0)[ntail:]   # drop the outputs of the tail
+        n0 = self.nfiltered
+        self.nfiltered += y.shape[0]
+        self.empty = y[:0]
+        start = max(self.first - n0, (self.first - n0) % self.DT)   # first sampled point of this chunk
+        return y[start::self.DT]
+
+    def flush(self):
+        """Filter the points left (if any) and return their sampled points."""
+        if self.pending is None:
+            return self.empty
+        return self.push(self.pending[:0], flush=True)
+
+    @staticmethod
+    def finalize(y, even_NSTEPS=True, detrend=False):
+        """Remove the mean (detrend=True) and keep an even number of points (even_NSTEPS=True), as filter_and_sample."""
+        if detrend:
+            y = y - np.mean(y, axis=0)
+        if even_NSTEPS:
+            if (y.shape[0] % 2 == 1):
+                return y[:-1]
+        return y
+
+
+class BlockingAccumulator(object):
+    """Running mean, variance and blocking analysis (Flyvbjerg-Petersen) of a time series given in consecutive chunks
+    along axis 0, e.g. a column of a file while it is read. Only one unpaired block average per level is kept."""
+
+    def __init__(self, min_blocks=32):
+        self.min_blocks = min_blocks   # minimum number of blocks of the levels used to estimate the error
+        self.counts = []   # number of block averages of each level
+        self.means = []   # running mean of the block averages of each level
+        self.m2s = []   # running sum of the squared deviations of the block averages of each level
+        self.carry = []   # unpaired block average of each level (or None)
+        return
+
+    def __repr__(self):
+        return 'BlockingAccumulator(n={:d}, levels={:d})'.format(self.n, len(self.counts))
+
+    def add(self, values):
+        """Add the next chunk of the series, an array of shape (n,) or (n, N_COMPONENTS)."""
+        x = np.asarray(values, dtype=float)
+        if (x.ndim == 1):
+            x = x[:, np.newaxis]
+        level = 0
+        while (x.shape[0] > 0):
+            if (level == len(self.counts)):
+                self.counts.append(0)
+                self.means.append(np.zeros(x.shape[1]))
+                self.m2s.append(np.zeros(x.shape[1]))
+                self.carry.append(None)
+            # merge the mean and variance of the chunk (Chan et al.)
+            n = x.shape[0]
+            mean = np.mean(x, axis=0)
+            delta = mean - self.means[level]
+            total = self.counts[level] + n
+            self.m2s[level] += np.sum((x - mean)**2, axis=0) + delta**2 * self.counts[level] * n / total
+            self.means[level] += delta * n / total
+            self.counts[level] = total
+            # pair the block averages to get the next level
+            if self.carry[level] is not None:
+                x = np.concatenate((self.carry[level][np.newaxis], x))
+            if (x.shape[0] % 2 == 1):
+                self.carry[level] = x[-1]
+                x = x[:-1]
+            else:
+                self.carry[level] = None
+            x = 0.5 * (x[0::2] + x[1::2])
+            level += 1
+        return
+
+    def state(self):
+        """Return the state of the accumulator as a JSON-serializable dictionary (see set_state)."""
+        return {
+            'counts': list(self.counts),
+            'means': [mean.tolist() for mean in self.means],
+            'm2s': [m2.tolist() for m2 in self.m2s],
+            'carry': [None if carry is None else carry.tolist() for carry in self.carry]
+        }
+
+    def set_state(self, state):
+        """Restore a state returned by state."""
+        self.counts = list(state['counts'])
+        self.means = [np.array(mean, dtype=float) for mean in state['means']]
+        self.m2s = [np.array(m2, dtype=float) for m2 in state['m2s']]
+        self.carry = [None if carry is None else np.array(carry, dtype=float) for carry in state['carry']]
+        return
+
+    @property
+    def n(self):
+        """Number of steps accumulated."""
+        return self.counts[0] if self.counts else 0
+
+    @property
+    def mean(self):
+        return self.means[0]
+
+    @property
+    def var(self):
+        """Variance of the series (as np.var)."""
+        return self.m2s[0] / self.counts[0]
+
+    @property
+    def std(self):
+        """Standard deviation of the series (as np.std)."""
+        return np.sqrt(self.var)
+
+    def blocking(self):
+        """Returns block_size, nblocks, error of the mean and its uncertainty of the levels with at least 2 blocks
+        (error and error_std have shape (nlevels, N_COMPONENTS))."""
+        levels = [level for level, count in enumerate(self.counts) if (count >= 2)]
+        block_size = 2**np.array(levels, dtype=int)
+        nblocks = np.array([self.counts[level] for level in levels], dtype=int)
+        error = np.array([np.sqrt(self.m2s[level] / self.counts[level] / (self.counts[level] - 1)) for level in levels])
+        error_std = error / np.sqrt(2. * (nblocks[:, np.newaxis] - 1))
+        return block_size, nblocks, error, error_std
+
+    @property
+    def mean_error(self):
+        """Error of the mean: the largest blocking error among the levels with at least min_blocks blocks
+        (the uncorrelated estimate if the series is too short, nan if it has less than 2 steps)."""
+        if (self.n < 2):
+            return np.full(self.means[0].shape if self.means else 1, np.nan)
+        block_size, nblocks, error, error_std = self.blocking()
+        reliable = (nblocks >= self.min_blocks)
+        if not np.any(reliable):
+            return error[0]
+        return np.max(error[reliable], axis=0)
+
+
 def generate_empirical_spectrum(psd):
     """Add noise to a periodogram and generate a complex spectrum."""
     ### Probabilmente ci vuole un fattore 1/N, in maniera da tirar via il fattore N
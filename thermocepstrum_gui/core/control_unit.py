@@ -286,6 +286,8 @@ def load_settings():
                         if not os.path.exists(settings.LOG_PATH):
                             settings.LOG_PATH = './'
                             #os.mkdir(settings.LOG_PATH)
+                    elif var == 'CP':
+                        settings.CACHE_PATH = val if val else None   # opt-in
                     elif var == 'FS':
                         settings.FONT_SIZE = val
                     elif var == 'PL':
@@ -322,11 +324,12 @@ def set_defaults():
     load_settings()
 
 
-def load_keys(inputfile):
+def load_keys(inputfile, run_keyword=''):
     """
     This function is used to load the header keys of the selected file.
 
     :param inputfile: the path of the selected file.
+    :param run_keyword: the keyword that identifies the run to read (only for "lammps" format).
     :return:
     """
     global data
@@ -334,10 +337,10 @@ def load_keys(inputfile):
         jfile = tc.i_o.TableFile(inputfile, group_vectors=True)
         return jfile.all_ckeys
     elif data.inputformat == 'dict':
-        data.jdata = np.load(inputfile, allow_pickle=True).tolist()
+        data.jdata = tc.i_o.load_dict(inputfile)   # only the keys are read here
         return {key: i for i, key in enumerate(data.jdata)}
     elif data.inputformat == 'lammps':
-        jfile = tc.i_o.LAMMPSLogFile(inputfile)
+        jfile = tc.i_o.LAMMPSLogFile(inputfile, run_keyword=run_keyword)
         return jfile.all_ckeys
     else:
         raise RuntimeError('inputformat {} not handled'.format(data.inputformat))
@@ -360,7 +363,7 @@ def load_data(inputfile, input_format, _selected_keys, temperature=None, NSTEPS=
         data.units = units
 
     if input_format == 'table':
-        jfile = tc.i_o.TableFile(inputfile, group_vectors=True)
+        jfile = tc.i_o.TableFile(inputfile, group_vectors=True, cache=settings.CACHE_PATH)
         data.jfile = jfile
         jfile.read_datalines(start_step=START_STEP, NSTEPS=NSTEPS, select_ckeys=selected_keys)
         data.jdata = jfile.data
@@ -369,7 +372,7 @@ def load_data(inputfile, input_format, _selected_keys, temperature=None, NSTEPS=
 
         # data.jdata = np.load(inputfile) #already loaded at the header selector section
     elif input_format == 'lammps':
-        jfile = tc.i_o.LAMMPSLogFile(inputfile, run_keyword=run_keyword)
+        jfile = tc.i_o.LAMMPSLogFile(inputfile, run_keyword=run_keyword, cache=settings.CACHE_PATH)
         jfile.read_datalines(start_step=START_STEP, NSTEPS=NSTEPS, select_ckeys=selected_keys)
         data.jdata = jfile.data
     else:
@@ -17,6 +17,7 @@ DATA_PATH = ''
 OUTPUT_PATH = ''
 LOG_PATH = ''
 ASSETS_PATH = os.path.join(BASE_PATH, 'assets')
+CACHE_PATH = None   # directory of the binary cache of the input data (None = no cache; set it with CP:<path>)
 
 # todo: Add/Remove extensions
 FILE_EXTENSIONS = ['dat', 'log', 'txt', 'bin', 'npy']